@@ -4,7 +4,25 @@
 
 import os
 import io
-from datetime import date
+import sys
+import gzip
+import json
+import time
+import getpass
+import hashlib
+import http.server
+import urllib.parse
+import socket
+import sqlite3
+import selectors
+import functools
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing, contextmanager, nullcontext
+from dataclasses import dataclass, field
+from datetime import date, timedelta
+import numpy as np
 import pandas as pd
 import streamlit as st
 
@@ -13,7 +31,21 @@ APP_TITLE_EN = "AYDI Ops Guardrail — KPI & Risk Tracker"
 APP_TITLE_AR = "حارس عمليات أيدي — مؤشرات الأداء والمخاطر"
 
 DATA_PATH = "daily_metrics.csv"  # CSV fallback path
+PARQUET_DIR = "daily_metrics_parquet"  # columnar backend: one <year>.parquet file per year
+SQLITE_PATH = "daily_metrics.db"       # SQLite backend (date primary key, WAL journal)
 LOGO_PATH = "assets/aydi_logo.png"
+ROLLING_WINDOWS = (7, 28, 90)  # trailing-day windows for the rolling KPI series
+CACHE_TTL_SECONDS = 30.0  # how long a cached Sheets load is trusted before re-checking its revision
+EXPORT_CHUNK_ROWS = 50_000  # rows serialized per step when writing an export
+WRITE_LOCK_SECONDS = 10.0  # how long a save waits for a file's write lock before giving up with WriteConflict
+SYNC_OUTBOX_PATH = "sheets_outbox.db"  # durable queue of writes not yet replicated to Sheets
+SYNC_PULL_SECONDS = 60.0  # how often the replica checks the sheet for edits made there
+SYNC_BACKOFF_SECONDS = (2.0, 300.0)  # first retry delay after a failed sync, and its cap
+SYNC_BATCH = 500  # outbox entries replicated per batch_update
+PROFILES_PATH = "config_profiles.json"  # named sidebar configs (targets, finance, thresholds), kept next to the data
+AUDIT_LOG_PATH = "daily_metrics_audit.jsonl"  # append-only log of every edited cell (who, when, old -> new)
+CHART_POINTS = 400          # per-chart point budget sent to the browser
+TRACE_LOG_PATH = os.environ.get("AYDI_TRACE_LOG")  # if set, every rerun's trace is appended here as JSON lines
 
 # Targets (initial)
 DEFAULT_TARGETS = {
@@ -41,13 +73,31 @@ DEFAULT_THRESHOLDS = {
     "min_aov": 20.0,           # OMR
 }
 
-# Data schema (daily)
-COLUMNS = [
-    "date","sessions","orders","gmv_products","marketing_spend",
+# Data schema (daily fact table: one row per date and vendor/city/channel combination)
+METRIC_COLUMNS = [
+    "sessions","orders","gmv_products","marketing_spend",
     "deliveries","returns","first_mile_pickups","handoff_last_mile",
     "vendors_new","skus_added","skus_backlog",
     "csat","otd_total","otd_on_time",
 ]
+DIMENSIONS = ["vendor","city","channel"]  # "" = company-wide / not broken down
+KEY_COLUMNS = ["date"] + DIMENSIONS
+COLUMNS = ["date"] + METRIC_COLUMNS + DIMENSIONS  # dimensions last so pre-dimension files keep their layout
+
+# In-memory dtypes of the loaded frame. Dates are datetime64[s] (pandas' coarsest unit), counts
+# int32; money stays float64 so OMR totals add up exactly, the 0-100 CSAT score fits float32.
+FLOAT_COLUMNS = {"gmv_products": "float64", "marketing_spend": "float64", "csat": "float32"}
+SCHEMA = {
+    "date": "datetime64[s]",
+    **{c: FLOAT_COLUMNS.get(c, "int32") for c in METRIC_COLUMNS},
+    **{d: "category" for d in DIMENSIONS},
+}
+
+# Columns that can be summed over a period (everything the KPI cards aggregate)
+ADDITIVE_COLUMNS = [
+    "sessions","orders","gmv_products","marketing_spend","deliveries",
+    "returns","otd_total","otd_on_time","vendors_new",
+]
 
 # -------------------- Localization --------------------
 L = {
@@ -62,6 +112,18 @@ L = {
         "backend_active": "Active backend: Google Sheets",
         "backend_csv": "Active backend: CSV file",
         "backend_fallback": "Google Sheets not configured or unavailable — falling back to CSV.",
+        "backend_parquet": "Active backend: Parquet files",
+        "local_backend": "Local store format",
+        "local_csv": "CSV file",
+        "local_parquet": "Parquet (columnar, per year)",
+        "local_sqlite": "SQLite database",
+        "backend_sqlite": "Active backend: SQLite database",
+        "backend_replica": "Active backend: {local}, replicated to Google Sheets in the background",
+        "sheets_sync": "Background sync (local store first)",
+        "sheets_sync_help": "Read and write the local store; changes reach Google Sheets asynchronously "
+                            "and edits made on the sheet are pulled back periodically.",
+        "sync_status": "Sheets sync: {pending} pending · last push {push} · last pull {pull}",
+        "sync_failing": "Sheets sync failing, next retry at {retry}: {error}",
         "annual_gmv": "Annual GMV target (products only, OMR)",
         "annual_units": "Annual units target (products)",
         "annual_deliveries": "Annual deliveries target (handover to last-mile)",
@@ -96,10 +158,16 @@ L = {
         "budget_label": "MTD Burn {burn:.0f} / Monthly Budget {budget:.0f} OMR",
         "wc_metric": "Working capital left",
         "wc_runway": "≈ {months:.1f} months at current monthly budget",
+        "runway_date": "Projected runway: working capital lasts until {date} at the current burn.",
+        "runway_beyond": "Projected runway: more than {years} years at the current burn.",
+        "runway_exhausted": "Projected runway: working capital is already used up.",
 
         "risk_header": "Risk Alerts",
         "risk_no_data": "No alerts — add data first.",
         "risk_all_clear": "All clear. No threshold breaches this month.",
+        "anomaly_header": "Unusual days in the last {days} days (against each metric's recent pattern):",
+        "anomaly_spike": "{date}: {metric} spiked to {value:,.0f} (≈{expected:,.0f} expected, z {z:+.1f})",
+        "anomaly_drop": "{date}: {metric} dropped to {value:,.0f} (≈{expected:,.0f} expected, z {z:+.1f})",
         "risk_low_conversion": "Low conversion: {val:.2f}% < target {target:.1f}%.",
         "risk_low_aov": "Low AOV: {val:.2f} OMR < target {target:.2f}.",
         "risk_high_cac": "High CAC: {val:.2f} OMR > limit {target:.2f}.",
@@ -112,8 +180,48 @@ L = {
         "progress_units": "Units {cur} / {tar}",
         "progress_deliveries": "Deliveries {cur} / {tar}",
         "progress_vendors": "Vendors {cur} / {tar}",
+        "projection_seasonal": "Projections: last {days} days' pace, shaped by last year's months and by weekday.",
+        "projection_run_rate": "Projections: run rate of the last {days} days.",
+        "projection_line": "Year-end ≈ {landing:,.0f} ({pct:.0%} of target) · {status}",
+        "target_reached": "target reached on {date}",
+        "target_expected": "target expected on {date}",
+        "target_missed": "not reached this year at this pace",
 
         "trends_header": "Trends",
+        "tab_overview": "Overview",
+        "tab_charts": "Charts",
+        "tab_scenarios": "Scenarios",
+        "scenario_header": "What-if scenarios",
+        "scenario_caption": "Edit or add rows (blank cells keep the sidebar value) or sweep one parameter; every scenario is scored against the same data in one pass.",
+        "scenario_base": "Sidebar",
+        "scenario_name": "Scenario",
+        "scenario_sweep": "Sweep a parameter",
+        "scenario_from": "From",
+        "scenario_to": "To",
+        "scenario_steps": "Steps",
+        "scenario_count": "{n} scenario(s) over {months} month(s) of history.",
+        "scenario_revenue_ytd": "Revenue YTD (OMR)",
+        "scenario_commission_rev_ytd": "Commission YTD",
+        "scenario_delivery_rev_ytd": "Delivery YTD",
+        "scenario_budget_used": "Budget used MTD",
+        "scenario_wc_left": "WC left (OMR)",
+        "scenario_runway_months": "Runway (months)",
+        "scenario_runway_date": "Runway ends",
+        "scenario_alerts": "Alerts now",
+        "scenario_months_flagged": "Months flagged",
+        "tab_data": "Data entry",
+        "tab_export": "Export",
+        "rolling_header": "Rolling KPIs — conversion / OTD / returns (%), then AOV / CAC (OMR)",
+        "rolling_window": "Rolling window (days)",
+        "slice_header": "Slice",
+        "slice_all": "(all)",
+        "slice_unassigned": "(unassigned)",
+        "vendor": "Vendor",
+        "city": "City",
+        "channel": "Channel",
+        "breakdown_header": "MTD breakdown",
+        "breakdown_by": "Break down by",
+        "breakdown_empty": "No rows for this month in the current slice.",
 
         "form_header": "Add / Update Daily Record",
         "date": "Date",
@@ -133,10 +241,45 @@ L = {
         "otd_on_time": "OTD — on-time subset",
         "save_update": "Save / Update",
         "saved": "Saved.",
+        "save_conflict": "Another session kept the data locked while saving; nothing was written. Please submit again.",
 
         "export_header": "Data Export",
         "export_caption": "Add data to enable export.",
-        "download_csv": "Download CSV",
+        "download_export": "Download {fmt}",
+        "export_format": "Format",
+        "export_range": "Date range",
+        "export_prepare": "Prepare export",
+        "chart_granularity": "Granularity",
+        "chart_range": "Zoom (date range)",
+        "granularity_day": "Day",
+        "granularity_week": "Week",
+        "granularity_month": "Month",
+        "diagnostics": "Show performance diagnostics",
+        "diagnostics_header": "Diagnostics — this rerun",
+        "diagnostics_total": "Total {ms:.0f} ms · {rows:,} rows scanned · {calls} Sheets calls · {kb:.1f} KB",
+        "diagnostics_download": "Download trace (JSON lines)",
+
+        "import_header": "Bulk import (historical days)",
+        "import_caption": "Upload a CSV/XLSX with the same columns as the export. Existing dates are replaced.",
+        "import_file": "File (CSV or XLSX)",
+        "import_button": "Import",
+        "import_done": "Imported {rows} row(s).",
+        "import_failed": "Import failed: {error}",
+        "as_of_toggle": "View past data",
+        "as_of_help": "Rebuild every section from the change log as the data stood at the end of a past day.",
+        "as_of_date": "As of (end of day)",
+        "as_of_active": "Showing the data as it stood at the end of {date} (read-only).",
+        "as_of_read_only": "Saving is off while viewing past data.",
+        "history_header": "Change history",
+        "history_empty": "No edits logged yet.",
+        "profile": "Config profile",
+        "profile_builtin": "Built-in defaults",
+        "config_apply": "Apply",
+        "profile_name": "Save as profile",
+        "profile_make_default": "Default for new sessions",
+        "profile_save": "Save profile",
+        "profile_name_missing": "Enter a profile name to save.",
+        "profile_saved": "Profile \"{name}\" saved.",
     },
     "AR": {
         "title": APP_TITLE_AR,
@@ -149,6 +292,18 @@ L = {
         "backend_active": "المخزن الفعّال: Google Sheets",
         "backend_csv": "المخزن الفعّال: ملف CSV",
         "backend_fallback": "لم يتم إعداد Google Sheets أو غير متاح — سيتم استخدام CSV.",
+        "backend_parquet": "المخزن الفعّال: ملفات Parquet",
+        "local_backend": "صيغة المخزن المحلي",
+        "local_csv": "ملف CSV",
+        "local_parquet": "Parquet (عمودي، لكل سنة)",
+        "local_sqlite": "قاعدة بيانات SQLite",
+        "backend_sqlite": "المخزن الفعّال: قاعدة بيانات SQLite",
+        "backend_replica": "المخزن الفعّال: {local}، مع نسخة متزامنة في Google Sheets في الخلفية",
+        "sheets_sync": "مزامنة في الخلفية (المخزن المحلي أولاً)",
+        "sheets_sync_help": "القراءة والكتابة من المخزن المحلي؛ تصل التغييرات إلى Google Sheets بشكل غير متزامن "
+                            "وتُسحب التعديلات التي تتم على الجدول دورياً.",
+        "sync_status": "مزامنة Sheets: {pending} بانتظار الإرسال · آخر إرسال {push} · آخر سحب {pull}",
+        "sync_failing": "تعذّرت مزامنة Sheets، المحاولة التالية عند {retry}: {error}",
         "annual_gmv": "هدف GMV السنوي (المنتجات فقط، ر.ع)",
         "annual_units": "هدف عدد الوحدات السنوي (منتجات)",
         "annual_deliveries": "هدف التوصيلات السنوي (تسليم لشركة التوصيل)",
@@ -183,10 +338,16 @@ L = {
         "budget_label": "الحرق {burn:.0f} / ميزانية الشهر {budget:.0f} ر.ع",
         "wc_metric": "رأس المال العامل المتبقي",
         "wc_runway": "≈ {months:.1f} شهر على الميزانية الشهرية الحالية",
+        "runway_date": "المدى المتوقع: يكفي رأس المال العامل حتى {date} بمعدل الحرق الحالي.",
+        "runway_beyond": "المدى المتوقع: أكثر من {years} سنوات بمعدل الحرق الحالي.",
+        "runway_exhausted": "المدى المتوقع: تم استهلاك رأس المال العامل بالفعل.",
 
         "risk_header": "تنبيهات المخاطر",
         "risk_no_data": "لا توجد تنبيهات — أضف بيانات أولاً.",
         "risk_all_clear": "لا توجد تجاوزات هذا الشهر.",
+        "anomaly_header": "أيام غير معتادة خلال آخر {days} أيام (مقارنةً بالنمط الأخير لكل مؤشر):",
+        "anomaly_spike": "{date}: ارتفاع حاد في {metric} إلى ‏{value:,.0f} (المتوقع ≈ ‏{expected:,.0f}، z {z:+.1f})",
+        "anomaly_drop": "{date}: انخفاض حاد في {metric} إلى ‏{value:,.0f} (المتوقع ≈ ‏{expected:,.0f}، z {z:+.1f})",
         "risk_low_conversion": "تحويل منخفض: {val:.2f}% < الهدف {target:.1f}%.",
         "risk_low_aov": "متوسط السلة منخفض: {val:.2f} ر.ع < الهدف {target:.2f}.",
         "risk_high_cac": "CAC مرتفع: {val:.2f} ر.ع > الحد {target:.2f}.",
@@ -199,8 +360,48 @@ L = {
         "progress_units": "الوحدات ‏{cur} / ‏{tar}",
         "progress_deliveries": "التوصيلات ‏{cur} / ‏{tar}",
         "progress_vendors": "المورّدون ‏{cur} / ‏{tar}",
+        "projection_seasonal": "التوقعات: وتيرة آخر {days} يوماً، معدّلة حسب أشهر العام الماضي وأيام الأسبوع.",
+        "projection_run_rate": "التوقعات: معدل آخر {days} يوماً.",
+        "projection_line": "نهاية السنة ≈ ‏{landing:,.0f} ({pct:.0%} من الهدف) · {status}",
+        "target_reached": "تم بلوغ الهدف في {date}",
+        "target_expected": "يُتوقع بلوغ الهدف في {date}",
+        "target_missed": "لن يتحقق هذا العام بهذه الوتيرة",
 
         "trends_header": "الاتجاهات",
+        "tab_overview": "نظرة عامة",
+        "tab_charts": "الرسوم البيانية",
+        "tab_scenarios": "السيناريوهات",
+        "scenario_header": "سيناريوهات ماذا لو",
+        "scenario_caption": "عدّل الصفوف أو أضف صفوفاً (الخلايا الفارغة تأخذ قيمة الشريط الجانبي) أو اجعل معاملاً واحداً يتدرج؛ تُقيَّم كل السيناريوهات على البيانات نفسها دفعة واحدة.",
+        "scenario_base": "الشريط الجانبي",
+        "scenario_name": "السيناريو",
+        "scenario_sweep": "تدرّج معامل",
+        "scenario_from": "من",
+        "scenario_to": "إلى",
+        "scenario_steps": "الخطوات",
+        "scenario_count": "{n} سيناريو على {months} شهر من السجل.",
+        "scenario_revenue_ytd": "الإيراد منذ بداية السنة (ر.ع)",
+        "scenario_commission_rev_ytd": "العمولة منذ بداية السنة",
+        "scenario_delivery_rev_ytd": "التوصيل منذ بداية السنة",
+        "scenario_budget_used": "المستخدم من ميزانية الشهر",
+        "scenario_wc_left": "رأس المال العامل المتبقي (ر.ع)",
+        "scenario_runway_months": "المدى (أشهر)",
+        "scenario_runway_date": "ينتهي المدى في",
+        "scenario_alerts": "التنبيهات الآن",
+        "scenario_months_flagged": "الأشهر المنبَّه عليها",
+        "tab_data": "إدخال البيانات",
+        "tab_export": "التصدير",
+        "rolling_header": "مؤشرات متحركة — التحويل / التسليم في الوقت / المرتجعات (%)، ثم متوسط السلة / CAC (ر.ع)",
+        "rolling_window": "نافذة المتوسط المتحرك (أيام)",
+        "slice_header": "الشريحة",
+        "slice_all": "(الكل)",
+        "slice_unassigned": "(غير محدد)",
+        "vendor": "البائع",
+        "city": "المدينة",
+        "channel": "القناة",
+        "breakdown_header": "تفصيل الشهر حتى تاريخه",
+        "breakdown_by": "التفصيل حسب",
+        "breakdown_empty": "لا توجد صفوف لهذا الشهر ضمن الشريحة الحالية.",
 
         "form_header": "إضافة / تحديث سجل يومي",
         "date": "التاريخ",
@@ -220,10 +421,45 @@ L = {
         "otd_on_time": "OTD — المسلَّم في الوقت",
         "save_update": "حفظ / تحديث",
         "saved": "تم الحفظ.",
+        "save_conflict": "أبقت جلسة أخرى البيانات مقفلة أثناء الحفظ؛ لم يُكتب شيء. يرجى الإرسال مرة أخرى.",
 
         "export_header": "تصدير البيانات",
         "export_caption": "أضف بيانات لتفعيل التصدير.",
-        "download_csv": "تنزيل CSV",
+        "download_export": "تنزيل {fmt}",
+        "export_format": "الصيغة",
+        "export_range": "نطاق التاريخ",
+        "export_prepare": "تجهيز ملف التصدير",
+        "chart_granularity": "الدقة الزمنية",
+        "chart_range": "تكبير (نطاق التاريخ)",
+        "granularity_day": "يومي",
+        "granularity_week": "أسبوعي",
+        "granularity_month": "شهري",
+        "diagnostics": "عرض تشخيص الأداء",
+        "diagnostics_header": "التشخيص — هذا التحديث",
+        "diagnostics_total": "الإجمالي {ms:.0f} ms · {rows:,} صف مفحوص · {calls} طلب Sheets · {kb:.1f} KB",
+        "diagnostics_download": "تنزيل السجل (JSON lines)",
+
+        "import_header": "استيراد جماعي (أيام سابقة)",
+        "import_caption": "ارفع ملف CSV/XLSX بنفس أعمدة ملف التصدير. ستُستبدل التواريخ الموجودة.",
+        "import_file": "الملف (CSV أو XLSX)",
+        "import_button": "استيراد",
+        "import_done": "تم استيراد {rows} صف.",
+        "import_failed": "فشل الاستيراد: {error}",
+        "as_of_toggle": "عرض بيانات سابقة",
+        "as_of_help": "إعادة بناء كل الأقسام من سجل التغييرات كما كانت البيانات في نهاية يوم سابق.",
+        "as_of_date": "حتى تاريخ (نهاية اليوم)",
+        "as_of_active": "تُعرض البيانات كما كانت في نهاية {date} (للقراءة فقط).",
+        "as_of_read_only": "الحفظ متوقف أثناء عرض بيانات سابقة.",
+        "history_header": "سجل التغييرات",
+        "history_empty": "لا توجد تعديلات مسجلة بعد.",
+        "profile": "ملف الإعدادات",
+        "profile_builtin": "الإعدادات الافتراضية المدمجة",
+        "config_apply": "تطبيق",
+        "profile_name": "حفظ كملف إعدادات",
+        "profile_make_default": "افتراضي للجلسات الجديدة",
+        "profile_save": "حفظ الملف",
+        "profile_name_missing": "أدخل اسماً لملف الإعدادات لحفظه.",
+        "profile_saved": "تم حفظ ملف الإعدادات \"{name}\".",
     }
 }
 
@@ -246,445 +482,2781 @@ def progress_with_text(value: float, text: str):
         st.progress(value)
         st.caption(text)
 
-# -------------------- Storage backends --------------------
-class CSVStore:
-    """Simple CSV storage."""
-    def __init__(self, path: str):
-        self.path = path
-        if not os.path.exists(self.path):
-            pd.DataFrame(columns=COLUMNS).to_csv(self.path, index=False)
+# -------------------- Diagnostics --------------------
+@st.cache_resource(show_spinner=False)
+def _trace_var() -> contextvars.ContextVar:
+    """
+    The running script's RerunTrace. Process-wide rather than a module global: objects cached
+    across reruns (e.g. a FactIndex) keep the globals of the run that created them.
+    """
+    return contextvars.ContextVar("aydi_trace", default=None)
 
-    def load(self) -> pd.DataFrame:
-        df = pd.read_csv(self.path)
-        if not df.empty:
-            df["date"] = pd.to_datetime(df["date"]).dt.date
-            for col in COLUMNS[1:]:
-                if col in df.columns:
-                    df[col] = pd.to_numeric(df[col], errors="coerce").fillna(0)
-        return df[COLUMNS] if not df.empty else df
+class RerunTrace:
+    """
+    Timings for one rerun as nested spans (dashboard stages and backend calls), each with its
+    own counters: rows scanned, Sheets API calls and, when `detail` is on, request/response bytes.
+    """
+    COUNTERS = ("rows", "api_calls", "bytes_out", "bytes_in")
 
-    def save(self, df: pd.DataFrame) -> None:
-        out = df.copy()
-        out = out[COLUMNS]  # ensure correct ordering
-        out.to_csv(self.path, index=False)
+    def __init__(self, detail: bool = False):
+        self.id = f"{time.time_ns():x}"
+        self.started = time.time()
+        self.detail = detail
+        self.spans = []  # in start order
+        self._open = []
 
-class GSheetsStore:
-    """Google Sheets storage with gspread; full-sheet replace on save."""
-    def __init__(self, spreadsheet_id: str, worksheet_title: str = "daily_metrics"):
-        self.ready = False
-        self.error = None
+    @contextmanager
+    def span(self, name: str):
+        rec = {"span": name, "depth": len(self._open), "ms": 0.0, **dict.fromkeys(self.COUNTERS, 0)}
+        self.spans.append(rec)
+        self._open.append(rec)
+        started = time.perf_counter()
         try:
-            import gspread
-            from google.oauth2.service_account import Credentials
-        except Exception as e:
-            self.error = f"Missing gspread/google-auth: {e}"
-            return
+            yield rec
+        finally:
+            rec["ms"] = round((time.perf_counter() - started) * 1000, 3)
+            self._open.pop()
 
-        # Secrets-safe: gracefully handle missing secrets or malformed files
-        try:
-            sa_info = st.secrets["gcp_service_account"]
-            _gs = st.secrets["gsheets"]
-        except Exception:
-            self.error = "Secrets not found."
-            return
+    def count(self, **deltas) -> None:
+        """Add to the counters of the innermost open span."""
+        if self._open:
+            for key, value in deltas.items():
+                self._open[-1][key] += value
 
-        creds = Credentials.from_service_account_info(
-            sa_info,
-            scopes=[
-                "https://www.googleapis.com/auth/spreadsheets",
-                "https://www.googleapis.com/auth/drive",
-            ],
-        )
-        try:
-            client = gspread.authorize(creds)
-            sh = client.open_by_key(spreadsheet_id)
-            try:
-                ws = sh.worksheet(worksheet_title)
-            except Exception:
-                ws = sh.add_worksheet(title=worksheet_title, rows=1000, cols=len(COLUMNS))
-                ws.update([COLUMNS])
-            self.client = client
-            self.sheet = sh
-            self.ws = ws
-            self.ready = True
-        except Exception as e:
-            self.error = f"GSheets auth/open failed: {e}"
-            self.ready = False
+    def totals(self) -> dict:
+        out = {key: sum(rec[key] for rec in self.spans) for key in self.COUNTERS}
+        out["ms"] = round(sum(rec["ms"] for rec in self.spans if rec["depth"] == 0), 3)
+        return out
 
-    def load(self) -> pd.DataFrame:
-        if not self.ready:
-            return pd.DataFrame(columns=COLUMNS)
-        try:
-            rows = self.ws.get_all_values()
-            if not rows:
-                self.ws.update([COLUMNS])
-                return pd.DataFrame(columns=COLUMNS)
-            header = rows[0]
-            data = rows[1:]
-            df = pd.DataFrame(data, columns=header)
-            for col in COLUMNS:
-                if col not in df.columns:
-                    df[col] = 0
-            df = df[COLUMNS]
-            if not df.empty:
-                df["date"] = pd.to_datetime(df["date"], errors="coerce").dt.date
-                for col in COLUMNS[1:]:
-                    df[col] = pd.to_numeric(df[col], errors="coerce").fillna(0)
-            return df
-        except Exception:
-            return pd.DataFrame(columns=COLUMNS)
+    def records(self) -> list:
+        """Structured log records, one per span."""
+        ts = pd.Timestamp(self.started, unit="s", tz="UTC").isoformat(timespec="milliseconds")
+        return [{"rerun": self.id, "ts": ts, **rec} for rec in self.spans]
 
-    def save(self, df: pd.DataFrame) -> None:
-        if not self.ready:
-            return
-        out = df.copy()
-        out = out[COLUMNS]
-        out["date"] = pd.to_datetime(out["date"]).dt.strftime("%Y-%m-%d")
-        values = [COLUMNS] + out.astype(str).values.tolist()
-        self.ws.clear()
-        self.ws.update(values)
+    def to_jsonl(self) -> str:
+        return "".join(json.dumps(rec) + "\n" for rec in self.records())
 
-# -------------------- Secrets helpers --------------------
-def has_sheets_config() -> bool:
-    """True if a valid Sheets config exists; safe when secrets.toml is absent."""
-    try:
-        gs = st.secrets.get("gsheets", None)
-        sa = st.secrets.get("gcp_service_account", None)
-        return bool(gs and sa and gs.get("spreadsheet_id"))
-    except Exception:
-        return False
+def trace_span(name: str):
+    """Span on the current rerun's trace; a no-op outside a traced rerun (CLI, bench, threads)."""
+    trace = _trace_var().get()
+    return trace.span(name) if trace is not None else nullcontext()
 
-def get_backend(lang: str, prefer_sheets: bool = True):
-    """
-    Returns (store, backend_label, fallback_msg)
-    prefer_sheets=True tries Google Sheets first (if configured), else CSV.
-    Secrets-safe: never raises if secrets.toml is missing.
-    """
-    backend_label = L[lang]["backend_csv"]
-    fallback_msg = None
+def trace_count(**deltas) -> None:
+    trace = _trace_var().get()
+    if trace is not None:
+        trace.count(**deltas)
 
-    gsheets_conf = None
+def traced(method):
+    """Time a backend method as a "<Class>.<method>" span; DataFrame results count as rows scanned."""
+    @functools.wraps(method)
+    def wrapper(*args, **kwargs):
+        if _trace_var().get() is None:
+            return method(*args, **kwargs)
+        with trace_span(method.__qualname__):
+            result = method(*args, **kwargs)
+            if isinstance(result, pd.DataFrame):
+                trace_count(rows=len(result))
+            return result
+    return wrapper
+
+def _payload_bytes(obj) -> int:
+    """Approximate JSON size of a Sheets request/response body."""
     try:
-        gsheets_conf = st.secrets.get("gsheets", None)
-    except Exception:
-        gsheets_conf = None
+        return len(json.dumps(obj, default=str))
+    except (TypeError, ValueError):
+        return 0
 
-    if prefer_sheets and gsheets_conf and gsheets_conf.get("spreadsheet_id"):
-        store = GSheetsStore(
-            spreadsheet_id=gsheets_conf["spreadsheet_id"],
-            worksheet_title=gsheets_conf.get("worksheet", "daily_metrics"),
-        )
-        if getattr(store, "ready", False):
-            backend_label = L[lang]["backend_active"]
-            return store, backend_label, None
-        else:
-            fallback_msg = L[lang]["backend_fallback"]
+class _TracedSheets:
+    """gspread Worksheet/Spreadsheet proxy: every method call is one API round-trip on the trace."""
+    def __init__(self, target):
+        self._target = target
 
-    # Default / fallback
-    store = CSVStore(DATA_PATH)
-    return store, backend_label, fallback_msg
+    def __getattr__(self, name):
+        attr = getattr(self._target, name)
+        if not callable(attr):
+            return attr
 
-# -------------------- UI helpers --------------------
-def ui_lang() -> str:
-    # Sidebar language selector (sticky in session state)
-    lang = st.sidebar.selectbox(
-        f"{L['EN']['lang_label']} / {L['AR']['lang_label']}",
-        options=["EN","AR"],
-        index=0 if st.session_state.get("lang","EN")=="EN" else 1,
-        key="lang"
-    )
-    # Flip layout for Arabic
-    if lang == "AR":
-        rtl_css()
-        st.markdown('<div dir="rtl"></div>', unsafe_allow_html=True)
-    else:
-        st.markdown('<div dir="ltr"></div>', unsafe_allow_html=True)
-    return lang
+        @functools.wraps(attr)
+        def call(*args, **kwargs):
+            trace = _trace_var().get()
+            if trace is None:
+                return attr(*args, **kwargs)
+            with trace.span(f"sheets.{name}"):
+                result = attr(*args, **kwargs)
+                trace.count(api_calls=1)
+                if trace.detail:
+                    trace.count(bytes_out=_payload_bytes([args, kwargs]), bytes_in=_payload_bytes(result))
+                return result
+        return call
 
-def t(lang, key): return L[lang][key]
+def write_trace_log(trace: RerunTrace, path: str = TRACE_LOG_PATH) -> None:
+    """Append the trace to the JSON-lines log (no-op when no path is configured)."""
+    if not path:
+        return
+    try:
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(trace.to_jsonl())
+    except OSError:
+        pass  # diagnostics must never break the dashboard
 
-def ui_sidebar(lang):
-    st.sidebar.header(t(lang,"sidebar_header"))
-    st.sidebar.caption(t(lang,"sidebar_caption"))
+# -------------------- Storage backends --------------------
+def conform(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Bring rows from any source to COLUMNS / SCHEMA. The dtypes are checked once and only
+    mismatched columns are coerced: dates parsed to midnight (rows without one dropped), metrics
+    numeric with blanks as 0, dimensions categorical with missing values as "" (company-wide).
+    An already-typed frame passes through untouched. Rows that predate the dimensions load as
+    company-wide.
+    """
+    out = df.reindex(columns=COLUMNS) if list(df.columns) != COLUMNS else df.copy(deep=False)
+    for col, dtype in SCHEMA.items():
+        if str(out[col].dtype) != dtype or (col != "date" and out[col].hasnans):
+            out[col] = _coerce(out[col], dtype)
+    if out["date"].hasnans:
+        out = out[out["date"].notna()]
+    return out.reset_index(drop=True)
 
-    # Data store selection
-    st.sidebar.subheader(t(lang, "datastore_header"))
-    default_use_sheets = has_sheets_config()
-    prefer_sheets = st.sidebar.checkbox(t(lang, "use_sheets"), value=default_use_sheets)
+def _coerce(values: pd.Series, dtype: str) -> pd.Series:
+    if dtype == "category":
+        return values.astype(object).where(values.notna(), "").astype(str).str.strip().astype("category")
+    if dtype.startswith("datetime"):
+        return pd.to_datetime(values, errors="coerce").dt.normalize().astype(dtype)
+    values = pd.to_numeric(values, errors="coerce").fillna(0)
+    return (values.round() if dtype.startswith("int") else values).astype(dtype)
 
-    # Targets
-    annual_gmv = st.sidebar.number_input(t(lang,"annual_gmv"),
-                                         value=float(DEFAULT_TARGETS["annual_gmv_products"]), step=100.0)
-    annual_units = st.sidebar.number_input(t(lang,"annual_units"),
-                                           value=int(DEFAULT_TARGETS["annual_units_products"]), step=10)
-    annual_deliveries = st.sidebar.number_input(t(lang,"annual_deliveries"),
-                                                value=int(DEFAULT_TARGETS["annual_deliveries"]), step=50)
-    annual_vendors = st.sidebar.number_input(t(lang,"annual_vendors"),
-                                             value=int(DEFAULT_TARGETS["annual_vendors"]), step=5)
+def _rows_frame(rows) -> pd.DataFrame:
+    """upsert() input (list of row dicts or a DataFrame) -> conformed frame, last row per key wins."""
+    return conform(pd.DataFrame(rows)).drop_duplicates(subset=KEY_COLUMNS, keep="last")
 
-    st.sidebar.divider()
-    commission_rate = st.sidebar.number_input(t(lang,"commission_rate"),
-                                              value=float(DEFAULT_FINANCE["commission_rate"]),
-                                              step=0.01, min_value=0.0, max_value=1.0, format="%.2f")
-    delivery_fee = st.sidebar.number_input(t(lang,"delivery_fee"),
-                                           value=float(DEFAULT_FINANCE["delivery_fee_per_order"]), step=0.1)
-    marketing_budget = st.sidebar.number_input(t(lang,"marketing_budget"),
-                                               value=float(DEFAULT_FINANCE["annual_marketing_budget"]), step=100.0)
-    admin_general = st.sidebar.number_input(t(lang,"admin_general"),
-                                            value=float(DEFAULT_FINANCE["annual_admin_general"]), step=500.0)
-    working_capital = st.sidebar.number_input(t(lang,"working_capital"),
-                                              value=float(DEFAULT_FINANCE["working_capital"]), step=500.0)
+class WriteConflict(RuntimeError):
+    """A save could not get its file's write lock: another writer held it past WRITE_LOCK_SECONDS."""
 
-    st.sidebar.divider()
-    st.sidebar.header(t(lang,"thresholds_header"))
-    min_conv = st.sidebar.number_input(t(lang,"min_conv"),
-                                       value=float(DEFAULT_THRESHOLDS["min_conversion"]), step=0.001, format="%.3f")
-    max_cac = st.sidebar.number_input(t(lang,"max_cac"),
-                                      value=float(DEFAULT_THRESHOLDS["max_cac"]), step=0.5)
-    min_otd = st.sidebar.number_input(t(lang,"min_otd"),
-                                      value=float(DEFAULT_THRESHOLDS["min_otd"]), step=0.01, format="%.2f")
-    max_returns = st.sidebar.number_input(t(lang,"max_returns"),
-                                          value=float(DEFAULT_THRESHOLDS["max_returns_rate"]), step=0.01, format="%.2f")
-    min_aov = st.sidebar.number_input(t(lang,"min_aov"),
-                                      value=float(DEFAULT_THRESHOLDS["min_aov"]), step=1.0)
+class _FileLock:
+    """
+    Exclusive, re-entrant write lock on one local file, across threads and processes: an RLock
+    inside the process, and flock() on a sidecar `<path>.lock` file taken by the outermost holder.
+    Where fcntl is missing (Windows) only the in-process lock applies.
+    """
+    def __init__(self, path: str):
+        self.path = f"{path}.lock"
+        self._lock = threading.RLock()
+        self._depth = 0
+        self._fd = None
 
-    return {
-        "prefer_sheets": prefer_sheets,
-        "targets": {
-            "annual_gmv": annual_gmv,
-            "annual_units": annual_units,
-            "annual_deliveries": annual_deliveries,
-            "annual_vendors": annual_vendors,
-        },
-        "finance": {
-            "commission_rate": commission_rate,
-            "delivery_fee": delivery_fee,
-            "marketing_budget": marketing_budget,
-            "admin_general": admin_general,
-            "working_capital": working_capital,
-        },
-        "thresholds": {
-            "min_conv": min_conv,
-            "max_cac": max_cac,
-            "min_otd": min_otd,
-            "max_returns": max_returns,
-            "min_aov": min_aov,
-        }
-    }
+    def __enter__(self):
+        deadline = time.monotonic() + WRITE_LOCK_SECONDS
+        if not self._lock.acquire(timeout=WRITE_LOCK_SECONDS):
+            raise WriteConflict(f"{self.path} stayed locked by another writer")
+        try:
+            if self._depth == 0:
+                self._fd = self._flock(deadline)
+        except BaseException:
+            self._lock.release()
+            raise
+        self._depth += 1
+        return self
 
-# -------------------- KPI / Risk / Progress --------------------
-def _agg_period(dfx: pd.DataFrame, finance: dict) -> dict:
-    """Aggregate KPI metrics for a given slice."""
-    sessions = dfx["sessions"].sum()
-    orders = dfx["orders"].sum()
-    gmv = dfx["gmv_products"].sum()
-    deliveries = dfx["deliveries"].sum()  # handover count
-    marketing = dfx["marketing_spend"].sum()
-    returns = dfx["returns"].sum()
+    def __exit__(self, *exc):
+        self._depth -= 1
+        if self._depth == 0 and self._fd is not None:
+            os.close(self._fd)  # closing the descriptor drops the flock
+            self._fd = None
+        self._lock.release()
 
-    commission_revenue = gmv * finance["commission_rate"]
-    delivery_revenue = deliveries * finance["delivery_fee"]  # recognize on handover
+    def _flock(self, deadline: float):
+        try:
+            import fcntl
+        except ImportError:
+            return None
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        while True:
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                return fd
+            except BlockingIOError:
+                if time.monotonic() > deadline:
+                    os.close(fd)
+                    raise WriteConflict(f"{self.path} stayed locked by another writer")
+                time.sleep(0.005)
 
-    aov = (gmv / orders) if orders > 0 else 0.0
-    conv = (orders / sessions) if sessions > 0 else 0.0
-    cac = (marketing / orders) if orders > 0 else 0.0
-    returns_rate = (returns / max(orders, 1))
+@st.cache_resource(show_spinner=False)
+def _path_locks() -> dict:
+    """Process-wide {abs path: _FileLock} serializing read-modify-write cycles on local files."""
+    return {"lock": threading.Lock(), "by_path": {}}
 
-    otd_on_time = dfx["otd_on_time"].sum()
-    otd_total = dfx["otd_total"].sum()
-    otd_rate = (otd_on_time / otd_total) if otd_total > 0 else 0.0
+def _path_lock(path: str) -> _FileLock:
+    registry = _path_locks()
+    path = os.path.abspath(path)
+    with registry["lock"]:
+        if path not in registry["by_path"]:
+            registry["by_path"][path] = _FileLock(path)
+        return registry["by_path"][path]
 
-    return {
-        "sessions": sessions, "orders": orders, "gmv": gmv, "deliveries": deliveries,
-        "marketing": marketing, "returns": returns, "commission_rev": commission_revenue,
-        "delivery_rev": delivery_revenue, "aov": aov, "conv": conv, "cac": cac,
-        "returns_rate": returns_rate, "otd_rate": otd_rate
-    }
+def _file_version(path: str):
+    """(mtime, size, inode) of a file, None if missing. Every replace-write gets a new inode."""
+    try:
+        info = os.stat(path)
+    except OSError:
+        return None
+    return (info.st_mtime_ns, info.st_size, info.st_ino)
 
-def kpi_cards(df, config, lang):
-    st.subheader(t(lang,"kpi_header"))
-    if df.empty:
-        st.info(t(lang,"no_data_yet"))
-        return
+def _replace_file(tmp: str, path: str) -> None:
+    """Move a fully written temp file over `path`; call with _path_lock(path) held."""
+    os.replace(tmp, path)  # readers never see a half-written file
 
-    df_sorted = df.sort_values("date")
-    latest = df_sorted["date"].max()
-    this_month = pd.to_datetime(latest).month
-    this_year = pd.to_datetime(latest).year
+def _tmp_path(path: str) -> str:
+    return f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
 
-    df_mtd = df_sorted[(pd.to_datetime(df_sorted["date"]).dt.month == this_month) &
-                       (pd.to_datetime(df_sorted["date"]).dt.year == this_year)]
-    df_ytd = df_sorted[pd.to_datetime(df_sorted["date"]).dt.year == this_year]
-    today_row = df_sorted[df_sorted["date"] == latest]
+class CSVStore:
+    """
+    Simple CSV storage. Writes go through a temp file and an atomic replace, under the file's
+    write lock, so an upsert's read-merge-replace never drops a concurrent writer's rows.
+    """
+    DTYPES = {**SCHEMA, "date": str, **{dim: str for dim in DIMENSIONS}}
 
-    mtd = _agg_period(df_mtd, config["finance"])
-    ytd = _agg_period(df_ytd, config["finance"])
-    _ = _agg_period(today_row, config["finance"]) if not today_row.empty else mtd
+    def __init__(self, path: str):
+        self.path = path
+        if not os.path.exists(self.path):
+            pd.DataFrame(columns=COLUMNS).to_csv(self.path, index=False)
 
-    c1, c2, c3, c4, c5 = st.columns(5)
-    c1.metric(t(lang,"metric_aov_mtd"), f"{mtd['aov']:.2f}")
-    c2.metric(t(lang,"metric_conv_mtd"), f"{mtd['conv']*100:.2f}%")
-    c3.metric(t(lang,"metric_cac_mtd"), f"{mtd['cac']:.2f}")
-    c4.metric(t(lang,"metric_otd_mtd"), f"{mtd['otd_rate']*100:.1f}%")
-    c5.metric(t(lang,"metric_returns_mtd"), f"{mtd['returns_rate']*100:.1f}%")
+    @traced
+    def load(self) -> pd.DataFrame:
+        try:
+            # Parse straight into SCHEMA; blank or malformed cells fall back to coercion
+            df = pd.read_csv(self.path, dtype=self.DTYPES, parse_dates=["date"], date_format="%Y-%m-%d")
+        except (ValueError, TypeError):
+            df = pd.read_csv(self.path, dtype={dim: str for dim in DIMENSIONS})
+        return conform(df)
 
-    c1, c2, c3, c4, c5 = st.columns(5)
-    c1.metric(t(lang,"metric_gmv_ytd"), f"{ytd['gmv']:.0f}")
-    c2.metric(t(lang,"metric_orders_ytd"), f"{int(ytd['orders'])}")
-    c3.metric(t(lang,"metric_commission_ytd"), f"{ytd['commission_rev']:.0f}")
-    c4.metric(t(lang,"metric_delivery_ytd"), f"{ytd['delivery_rev']:.0f}")
-    c5.metric(t(lang,"metric_marketing_ytd"), f"{ytd['marketing']:.0f}")
+    @traced
+    def save(self, df: pd.DataFrame) -> None:
+        with _path_lock(self.path):
+            self._write(df)
 
-def budget_vs_burn(df, config, lang):
-    """Monthly budget vs MTD burn card + working-capital runway helper."""
-    st.subheader(t(lang, "budget_header"))
-    st.caption(t(lang, "budget_hint"))
+    def _write(self, df: pd.DataFrame) -> None:
+        tmp = _tmp_path(self.path)
+        df[COLUMNS].to_csv(tmp, index=False)  # ensure correct ordering
+        _replace_file(tmp, self.path)
 
-    # Compute monthly budget
-    monthly_admin = config["finance"]["admin_general"] / 12.0
-    monthly_marketing_budget = config["finance"]["marketing_budget"] / 12.0
-    monthly_budget_total = monthly_admin + monthly_marketing_budget
+    @traced
+    def upsert(self, rows) -> None:
+        """
+        Insert or replace rows by (date, dimensions): read, merge and replace the file while
+        holding its write lock, so writers in other processes queue up instead of racing.
+        """
+        new = _rows_frame(rows).astype({d: str for d in DIMENSIONS})
+        with _path_lock(self.path):
+            df = self.load()
+            merged = new
+            if not df.empty:
+                merged = pd.concat([df.astype({d: str for d in DIMENSIONS}), new], ignore_index=True)
+            self._write(merged.drop_duplicates(subset=KEY_COLUMNS, keep="last").sort_values("date"))
 
-    if df.empty:
-        progress_with_text(0.0, t(lang, "budget_label").format(burn=0.0, budget=monthly_budget_total))
-        wc_left = config['finance']['working_capital']
-        runway = (wc_left / monthly_budget_total) if monthly_budget_total > 0 else 0.0
-        st.metric(t(lang, "wc_metric"), f"{wc_left:.0f}", t(lang, "wc_runway").format(months=runway))
-        return
+    @property
+    def cache_key(self) -> str:
+        return f"csv:{os.path.abspath(self.path)}"
 
-    df_sorted = df.sort_values("date")
-    latest = df_sorted["date"].max()
-    this_month = pd.to_datetime(latest).month
-    this_year = pd.to_datetime(latest).year
-    months_elapsed = this_month  # Jan=1 .. current month
+    def version(self):
+        """Cheap change marker: (mtime, size, inode) of the CSV file."""
+        return _file_version(self.path)
 
-    df_mtd = df_sorted[(pd.to_datetime(df_sorted["date"]).dt.month == this_month) &
-                       (pd.to_datetime(df_sorted["date"]).dt.year == this_year)]
-    df_ytd = df_sorted[pd.to_datetime(df_sorted["date"]).dt.year == this_year]
+class ParquetStore:
+    """
+    Columnar storage: typed columns in one Parquet file per year (<dir>/<year>.parquet).
+    Loads skip CSV parsing entirely; saves rewrite only the partitions whose rows changed.
+    """
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(self.path, exist_ok=True)
+        self._hashes = {}  # year -> content hash of the partition on disk
 
-    marketing_mtd = df_mtd["marketing_spend"].sum()
-    marketing_ytd = df_ytd["marketing_spend"].sum()
+    def _file(self, year: int) -> str:
+        return os.path.join(self.path, f"{year}.parquet")
 
-    burn_mtd = marketing_mtd + monthly_admin  # assume admin is time-based monthly expense
-    pct = min(burn_mtd / monthly_budget_total, 1.0) if monthly_budget_total > 0 else 0.0
-    progress_with_text(pct, t(lang, "budget_label").format(burn=burn_mtd, budget=monthly_budget_total))
+    def years(self) -> list:
+        names = os.listdir(self.path) if os.path.isdir(self.path) else []
+        return sorted(int(n[:-8]) for n in names if n.endswith(".parquet") and n[:-8].isdigit())
 
-    wc_spent_est = marketing_ytd + (months_elapsed * monthly_admin)
-    wc_left = max(config["finance"]["working_capital"] - wc_spent_est, 0.0)
-    runway = (wc_left / monthly_budget_total) if monthly_budget_total > 0 else 0.0
-    st.metric(t(lang, "wc_metric"), f"{wc_left:.0f}", t(lang, "wc_runway").format(months=runway))
+    @traced
+    def load(self) -> pd.DataFrame:
+        frames = [self._read(y) for y in self.years()]
+        frames = [f for f in frames if not f.empty]
+        if not frames:
+            return conform(pd.DataFrame(columns=COLUMNS))
+        return conform(pd.concat(frames, ignore_index=True))
 
-def risk_alerts(df, config, lang):
-    st.subheader(t(lang,"risk_header"))
-    if df.empty:
-        st.info(t(lang,"risk_no_data"))
-        return
+    @traced
+    def save(self, df: pd.DataFrame) -> None:
+        """Replace the whole history with df: changed years are rewritten, years not in df deleted."""
+        df = self._typed(df)
+        kept = set()
+        for year, part in df.groupby(pd.to_datetime(df["date"]).dt.year):
+            year = int(year)
+            kept.add(year)
+            with _path_lock(self._file(year)):
+                if self._hash(part) != self._disk_hash(year):
+                    self._write(year, part)
+        for year in set(self.years()) - kept:
+            with _path_lock(self._file(year)):
+                if os.path.exists(self._file(year)):
+                    os.remove(self._file(year))
+                self._hashes.pop(year, None)
 
-    df_sorted = df.sort_values("date")
-    latest = df_sorted["date"].max()
-    this_month = pd.to_datetime(latest).month
-    this_year = pd.to_datetime(latest).year
-    df_mtd = df_sorted[(pd.to_datetime(df_sorted["date"]).dt.month == this_month) &
-                       (pd.to_datetime(df_sorted["date"]).dt.year == this_year)]
-
-    sessions = df_mtd["sessions"].sum()
-    orders = df_mtd["orders"].sum()
-    gmv = df_mtd["gmv_products"].sum()
-    marketing = df_mtd["marketing_spend"].sum()
-    returns = df_mtd["returns"].sum()
-    otd_on_time = df_mtd["otd_on_time"].sum()
-    otd_total = df_mtd["otd_total"].sum()
+    @traced
+    def upsert(self, rows) -> None:
+        """
+        Insert or replace rows by (date, dimensions); only the partitions of their years are
+        touched, each one read-merged-replaced under its write lock like CSVStore.upsert().
+        """
+        new = self._typed(_rows_frame(rows))
+        for year, part in new.groupby(pd.to_datetime(new["date"]).dt.year):
+            year = int(year)
+            with _path_lock(self._file(year)):
+                cur = self._read(year)
+                merged = pd.concat([cur, part], ignore_index=True) if not cur.empty else part
+                self._write(year, merged.drop_duplicates(subset=KEY_COLUMNS, keep="last"))
 
-    aov = (gmv / orders) if orders > 0 else 0.0
-    conv = (orders / sessions) if sessions > 0 else 0.0
-    cac = (marketing / orders) if orders > 0 else 0.0
-    returns_rate = (returns / max(orders,1))
-    otd_rate = (otd_on_time / otd_total) if otd_total > 0 else 0.0
+    def import_csv(self, csv_path: str, chunksize: int = 100_000) -> int:
+        """Stream a daily_metrics CSV into the year partitions (CSV rows win on key clashes)."""
+        parts = {}
+        for chunk in pd.read_csv(csv_path, chunksize=chunksize, dtype={dim: str for dim in DIMENSIONS}):
+            chunk = self._typed(chunk)
+            for year, part in chunk.groupby(pd.to_datetime(chunk["date"]).dt.year):
+                parts.setdefault(int(year), []).append(part)
+        rows = 0
+        for year, frames in parts.items():
+            new = pd.concat(frames, ignore_index=True)
+            rows += len(new)
+            self.upsert(new)
+        return rows
 
-    warnings = []
-    if conv < config["thresholds"]["min_conv"]:
-        warnings.append(t(lang,"risk_low_conversion").format(val=conv*100, target=config["thresholds"]["min_conv"]*100))
-    if aov < config["thresholds"]["min_aov"]:
-        warnings.append(t(lang,"risk_low_aov").format(val=aov, target=config["thresholds"]["min_aov"]))
-    if cac > config["thresholds"]["max_cac"] and orders > 0:
-        warnings.append(t(lang,"risk_high_cac").format(val=cac, target=config["thresholds"]["max_cac"]))
-    if otd_rate < config["thresholds"]["min_otd"] and otd_total > 0:
-        warnings.append(t(lang,"risk_low_otd").format(val=otd_rate*100, target=config["thresholds"]["min_otd"]*100))
-    if returns_rate > config["thresholds"]["max_returns"] and orders > 0:
-        warnings.append(t(lang,"risk_high_returns").format(val=returns_rate*100, target=config["thresholds"]["max_returns"]*100))
+    def _read(self, year: int) -> pd.DataFrame:
+        path = self._file(year)
+        if not os.path.exists(path):
+            return pd.DataFrame(columns=COLUMNS)
+        df = self._typed(pd.read_parquet(path))
+        self._hashes[year] = self._hash(df)
+        return df
 
-    if not warnings:
-        st.success(t(lang,"risk_all_clear"))
-    else:
-        for w in warnings:
-            st.error("• " + w)
+    def _write(self, year: int, part: pd.DataFrame) -> None:
+        part = part.sort_values(KEY_COLUMNS).reset_index(drop=True)[COLUMNS]
+        tmp = _tmp_path(self._file(year))
+        part.to_parquet(tmp, index=False)
+        _replace_file(tmp, self._file(year))
+        self._hashes[year] = self._hash(part)
 
-def progress_vs_targets(df, config, lang):
-    st.subheader(t(lang,"progress_header"))
-    if df.empty:
-        st.info(t(lang,"progress_no_data"))
-        return
+    def _disk_hash(self, year: int):
+        if year not in self._hashes:
+            self._read(year)
+        return self._hashes.get(year)
 
-    df_tmp = df.copy()
-    df_tmp["year"] = pd.to_datetime(df_tmp["date"]).dt.year
-    current_year = df_tmp["year"].max()
-    dfx = df_tmp[df_tmp["year"] == current_year]
+    @staticmethod
+    def _hash(part: pd.DataFrame) -> int:
+        part = part.sort_values(KEY_COLUMNS).reset_index(drop=True)[COLUMNS]
+        return int(pd.util.hash_pandas_object(part, index=False).sum())
 
-    gmv = dfx["gmv_products"].sum()
-    orders = dfx["orders"].sum()
-    deliveries = dfx["deliveries"].sum()  # compare to annual "handover to last-mile" target
-    vendors_added = dfx["vendors_new"].sum()
+    @staticmethod
+    def _typed(df: pd.DataFrame) -> pd.DataFrame:
+        # Plain strings on disk: per-partition category dictionaries would not concat cleanly
+        return conform(df).astype({dim: str for dim in DIMENSIONS})
 
-    c1, c2, c3, c4 = st.columns(4)
-    progress_with_text(min(gmv / config["targets"]["annual_gmv"], 1.0),
-                       t(lang,"progress_gmv").format(cur=gmv, tar=config["targets"]["annual_gmv"]))
-    progress_with_text(min(orders / config["targets"]["annual_units"], 1.0),
-                       t(lang,"progress_units").format(cur=int(orders), tar=int(config["targets"]["annual_units"])))
-    progress_with_text(min(deliveries / config["targets"]["annual_deliveries"], 1.0),
-                       t(lang,"progress_deliveries").format(cur=int(deliveries), tar=int(config["targets"]["annual_deliveries"])))
-    progress_with_text(min(vendors_added / config["targets"]["annual_vendors"], 1.0),
-                       t(lang,"progress_vendors").format(cur=int(vendors_added), tar=int(config["targets"]["annual_vendors"])))
+    @property
+    def cache_key(self) -> str:
+        return f"parquet:{os.path.abspath(self.path)}"
 
-def charts(df, lang):
-    st.subheader(t(lang,"trends_header"))
-    if df.empty:
-        return
-    df_plot = df.copy()
-    df_plot["date"] = pd.to_datetime(df_plot["date"])
-    df_plot = df_plot.sort_values("date")
+    def version(self):
+        """Change marker: (year, mtime, size, inode) of every partition."""
+        marker = []
+        for year in self.years():
+            version = _file_version(self._file(year))
+            if version is None:
+                return None
+            marker.append((year, *version))
+        return tuple(marker)
 
-    st.line_chart(df_plot.set_index("date")[["gmv_products","orders","deliveries","marketing_spend"]], height=260)
-    st.line_chart(df_plot.set_index("date")[["otd_on_time","otd_total","returns"]], height=200)
+def migrate_csv_to_parquet(csv_path: str = DATA_PATH, parquet_dir: str = PARQUET_DIR) -> int:
+    """One-shot migration of the CSV history into the Parquet backend; returns rows imported."""
+    if not os.path.exists(csv_path):
+        return 0
+    return ParquetStore(parquet_dir).import_csv(csv_path)
 
-# -------------------- Input / Export --------------------
-def input_form(df, store, lang):
-    st.subheader(t(lang,"form_header"))
-    with st.form("daily_input"):
-        c1, c2, c3 = st.columns(3)
-        d = c1.date_input(t(lang,"date"), value=date.today())
-        sessions = c2.number_input(t(lang,"sessions"), min_value=0, step=10)
-        orders = c3.number_input(t(lang,"orders"), min_value=0, step=1)
+class SQLiteStore:
+    """
+    SQLite storage (stdlib): one row per (date, vendor, city, channel) PRIMARY KEY, WAL journal
+    so readers never block the writer. Saves are single-row INSERT ... ON CONFLICT upserts, and
+    period_snapshot() returns the today/MTD/YTD snapshot computed in SQL instead of over the full
+    history in pandas; (dimension, date) indexes serve sliced snapshots without a table scan.
+    """
+    TABLE = "daily_metrics"
+    REAL_COLUMNS = set(FLOAT_COLUMNS)
 
-        c4, c5, c6 = st.columns(3)
-        gmv = c4.number_input(t(lang,"gmv"), min_value=0.0, step=10.0, format="%.2f")
-        marketing = c5.number_input(t(lang,"marketing"), min_value=0.0, step=5.0, format="%.2f")
-        deliveries = c6.number_input(t(lang,"deliveries"), min_value=0, step=1)
+    def __init__(self, path: str):
+        self.path = path
+        with closing(self._connect()) as con, con:
+            con.execute("PRAGMA journal_mode=WAL")
+            existing = {r[1] for r in con.execute(f"PRAGMA table_info({self.TABLE})")}
+            if existing and not set(DIMENSIONS) <= existing:
+                # Pre-dimension table keyed on date alone: rebuild it under the composite key
+                con.execute(f"ALTER TABLE {self.TABLE} RENAME TO {self.TABLE}_v1")
+                self._create(con)
+                metrics = ", ".join(c for c in METRIC_COLUMNS if c in existing)
+                con.execute(f"INSERT INTO {self.TABLE} (date, {metrics}) SELECT date, {metrics} FROM {self.TABLE}_v1")
+                con.execute(f"DROP TABLE {self.TABLE}_v1")
+            else:
+                self._create(con)
 
-        c7, c8, c9 = st.columns(3)
-        returns = c7.number_input(t(lang,"returns"), min_value=0, step=1)
-        first_mile = c8.number_input(t(lang,"first_mile"), min_value=0, step=1)
-        pod = c9.number_input(t(lang,"handoff"), min_value=0, step=1)
+    def _create(self, con: sqlite3.Connection) -> None:
+        metrics = ", ".join(
+            f"{c} {'REAL' if c in self.REAL_COLUMNS else 'INTEGER'} NOT NULL DEFAULT 0" for c in METRIC_COLUMNS
+        )
+        dims = ", ".join(f"{d} TEXT NOT NULL DEFAULT ''" for d in DIMENSIONS)
+        con.execute(f"CREATE TABLE IF NOT EXISTS {self.TABLE} "
+                    f"(date TEXT NOT NULL, {dims}, {metrics}, PRIMARY KEY ({', '.join(KEY_COLUMNS)}))")
+        for d in DIMENSIONS:
+            con.execute(f"CREATE INDEX IF NOT EXISTS ix_{self.TABLE}_{d} ON {self.TABLE} ({d}, date)")
 
-        c10, c11, c12 = st.columns(3)
-        vendors_new = c10.number_input(t(lang,"vendors_new"), min_value=0, step=1)
-        skus_added = c11.number_input(t(lang,"skus_added"), min_value=0, step=5)
-        skus_backlog = c12.number_input(t(lang,"skus_backlog"), min_value=0, step=5)
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=10)
 
-        c13, c14, c15 = st.columns(3)
-        csat = c13.number_input(t(lang,"csat"), min_value=0.0, max_value=100.0, step=1.0, format="%.0f")
-        otd_total = c14.number_input(t(lang,"otd_total"), min_value=0, step=1)
+    @traced
+    def load(self) -> pd.DataFrame:
+        with closing(self._connect()) as con:
+            df = pd.read_sql_query(f"SELECT {', '.join(COLUMNS)} FROM {self.TABLE} ORDER BY date", con,
+                                   dtype={c: SCHEMA[c] for c in METRIC_COLUMNS},
+                                   parse_dates={"date": "%Y-%m-%d"})
+        return conform(df)
+
+    @traced
+    def save(self, df: pd.DataFrame) -> None:
+        """Replace the table contents with df in one transaction."""
+        with closing(self._connect()) as con, con:
+            con.execute(f"DELETE FROM {self.TABLE}")
+            con.executemany(self._upsert_sql(), self._params(df))
+
+    @traced
+    def upsert(self, rows) -> None:
+        """Insert or replace rows by key (ON CONFLICT(date, vendor, city, channel) DO UPDATE)."""
+        with closing(self._connect()) as con, con:
+            con.executemany(self._upsert_sql(), self._params(_rows_frame(rows)))
+
+    def is_empty(self) -> bool:
+        with closing(self._connect()) as con:
+            return con.execute(f"SELECT 1 FROM {self.TABLE} LIMIT 1").fetchone() is None
+
+    @traced
+    def period_snapshot(self, filters: dict = None):
+        """
+        Same PeriodSnapshot as build_snapshot(df) — optionally for one slice, e.g.
+        {"vendor": "X"} — aggregated in SQL over the latest year only.
+        """
+        filters = {d: v for d, v in (filters or {}).items() if d in DIMENSIONS}
+        where = "".join(f" AND {d} = :f_{d}" for d in filters)
+        params = {f"f_{d}": v for d, v in filters.items()}
+        sums = ", ".join(
+            f"SUM(CASE WHEN date = :today THEN {c} ELSE 0 END), "
+            f"SUM(CASE WHEN date >= :month_start THEN {c} ELSE 0 END), "
+            f"SUM({c})"
+            for c in ADDITIVE_COLUMNS
+        )
+        with closing(self._connect()) as con:
+            latest = con.execute(f"SELECT MAX(date) FROM {self.TABLE} WHERE 1=1{where}", params).fetchone()[0]
+            if latest is None:
+                return None
+            latest = date.fromisoformat(latest)
+            bounds = {
+                "today": latest.isoformat(),
+                "month_start": latest.replace(day=1).isoformat(),
+                "year_start": latest.replace(month=1, day=1).isoformat(),
+                **params,
+            }
+            row = con.execute(
+                f"SELECT {sums} FROM {self.TABLE} WHERE date >= :year_start AND date <= :today{where}", bounds
+            ).fetchone()
+        today, mtd, ytd = {}, {}, {}
+        for i, col in enumerate(ADDITIVE_COLUMNS):
+            today[col], mtd[col], ytd[col] = (v or 0 for v in row[3 * i:3 * i + 3])
+        return PeriodSnapshot(latest=latest, today=today, mtd=mtd, ytd=ytd)
+
+    def _upsert_sql(self) -> str:
+        updates = ", ".join(f"{c}=excluded.{c}" for c in METRIC_COLUMNS)
+        return (f"INSERT INTO {self.TABLE} ({', '.join(COLUMNS)}) VALUES ({', '.join('?' * len(COLUMNS))}) "
+                f"ON CONFLICT({', '.join(KEY_COLUMNS)}) DO UPDATE SET {updates}")
+
+    @staticmethod
+    def _params(df: pd.DataFrame) -> list:
+        out = conform(df)
+        out["date"] = pd.to_datetime(out["date"]).dt.strftime("%Y-%m-%d")
+        out = out.astype({dim: str for dim in DIMENSIONS})
+        return out.astype(object).values.tolist()
+
+    @property
+    def cache_key(self) -> str:
+        return f"sqlite:{os.path.abspath(self.path)}"
+
+    def version(self):
+        """Change marker: mtime/size of the database and its WAL file."""
+        marker = []
+        for path in (self.path, self.path + "-wal"):
+            try:
+                info = os.stat(path)
+                marker.append((info.st_mtime_ns, info.st_size))
+            except OSError:
+                marker.append(None)
+        return tuple(marker)
+
+SHEETS_SCOPES = [
+    "https://www.googleapis.com/auth/spreadsheets",
+    "https://www.googleapis.com/auth/drive",
+]
+
+class _SheetIndex:
+    """
+    What a GSheetsStore knows of the sheet's layout, stamped with the revision it matches.
+    Lives on the shared connection, so every session's store reuses one index instead of
+    re-downloading the key columns; `lock` serializes the stores reading and updating it.
+    """
+    def __init__(self):
+        self.rows = None      # (date, vendor, city, channel) -> 1-based sheet row
+        self.snapshot = None  # key -> row values as last seen on the sheet
+        self.revision = None  # version() the rows/snapshot match (None: unknown)
+        self.lock = threading.RLock()
+
+class _SheetsConnection:
+    """Authorized gspread client + worksheet handle, shared by every session in the process."""
+    def __init__(self, creds, client, sheet, ws):
+        self.creds = creds
+        self.client = client
+        self.sheet = sheet
+        self.ws = ws
+        self.index = _SheetIndex()
+
+    def healthy(self) -> bool:
+        """Valid token, or one we can still refresh (a dead service account forces a reconnect)."""
+        if self.creds.valid:
+            return True
+        try:
+            from google.auth.transport.requests import Request
+            self.creds.refresh(Request())
+            return True
+        except Exception:
+            return False
+
+@st.cache_resource(show_spinner=False, validate=lambda conn: conn.healthy())
+def _sheets_connection(spreadsheet_id: str, worksheet_title: str) -> _SheetsConnection:
+    """Cold-start cost (credentials, authorize, open_by_key, worksheet) paid once per process."""
+    import gspread
+    from google.oauth2.service_account import Credentials
+
+    creds = Credentials.from_service_account_info(st.secrets["gcp_service_account"], scopes=SHEETS_SCOPES)
+    client = gspread.authorize(creds)
+    sh = client.open_by_key(spreadsheet_id)
+    try:
+        ws = sh.worksheet(worksheet_title)
+    except Exception:
+        ws = sh.add_worksheet(title=worksheet_title, rows=1000, cols=len(COLUMNS))
+        ws.update([COLUMNS])
+    return _SheetsConnection(creds, client, sh, ws)
+
+def _is_auth_error(e: Exception) -> bool:
+    status = getattr(getattr(e, "response", None), "status_code", None)
+    return status == 401 or type(e).__name__ == "RefreshError"
+
+def _reconnect_on_auth_error(method):
+    """Retry a GSheetsStore call once on a fresh connection when auth has expired."""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        try:
+            return method(self, *args, **kwargs)
+        except Exception as e:
+            if not _is_auth_error(e):
+                raise
+            self._connect(fresh=True)
+            if not self.ready:
+                raise
+            return method(self, *args, **kwargs)
+    return wrapper
+
+class GSheetsStore:
+    """
+    Google Sheets storage with gspread.
+    Writes are row-level: a (date, dimensions) -> sheet-row index maps each fact to its row, edits are
+    staged and flushed in one batch_update. The sheet is only rewritten wholesale when
+    its header no longer matches COLUMNS. The index lives on the shared connection (one per
+    process) and is stamped with the sheet revision it was read at or last written to; it is
+    re-read before a flush only if the revision moved, so rows another writer appended meanwhile
+    are updated in place instead of overwritten by our appends.
+    """
+    def __init__(self, spreadsheet_id: str, worksheet_title: str = "daily_metrics", worksheet=None):
+        self.ready = False
+        self.error = None
+        self.spreadsheet_id = spreadsheet_id
+        self.worksheet_title = worksheet_title
+        self._index = _SheetIndex()  # replaced by the shared connection's index on connect
+        self._pending = {}           # key -> row values staged for the next flush
+        if worksheet is not None:
+            # Already-open worksheet (e.g. a FakeWorksheet for benchmarks): no auth, no secrets
+            self.client = None
+            self.sheet = _TracedSheets(worksheet.spreadsheet)
+            self.ws = _TracedSheets(worksheet)
+            self.ready = True
+            return
+        try:  # availability check; the shared connection does the actual imports
+            import gspread
+            from google.oauth2.service_account import Credentials
+        except Exception as e:
+            self.error = f"Missing gspread/google-auth: {e}"
+            return
+
+        # Secrets-safe: gracefully handle missing secrets or malformed files
+        try:
+            _sa = st.secrets["gcp_service_account"]
+            _gs = st.secrets["gsheets"]
+        except Exception:
+            self.error = "Secrets not found."
+            return
+
+        self._connect()
+
+    @traced
+    def _connect(self, fresh: bool = False) -> None:
+        """Attach to the process-wide connection; fresh=True drops it and re-authorizes."""
+        if fresh:
+            _sheets_connection.clear()
+        try:
+            conn = _sheets_connection(self.spreadsheet_id, self.worksheet_title)
+            self.client = conn.client
+            self.sheet = _TracedSheets(conn.sheet)
+            self.ws = _TracedSheets(conn.ws)
+            self._index = conn.index
+            self.ready = True
+        except Exception as e:
+            self.error = f"GSheets auth/open failed: {e}"
+            self.ready = False
+
+    @_reconnect_on_auth_error
+    def _fetch_rows(self) -> list:
+        return self.ws.get_all_values()
+
+    @traced
+    def load(self) -> pd.DataFrame:
+        if not self.ready:
+            return conform(pd.DataFrame(columns=COLUMNS))
+        with self._index.lock:
+            try:
+                self._index.revision = self.version()  # taken first: a write racing the read shows up as a change
+                rows = self._fetch_rows()
+                if not rows:
+                    self.ws.update([COLUMNS])
+                    self._remember([COLUMNS])
+                    return conform(pd.DataFrame(columns=COLUMNS))
+                self._remember(rows)
+                header = rows[0]
+                data = rows[1:]
+                return conform(pd.DataFrame(data, columns=header))
+            except Exception:
+                self._index.rows = self._index.snapshot = None
+                return conform(pd.DataFrame(columns=COLUMNS))
+
+    @traced
+    @_reconnect_on_auth_error
+    def save(self, df: pd.DataFrame) -> None:
+        """
+        Replace the sheet's rows with df, writing only the rows that differ (full rewrite on
+        schema change). Rows missing from df are deleted in the same batch_update.
+        """
+        if not self.ready:
+            return
+        values = self._serialize(df)
+        with self._index.lock:
+            revision = self._check_revision()
+            if self._index.snapshot is None:
+                self._remember(self.ws.get_all_values())
+                self._index.revision = revision
+            if self._index.rows is None:
+                self._rewrite(values)
+                return
+            self._pending = {}  # df is the whole new content: nothing staged before it survives
+            keep = {self._key(v) for v in values}
+            if any(key not in keep for key in self._index.rows):
+                self._replace_rows(values)
+                return
+            self.stage([v for v in values if self._index.snapshot.get(self._key(v)) != v])
+            self.flush()
+
+    @traced
+    @_reconnect_on_auth_error
+    def upsert(self, rows) -> None:
+        """Insert or replace rows by (date, dimensions) in a single batch_update."""
+        if not self.ready:
+            return
+        self.stage(self._serialize(_rows_frame(rows)))
+        self.flush()
+
+    def stage(self, values: list) -> None:
+        """Queue serialized rows for the next flush(); the last edit per key wins."""
+        for v in values:
+            self._pending[self._key(v)] = v
+
+    def flush(self) -> None:
+        """Send all staged rows: existing keys update their row range, new keys append."""
+        if not self._pending:
+            return
+        from gspread.utils import rowcol_to_a1
+
+        with self._index.lock:
+            revision = self._check_revision()
+            if self._index.rows is None:
+                # Header plus just the key columns (date, and the trailing dimension block)
+                last_col = "".join(ch for ch in rowcol_to_a1(1, len(COLUMNS)) if ch.isalpha())
+                dims_range = f"{rowcol_to_a1(2, COLUMNS.index(DIMENSIONS[0]) + 1)}:{last_col}"
+                header, dates, dims = self.ws.batch_get(["1:1", "A2:A", dims_range])
+                if (header[0] if header else []) != COLUMNS:
+                    # Schema changed underneath us: migrate the table once with a full rewrite.
+                    merged = {self._key(v): v for v in self._serialize(self.load())}
+                    merged.update(self._pending)
+                    self._pending = {}
+                    self._rewrite(sorted(merged.values()))
+                    return
+                self._index.rows, self._index.revision = {}, revision
+                for i, r in enumerate(dates):
+                    if r and r[0]:
+                        d = list(dims[i]) if i < len(dims) else []
+                        self._index.rows[(r[0], *(d + [""] * len(DIMENSIONS))[:len(DIMENSIONS)])] = i + 2
+
+            first_new = max(self._index.rows.values(), default=1) + 1
+            updates, appends = [], []
+            for key, v in self._pending.items():
+                row = self._index.rows.get(key)
+                if row is None:
+                    self._index.rows[key] = first_new + len(appends)
+                    appends.append(v)
+                    continue
+                updates.append({
+                    "range": f"{rowcol_to_a1(row, 1)}:{rowcol_to_a1(row, len(COLUMNS))}",
+                    "values": [v],
+                })
+            if appends:
+                # New keys go in as one contiguous block below the last row
+                last_row = first_new + len(appends) - 1
+                updates.append({
+                    "range": f"{rowcol_to_a1(first_new, 1)}:{rowcol_to_a1(last_row, len(COLUMNS))}",
+                    "values": appends,
+                })
+                if last_row > self.ws.row_count:
+                    self.ws.add_rows(last_row - self.ws.row_count)
+            self.ws.batch_update(updates)
+            if self._index.snapshot is not None:
+                self._index.snapshot.update(self._pending)
+            self._pending = {}
+            self._index.revision = self.version()  # our own write: the index stays valid for the next flush
+
+    def _check_revision(self):
+        """
+        Compare-and-swap guard: drop the row index and snapshot when the sheet revision differs
+        from the one they were read at or last written to. Returns the current revision. Best effort — Sheets has no
+        transactions, and within one process the WriteQueue already serializes writers.
+        """
+        current = self.version()
+        if self._index.rows is not None and (self._index.revision is None or current != self._index.revision):
+            self._index.rows = self._index.snapshot = None
+        return current
+
+    def _replace_rows(self, values: list) -> None:
+        """
+        save() that deletes rows: the surviving rows keep their order and close the gaps, new rows
+        follow, and the rows freed at the bottom are blanked, all in one batch_update starting at
+        the first row that changes.
+        """
+        from gspread.utils import rowcol_to_a1
+
+        wanted = {self._key(v): v for v in values}
+        on_sheet = sorted(self._index.rows, key=self._index.rows.get)
+        layout = [wanted.pop(k) for k in on_sheet if k in wanted] + list(wanted.values())
+        at_row = {row: self._index.snapshot.get(key) for key, row in self._index.rows.items()}
+        first = next((i for i, v in enumerate(layout) if at_row.get(i + 2) != v), len(layout))
+        last_row = max(len(layout) + 1, max(self._index.rows.values(), default=1))
+        rows = layout[first:] + [[""] * len(COLUMNS)] * (last_row - 1 - len(layout))
+        if last_row > self.ws.row_count:
+            self.ws.add_rows(last_row - self.ws.row_count)
+        self.ws.batch_update([{
+            "range": f"{rowcol_to_a1(first + 2, 1)}:{rowcol_to_a1(last_row, len(COLUMNS))}",
+            "values": rows,
+        }])
+        self._index.rows = {self._key(v): i + 2 for i, v in enumerate(layout)}
+        self._index.snapshot = {self._key(v): v for v in layout}
+        self._index.revision = self.version()
+
+    def _rewrite(self, values: list) -> None:
+        self.ws.clear()
+        if len(values) + 1 > self.ws.row_count:  # values.update does not grow the grid
+            self.ws.add_rows(len(values) + 1 - self.ws.row_count)
+        self.ws.update([COLUMNS] + values)
+        self._remember([COLUMNS] + values)
+        self._index.revision = self.version()
+
+    def _remember(self, rows: list) -> None:
+        """Rebuild the row index / snapshot from raw sheet values (None if the header is off)."""
+        if not rows or rows[0] != COLUMNS:
+            self._index.rows = self._index.snapshot = None
+            return
+        self._index.rows, self._index.snapshot = {}, {}
+        for i, r in enumerate(rows[1:]):
+            if r and r[0]:
+                r = (list(r) + [""] * len(COLUMNS))[:len(COLUMNS)]
+                self._index.rows[self._key(r)] = i + 2
+                self._index.snapshot[self._key(r)] = r
+
+    @staticmethod
+    def _key(values: list) -> tuple:
+        """(date, vendor, city, channel) of a serialized row."""
+        return tuple(values[COLUMNS.index(c)] for c in KEY_COLUMNS)
+
+    @staticmethod
+    def _serialize(df: pd.DataFrame) -> list:
+        out = conform(df)
+        out["date"] = pd.to_datetime(out["date"]).dt.strftime("%Y-%m-%d")
+        return out.astype(str).values.tolist()
+
+    @property
+    def cache_key(self) -> str:
+        return f"gsheets:{self.spreadsheet_id}/{self.worksheet_title}"
+
+    def version(self):
+        """Revision marker: the spreadsheet's Drive modifiedTime (None if unavailable)."""
+        if not self.ready:
+            return None
+        try:
+            return self.sheet.get_lastUpdateTime()
+        except Exception:
+            return None
+
+def _filter_key(filters: dict) -> tuple:
+    """Hashable, order-independent form of a {dimension: value} slice (unset values dropped)."""
+    return tuple(sorted((d, v) for d, v in (filters or {}).items() if d in DIMENSIONS and v is not None))
+
+class FactIndex:
+    """
+    Lookup structure over the fact table (rows sorted by date), built once per data version:
+    per-dimension postings (value -> sorted row positions) and a (date, dims...) key index.
+    A slice like "vendor X, MTD" intersects the postings and binary-searches the date range
+    instead of masking the whole frame.
+    """
+    def __init__(self, df: pd.DataFrame):
+        self.df = df
+        self.dates = pd.to_datetime(df["date"]).to_numpy()
+        self.postings = {
+            dim: {v: np.asarray(pos) for v, pos in df.groupby(dim, observed=True, sort=False).indices.items()}
+            for dim in DIMENSIONS
+        } if not df.empty else {dim: {} for dim in DIMENSIONS}
+        self._keys = None
+
+    def values(self, dim: str) -> list:
+        return sorted(self.postings[dim])
+
+    def positions(self, filters: dict = None, start: date = None, end: date = None) -> np.ndarray:
+        pos = None
+        for dim, value in _filter_key(filters):
+            hits = self.postings[dim].get(value, np.empty(0, dtype=np.intp))
+            pos = hits if pos is None else np.intersect1d(pos, hits, assume_unique=True)
+        if pos is None:
+            pos = np.arange(len(self.df))
+        if start is not None or end is not None:
+            dates = self.dates[pos]  # still sorted: positions ascend and the frame is date-sorted
+            lo = 0 if start is None else np.searchsorted(dates, np.datetime64(start, "ns"), side="left")
+            hi = len(pos) if end is None else np.searchsorted(dates, np.datetime64(end, "ns"), side="right")
+            pos = pos[lo:hi]
+        return pos
+
+    def select(self, filters: dict = None, start: date = None, end: date = None) -> pd.DataFrame:
+        if not _filter_key(filters) and start is None and end is None:
+            out = self.df
+        else:
+            out = self.df.iloc[self.positions(filters, start, end)]
+        trace_count(rows=len(out))  # rows handed to the card that asked
+        return out
+
+    def lookup(self, rows: pd.DataFrame) -> pd.DataFrame:
+        """The currently stored rows that share a key with `rows`."""
+        as_str = {dim: str for dim in DIMENSIONS}
+        if self._keys is None:
+            self._keys = pd.MultiIndex.from_frame(self.df[KEY_COLUMNS].astype(as_str))
+        wanted = pd.MultiIndex.from_frame(rows[KEY_COLUMNS].astype(as_str))
+        if self._keys.is_unique:
+            pos = self._keys.get_indexer(wanted)
+            return self.df.iloc[pos[pos >= 0]]
+        return self.df[self._keys.isin(wanted)]
+
+class WriteQueue:
+    """
+    Group commit for one backend, shared by every session in the process. Each submit() queues
+    its rows; a caller that finds no write in flight becomes the writer and commits everything
+    queued so far (last row per key wins) in one backend write, then hands over to the next
+    waiter. Callers whose rows rode along just return, so N concurrent saves cost one or two
+    backend writes instead of N racing read-modify-writes.
+    """
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._queued = []      # [(rows frame, meta, ticket)]
+        self._writing = False
+
+    def submit(self, rows: pd.DataFrame, commit, meta=None) -> None:
+        """
+        Queue rows and return once they are written. commit(frame, parts) does the backend write;
+        parts lists each coalesced submit's (rows, meta) in arrival order.
+        """
+        ticket = {"done": False, "error": None}
+        with self._cond:
+            self._queued.append((rows, meta, ticket))
+            while self._writing and not ticket["done"]:
+                self._cond.wait()
+            if ticket["done"]:
+                batch = None
+            else:
+                batch, self._queued, self._writing = self._queued, [], True
+        if batch is not None:
+            error = None
+            try:
+                parts = [(f, meta) for f, meta, _ in batch]
+                frames = [f for f, _ in parts]
+                commit(frames[0] if len(frames) == 1 else _rows_frame(pd.concat(frames, ignore_index=True)), parts)
+            except BaseException as e:
+                error = e
+            finally:
+                with self._cond:
+                    for _, _, waiting in batch:
+                        waiting.update(done=True, error=error)
+                    self._writing = False
+                    self._cond.notify_all()
+        if ticket["error"] is not None:
+            raise ticket["error"]
+
+@st.cache_resource(show_spinner=False)
+def _write_queues() -> dict:
+    """Process-wide {store cache_key: WriteQueue}."""
+    return {"lock": threading.Lock(), "by_store": {}}
+
+def _write_queue(cache_key: str) -> WriteQueue:
+    registry = _write_queues()
+    with registry["lock"]:
+        return registry["by_store"].setdefault(cache_key, WriteQueue())
+
+class CachedStore:
+    """
+    Session-scoped read cache in front of a store.
+    Entries are keyed on the backend identity and stamped with its version token;
+    after `ttl` seconds the token is re-checked and the data reloaded only if it moved.
+    A save()/upsert() invalidates the entry; upserts are coalesced with other sessions' on the
+    backend's WriteQueue, roll their deltas into the shared Rollups and, given an AuditLog,
+    log the cells they changed. Other attributes pass through to the store.
+    """
+    def __init__(self, store, ttl: float = CACHE_TTL_SECONDS, audit: "AuditLog" = None):
+        self.store = store
+        self.ttl = ttl
+        self.audit = audit
+
+    def __getattr__(self, name):
+        return getattr(self.store, name)
+
+    def _entries(self) -> dict:
+        return st.session_state.setdefault("_data_cache", {})
+
+    def _entry(self) -> dict:
+        entry = self._entries().get(self.store.cache_key)
+        if entry is None:
+            self.load()
+            entry = self._entries()[self.store.cache_key]
+        return entry
+
+    @traced
+    def load(self) -> pd.DataFrame:
+        entries = self._entries()
+        entry = entries.get(self.store.cache_key)
+        now = time.monotonic()
+        if entry is not None and now - entry["checked"] < self.ttl:
+            return entry["df"].copy()
+
+        version = self.store.version()
+        if entry is not None and version is not None and version == entry["version"]:
+            entry["checked"] = now
+            return entry["df"].copy()
+
+        # Kept sorted by date so the FactIndex can binary-search date ranges
+        df = self.store.load().sort_values("date", kind="stable").reset_index(drop=True)
+        entries[self.store.cache_key] = {"version": version, "checked": now, "df": df}
+        return df.copy()
+
+    def fact_index(self) -> "FactIndex":
+        """FactIndex over the cached data, built once per data version."""
+        entry = self._entry()
+        if "index" not in entry:
+            entry["index"] = FactIndex(entry["df"])
+        return entry["index"]
+
+    def select(self, filters: dict = None, start: date = None, end: date = None) -> pd.DataFrame:
+        """Rows of one slice / date range, served from the FactIndex."""
+        return self.fact_index().select(filters, start, end).copy()
+
+    @traced
+    def period_snapshot(self, filters: dict = None):
+        """
+        PeriodSnapshot for the cached data, once per data version and slice: SQL for SQLite,
+        the rollups for the unfiltered view, else a pass over just the slice's rows.
+        """
+        entry = self._entry()
+        snapshots = entry.setdefault("snapshots", {})
+        key = _filter_key(filters)
+        if key not in snapshots:
+            if hasattr(self.store, "period_snapshot"):
+                snapshots[key] = self.store.period_snapshot(dict(key))
+            elif not key:
+                snapshots[key] = self.rollups().snapshot()
+            else:
+                snapshots[key] = build_snapshot(self.fact_index().select(dict(key)))
+        return snapshots[key]
+
+    def rollups(self):
+        """
+        Process-wide monthly/yearly rollups for this backend. Reused while their version stamp
+        matches the cached data; rebuilt from the full frame only when someone else changed it.
+        """
+        entry = self._entry()
+        registry = _rollup_registry()
+        with registry["lock"]:
+            rollups = registry["by_store"].get(self.store.cache_key)
+            if rollups is None or entry["version"] is None or rollups.version != entry["version"]:
+                rollups = Rollups.from_frame(entry["df"], version=entry["version"])
+                registry["by_store"][self.store.cache_key] = rollups
+        return rollups
+
+    def projections(self, targets: dict, finance: dict, filters: dict = None):
+        """
+        project() for a slice, once per data version, slice and target/finance settings. The
+        unfiltered view reads the shared Rollups, which saves keep current by deltas.
+        """
+        entry = self._entry()
+        cached = entry.setdefault("projections", {})
+        key = (_filter_key(filters), tuple(sorted(targets.items())), tuple(sorted(finance.items())))
+        if key not in cached:
+            cached[key] = project(self.slice_rollups(filters), targets, finance)
+        return cached[key]
+
+    def slice_rollups(self, filters: dict = None):
+        """The shared rollups() for the whole business, else Rollups of the slice once per data version."""
+        key = _filter_key(filters)
+        if not key:
+            return self.rollups()
+        cached = self._entry().setdefault("slice_rollups", {})
+        if key not in cached:
+            cached[key] = Rollups.from_frame(self.fact_index().select(filters))
+        return cached[key]
+
+    def anomalies(self, filters: dict = None) -> list:
+        """Flagged days within ANOMALY_RECENT_DAYS of the latest, for the whole business or a slice."""
+        return self.slice_rollups(filters).anomalies().recent()
+
+    def rolling_kpis(self, windows=ROLLING_WINDOWS, filters: dict = None) -> pd.DataFrame:
+        """rolling_kpis() for the cached data, computed once per data version, window set and slice."""
+        entry = self._entry()
+        cached = entry.setdefault("rolling", {})
+        key = (tuple(windows), _filter_key(filters))
+        if key not in cached:
+            cached[key] = rolling_kpis(self.fact_index().select(filters), windows)
+        return cached[key]
+
+    def chart_data(self, columns: list, filters: dict = None, granularity: str = "day",
+                   start: date = None, end: date = None) -> pd.DataFrame:
+        """
+        chart_frame() of one chart's columns — daily sums, or rolling KPIs ("<kpi>_<w>d") —
+        for a slice, computed once per data version, slice, granularity and range.
+        """
+        entry = self._entry()
+        cached = entry.setdefault("charts", {})
+        key = (tuple(columns), _filter_key(filters), granularity, start, end)
+        if key not in cached:
+            if set(columns) <= set(ADDITIVE_COLUMNS):
+                series, how = daily_sums(self.fact_index().select(filters)), "sum"
+            else:
+                series, how = self.rolling_kpis(filters=filters), "last"
+            cached[key] = chart_frame(series[list(columns)], granularity, start, end, how)
+        return cached[key]
+
+    def export(self, fmt: str, filters: dict = None, start: date = None, end: date = None):
+        """
+        Zero-argument builder for an export of one slice / date range. Nothing is serialized
+        until it is called; the bytes are then kept per data version, format and range.
+        """
+        exports = self._entry().setdefault("exports", {})
+        index = self.fact_index()
+        key = (fmt, _filter_key(filters), start, end)
+
+        def build() -> bytes:
+            if key not in exports:
+                buf = io.BytesIO()
+                write_export(index.select(filters, start, end), buf, fmt)
+                exports[key] = buf.getvalue()
+            return exports[key]
+        return build
+
+    def memo(self, key, compute):
+        """compute() once per data version and key (e.g. a dashboard section's derived table)."""
+        cached = self._entry().setdefault("memo", {})
+        if key not in cached:
+            cached[key] = compute()
+        return cached[key]
+
+    def save(self, df: pd.DataFrame) -> None:
+        self.store.save(df)
+        self.invalidate()
+
+    @traced
+    def upsert(self, rows) -> None:
+        """
+        Per-key merge through the backend's process-wide WriteQueue: concurrent saves from other
+        sessions are coalesced into the same backend write. Returns once the rows are written.
+        """
+        user = current_user() if self.audit is not None else None
+        try:
+            _write_queue(self.store.cache_key).submit(_rows_frame(rows), self._commit, user)
+        finally:
+            self.invalidate()
+
+    def _commit(self, new: pd.DataFrame, parts: list) -> None:
+        """
+        Write one coalesced batch (the WriteQueue runs one at a time per backend). The backend
+        write happens outside the process-wide rollup lock, which is only taken to roll the
+        deltas in, and only if nobody replaced or rebuilt the rollups meanwhile.
+        """
+        registry = _rollup_registry()
+        version = self.store.version()
+        entry = self._entries().get(self.store.cache_key)
+        if self.audit is not None and (entry is None or entry["version"] != version):
+            self.invalidate()  # the log needs the exact cells being overwritten
+            entry = self._entry()
+        with registry["lock"]:
+            rollups = registry["by_store"].get(self.store.cache_key)
+        in_sync = rollups is not None and rollups.version is not None and entry is not None \
+            and rollups.version == entry["version"] == version
+        previous = self.fact_index().lookup(new) if in_sync or self.audit is not None else None
+        self.store.upsert(new)
+        if in_sync:
+            written = self.store.version()
+            with registry["lock"]:
+                if registry["by_store"].get(self.store.cache_key) is rollups and rollups.version == version:
+                    # Apply the per-day deltas instead of re-summing the history on the next rerun
+                    rollups.apply(new, previous)
+                    rollups.version = written
+        if self.audit is not None:
+            self._log(previous, parts)
+
+    def _log(self, previous: pd.DataFrame, parts: list) -> None:
+        """One audit line per coalesced save, each diffed against the rows the saves before it left."""
+        ts = time.time()
+        for i, (rows, user) in enumerate(parts):
+            self.audit.record(self.store.cache_key, user, AuditLog.diff(previous, rows), ts)
+            if i + 1 < len(parts):
+                previous = _rows_frame(pd.concat([previous, rows], ignore_index=True))
+
+    def as_of(self, when: float) -> "CachedStore":
+        """
+        Read-only CachedStore over this backend's data as it stood at `when` (epoch seconds),
+        rebuilt from the current rows and the audit log's later changes on first use.
+        """
+        def build() -> pd.DataFrame:
+            return self.audit.as_of(self._entry()["df"], self.store.cache_key, when)
+        # Keyed on the full-precision time: saves a fraction of a second apart are different views
+        return CachedStore(AsOfStore(f"{self.store.cache_key}@{when!r}", build), ttl=float("inf"))
+
+    def invalidate(self) -> None:
+        self._entries().pop(self.store.cache_key, None)
+
+# -------------------- Audit log --------------------
+def current_user() -> str:
+    """Who is saving: the signed-in viewer's email where the app has auth, else the OS account."""
+    try:
+        email = st.user.get("email")
+    except Exception:
+        email = None
+    if email:
+        return str(email)
+    try:
+        return getpass.getuser()
+    except Exception:
+        return "unknown"
+
+def day_end(d: date) -> float:
+    """Epoch seconds of local midnight after `d`: the as_of() cut-off for "the data at the end of d"."""
+    return time.mktime((d + timedelta(days=1)).timetuple())
+
+def _audit_keys(df: pd.DataFrame) -> pd.MultiIndex:
+    """(ISO date, vendor, city, channel) strings: a row's key as the audit log writes it."""
+    return pd.MultiIndex.from_arrays([df["date"].dt.strftime("%Y-%m-%d")] + [df[d].astype(str) for d in DIMENSIONS])
+
+def _audit_cell(col: str, value: float):
+    """A metric cell as compact JSON: counts as ints, CSAT with its float32 digits (4.2, not 4.199999809)."""
+    if SCHEMA[col].startswith("int"):
+        return int(value)
+    return float(str(np.float32(value))) if SCHEMA[col] == "float32" else float(value)
+
+class AuditLog:
+    """
+    Append-only change log of the daily metrics, one JSON line per save:
+    {"ts": epoch seconds, "store": cache_key, "user": ..., "changes": [{"k": [date, vendor, city,
+    channel], "c": {column: [old, new]}, "n": 1 if the row is new}]}. Only changed cells are
+    written, so the log grows with the edits, not the history. as_of() undoes the changes made
+    after a point in time on top of the current rows.
+    """
+    def __init__(self, path: str = AUDIT_LOG_PATH):
+        self.path = path
+
+    @staticmethod
+    def diff(previous: pd.DataFrame, rows: pd.DataFrame) -> list:
+        """The log's changes for writing `rows` over `previous` (the stored rows sharing their keys)."""
+        keys = _audit_keys(rows)
+        previous = previous[~_audit_keys(previous).duplicated(keep="last")]
+        pos = _audit_keys(previous).get_indexer(keys)
+        created = pos < 0
+        new = rows[METRIC_COLUMNS].to_numpy(dtype=float)
+        old = np.zeros_like(new)
+        if len(previous):
+            old[~created] = previous[METRIC_COLUMNS].to_numpy(dtype=float)[pos[~created]]
+        changed = old != new
+        changes = []
+        for i in np.flatnonzero(changed.any(axis=1) | created):
+            cells = {}
+            for j in np.flatnonzero(changed[i]):
+                col = METRIC_COLUMNS[j]
+                cells[col] = [None if created[i] else _audit_cell(col, old[i, j]), _audit_cell(col, new[i, j])]
+            change = {"k": list(keys[i]), "c": cells}
+            if created[i]:
+                change["n"] = 1
+            changes.append(change)
+        return changes
+
+    def record(self, store_key: str, user: str, changes: list, ts: float = None) -> None:
+        if not changes:
+            return
+        line = json.dumps({"ts": round(time.time() if ts is None else ts, 3), "store": store_key,
+                           "user": user, "changes": changes}, separators=(",", ":"), ensure_ascii=False)
+        with _path_lock(self.path), open(self.path, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+
+    def entries(self, store_key: str, since: float = None) -> list:
+        """One store's logged saves, oldest first; only those after `since` if given."""
+        if not os.path.exists(self.path):
+            return []
+        out = []
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue  # torn last line of an append cut short by a crash
+                if entry.get("store") == store_key and (since is None or entry["ts"] > since):
+                    out.append(entry)
+        return out
+
+    def as_of(self, current: pd.DataFrame, store_key: str, when: float) -> pd.DataFrame:
+        """
+        `current` (every stored row) as it stood at `when`: the changes logged after it are undone,
+        newest first, on just the rows they touched. Rows written outside the app (or before the
+        log existed) are taken as they are now.
+        """
+        later = self.entries(store_key, since=when)
+        if not later:
+            return current
+        keys = _audit_keys(current)
+        if not keys.is_unique:
+            current, keys = current[~keys.duplicated(keep="last")], keys[~keys.duplicated(keep="last")]
+        touched = list(dict.fromkeys(tuple(c["k"]) for entry in later for c in entry["changes"]))
+        pos = keys.get_indexer(pd.MultiIndex.from_tuples(touched, names=keys.names))
+        found = iter(current[METRIC_COLUMNS].iloc[pos[pos >= 0]].to_dict("records"))
+        rows = {key: next(found) if p >= 0 else None for key, p in zip(touched, pos)}
+        for entry in reversed(later):
+            for change in reversed(entry["changes"]):
+                key = tuple(change["k"])
+                if change.get("n"):
+                    rows[key] = None
+                    continue
+                row = rows[key] if rows[key] is not None else dict.fromkeys(METRIC_COLUMNS, 0)
+                row.update((col, old) for col, (old, _new) in change["c"].items() if col in row)
+                rows[key] = row
+        restored = [dict(zip(KEY_COLUMNS, key), **row) for key, row in rows.items() if row is not None]
+        out = current[~keys.isin(touched)]
+        if restored:
+            out = pd.concat([out, conform(pd.DataFrame(restored))], ignore_index=True)
+        return conform(out).sort_values("date", kind="stable").reset_index(drop=True)
+
+    def history(self, store_key: str, limit: int = 200) -> pd.DataFrame:
+        """The latest `limit` cell changes, newest first: when, who, the row's key, column, old -> new."""
+        columns, records = ["when", "user", *KEY_COLUMNS, "column", "old", "new"], []
+        for entry in reversed(self.entries(store_key)):
+            when = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(entry["ts"]))
+            for change in reversed(entry["changes"]):
+                for col, (old, new) in change["c"].items():
+                    records.append({"when": when, "user": entry["user"], **dict(zip(KEY_COLUMNS, change["k"])),
+                                    "column": col, "old": old, "new": new})
+                    if len(records) >= limit:
+                        return pd.DataFrame(records, columns=columns, dtype=object)
+        return pd.DataFrame(records, columns=columns, dtype=object)  # object: counts stay ints
+
+class AsOfStore:
+    """Read-only store over rows rebuilt for an earlier time (AuditLog.as_of), built on first load."""
+    read_only = True
+
+    def __init__(self, cache_key: str, build):
+        self.cache_key = cache_key
+        self._build = build
+
+    def version(self):
+        return self.cache_key  # the past does not move
+
+    def load(self) -> pd.DataFrame:
+        return self._build()
+
+    def upsert(self, rows) -> None:
+        raise PermissionError(f"{self.cache_key} is a read-only view of past data")
+
+    def save(self, df: pd.DataFrame) -> None:
+        raise PermissionError(f"{self.cache_key} is a read-only view of past data")
+
+# -------------------- Sheets replica --------------------
+class Outbox:
+    """
+    Durable FIFO of writes still to be replicated, in SQLite so it survives restarts. Entries are
+    (target, "upsert" | "save", serialized rows) and are deleted only once the replica has them.
+    """
+    def __init__(self, path: str = SYNC_OUTBOX_PATH):
+        self.path = path
+        with closing(self._connect()) as con, con:
+            con.execute("PRAGMA journal_mode=WAL")
+            con.execute("CREATE TABLE IF NOT EXISTS outbox (id INTEGER PRIMARY KEY AUTOINCREMENT, "
+                        "target TEXT NOT NULL, op TEXT NOT NULL, rows TEXT NOT NULL, queued REAL NOT NULL)")
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=10)
+
+    def add(self, target: str, op: str, values: list) -> int:
+        with closing(self._connect()) as con, con:
+            cur = con.execute("INSERT INTO outbox (target, op, rows, queued) VALUES (?, ?, ?, ?)",
+                              (target, op, json.dumps(values), time.time()))
+            return cur.lastrowid
+
+    def discard(self, entry_id: int) -> None:
+        with closing(self._connect()) as con, con:
+            con.execute("DELETE FROM outbox WHERE id = ?", (entry_id,))
+
+    def peek(self, target: str, limit: int = SYNC_BATCH) -> list:
+        """Oldest entries first: [(id, op, values)]."""
+        with closing(self._connect()) as con:
+            rows = con.execute("SELECT id, op, rows FROM outbox WHERE target = ? ORDER BY id LIMIT ?",
+                               (target, limit)).fetchall()
+        return [(i, op, json.loads(values)) for i, op, values in rows]
+
+    def ack(self, target: str, last_id: int) -> None:
+        with closing(self._connect()) as con, con:
+            con.execute("DELETE FROM outbox WHERE target = ? AND id <= ?", (target, last_id))
+
+    def pending(self, target: str) -> int:
+        with closing(self._connect()) as con:
+            return con.execute("SELECT COUNT(*) FROM outbox WHERE target = ?", (target,)).fetchone()[0]
+
+class SheetsReplicator:
+    """
+    Background worker keeping a Google Sheet in step with a local store: drains the Outbox in
+    batches (one batch_update each, retried with exponential backoff while Sheets is down) and,
+    whenever nothing is pending, pulls rows edited on the sheet back into the local store every
+    SYNC_PULL_SECONDS. Pulls only add or replace rows; deleting a row on the sheet does not
+    delete it locally.
+    """
+    def __init__(self, local, remote_factory, target: str, outbox: Outbox = None, start: bool = True):
+        self.local = local
+        self.remote_factory = remote_factory
+        self.target = target
+        self.outbox = outbox or Outbox()
+        self.lock = threading.Lock()        # local write + outbox append vs. a pull's merge
+        self._sync_lock = threading.Lock()  # one sync round at a time (worker vs. CLI)
+        self._wake = threading.Event()
+        self._remote = None
+        self._pulled_revision = None
+        self._next_pull = 0.0
+        self.status = {"last_push": None, "last_pull": None, "error": None, "failures": 0, "retry_at": None}
+        if start:
+            threading.Thread(target=self._run, name="sheets-replica", daemon=True).start()
+
+    def write(self, op: str, frame: pd.DataFrame, apply) -> None:
+        """Append to the outbox, then apply(): a crash in between replays the write, never loses it."""
+        with self.lock:
+            entry = self.outbox.add(self.target, op, GSheetsStore._serialize(frame))
+            try:
+                apply()
+            except BaseException:
+                self.outbox.discard(entry)
+                raise
+        self._wake.set()
+
+    def sync_status(self) -> dict:
+        return {**self.status, "pending": self.outbox.pending(self.target)}
+
+    def _run(self) -> None:
+        while True:
+            retry_at = self.status["retry_at"]
+            self._wake.wait(max(0.0, (retry_at or self._next_pull) - time.time()))
+            self._wake.clear()
+            self.sync_once()
+
+    def sync_once(self, force: bool = False) -> dict:
+        """One round: push everything pending, then pull if due (or forced). Returns sync_status()."""
+        with self._sync_lock:
+            now = time.time()
+            if not force and self.status["retry_at"] and now < self.status["retry_at"]:
+                return self.sync_status()
+            try:
+                remote = self._connect_remote()
+                self._push(remote)
+                if force or now >= self._next_pull:
+                    self._pull(remote)
+                    self._next_pull = now + SYNC_PULL_SECONDS
+                self.status.update(error=None, failures=0, retry_at=None)
+            except Exception as e:
+                self._remote = None  # drop staged rows and the row index; rebuilt on the next round
+                failures = self.status["failures"] + 1
+                first, cap = SYNC_BACKOFF_SECONDS
+                self.status.update(error=str(e) or type(e).__name__, failures=failures,
+                                   retry_at=now + min(cap, first * 2 ** (failures - 1)))
+        return self.sync_status()
+
+    def _connect_remote(self):
+        if self._remote is None:
+            remote = self.remote_factory()
+            if not remote.ready:
+                raise RuntimeError(remote.error or "Google Sheets unavailable")
+            self._remote = remote
+        return self._remote
+
+    def _push(self, remote) -> None:
+        while True:
+            entries = self.outbox.peek(self.target, SYNC_BATCH)
+            if not entries:
+                return
+            for _id, op, values in entries:
+                if op == "save":
+                    remote.flush()  # earlier upserts land first
+                    remote.save(pd.DataFrame(values, columns=COLUMNS))
+                else:
+                    remote.stage(values)
+            remote.flush()
+            self.outbox.ack(self.target, entries[-1][0])
+            self.status["last_push"] = time.time()
+
+    def _pull(self, remote) -> None:
+        revision = remote.version()
+        if revision is not None and revision == self._pulled_revision:
+            return
+        sheet = GSheetsStore._serialize(remote.load())
+        with self.lock:
+            if self.outbox.pending(self.target):
+                return  # a local write slipped in; it is pushed (and the sheet re-read) next round
+            have = set(map(tuple, GSheetsStore._serialize(self.local.load())))
+            changed = [v for v in sheet if tuple(v) not in have]
+            if changed:
+                self.local.upsert(pd.DataFrame(changed, columns=COLUMNS))
+        self._pulled_revision = revision
+        self.status["last_pull"] = time.time()
+
+@st.cache_resource(show_spinner=False)
+def _sheets_replicator(target: str, spreadsheet_id: str, worksheet_title: str, _local) -> SheetsReplicator:
+    """One replicator (and worker thread) per local store and sheet, per process."""
+    return SheetsReplicator(_local, lambda: GSheetsStore(spreadsheet_id, worksheet_title), target)
+
+def sheets_replicator(local, gsheets_conf: dict, background: bool = True) -> SheetsReplicator:
+    """The process-wide replicator of `local` to the configured sheet (background=False: no worker)."""
+    spreadsheet_id = gsheets_conf["spreadsheet_id"]
+    worksheet_title = gsheets_conf.get("worksheet", "daily_metrics")
+    target = f"{local.cache_key}->{spreadsheet_id}/{worksheet_title}"
+    if not background:
+        return SheetsReplicator(local, lambda: GSheetsStore(spreadsheet_id, worksheet_title), target, start=False)
+    return _sheets_replicator(target, spreadsheet_id, worksheet_title, local)
+
+class ReplicatedStore:
+    """
+    Local store as primary, Google Sheets as an asynchronous replica: reads and writes only touch
+    the local store, and each write is queued on the SheetsReplicator's outbox, so dashboard
+    latency does not depend on Sheets. Other attributes pass through to the local store.
+    """
+    def __init__(self, local, replicator: SheetsReplicator):
+        self.local = local
+        self.replicator = replicator
+
+    def __getattr__(self, name):
+        return getattr(self.local, name)
+
+    def load(self) -> pd.DataFrame:
+        return self.local.load()
+
+    def save(self, df: pd.DataFrame) -> None:
+        frame = conform(df)
+        self.replicator.write("save", frame, lambda: self.local.save(frame))
+
+    def upsert(self, rows) -> None:
+        frame = _rows_frame(rows)
+        self.replicator.write("upsert", frame, lambda: self.local.upsert(frame))
+
+    def sync_status(self) -> dict:
+        return self.replicator.sync_status()
+
+# -------------------- Secrets helpers --------------------
+def sheets_sync_default() -> bool:
+    """[gsheets] sync = true in secrets.toml turns the background replica on by default."""
+    try:
+        return bool(st.secrets.get("gsheets", {}).get("sync", False))
+    except Exception:
+        return False
+
+def has_sheets_config() -> bool:
+    """True if a valid Sheets config exists; safe when secrets.toml is absent."""
+    try:
+        gs = st.secrets.get("gsheets", None)
+        sa = st.secrets.get("gcp_service_account", None)
+        return bool(gs and sa and gs.get("spreadsheet_id"))
+    except Exception:
+        return False
+
+def get_backend(lang: str, prefer_sheets: bool = True, local_backend: str = "csv", sheets_sync: bool = False):
+    """
+    Returns (store, backend_label, fallback_msg)
+    prefer_sheets=True tries Google Sheets first (if configured), else the local store
+    ("csv", "parquet" or "sqlite"; an empty Parquet/SQLite store is seeded from the CSV on first use).
+    sheets_sync=True keeps the local store primary and replicates it to the sheet in the background.
+    Secrets-safe: never raises if secrets.toml is missing.
+    """
+    backend_label = L[lang]["backend_csv"]
+    fallback_msg = None
+
+    gsheets_conf = None
+    try:
+        gsheets_conf = st.secrets.get("gsheets", None)
+    except Exception:
+        gsheets_conf = None
+
+    if prefer_sheets and sheets_sync and gsheets_conf and gsheets_conf.get("spreadsheet_id"):
+        # Nothing on the request path talks to Sheets; the replicator connects in the background
+        store, _label, _ = get_backend(lang, prefer_sheets=False, local_backend=local_backend)
+        store = ReplicatedStore(store.store, sheets_replicator(store.store, gsheets_conf))
+        return CachedStore(store, ttl=0.0, audit=AuditLog()), L[lang]["backend_replica"].format(
+            local=L[lang][f"local_{local_backend}"]), None
+
+    if prefer_sheets and gsheets_conf and gsheets_conf.get("spreadsheet_id"):
+        store = GSheetsStore(
+            spreadsheet_id=gsheets_conf["spreadsheet_id"],
+            worksheet_title=gsheets_conf.get("worksheet", "daily_metrics"),
+        )
+        if getattr(store, "ready", False):
+            backend_label = L[lang]["backend_active"]
+            return CachedStore(store, audit=AuditLog()), backend_label, None
+        else:
+            fallback_msg = L[lang]["backend_fallback"]
+
+    # Default / fallback (a stat() is cheap enough to re-check local files on every rerun)
+    if local_backend == "sqlite":
+        store = SQLiteStore(SQLITE_PATH)
+        if store.is_empty() and os.path.exists(DATA_PATH):
+            store.upsert(CSVStore(DATA_PATH).load())
+        return CachedStore(store, ttl=0.0, audit=AuditLog()), L[lang]["backend_sqlite"], fallback_msg
+    if local_backend == "parquet":
+        store = ParquetStore(PARQUET_DIR)
+        if not store.years():
+            migrate_csv_to_parquet(DATA_PATH, PARQUET_DIR)
+        return CachedStore(store, ttl=0.0, audit=AuditLog()), L[lang]["backend_parquet"], fallback_msg
+    store = CSVStore(DATA_PATH)
+    return CachedStore(store, ttl=0.0, audit=AuditLog()), backend_label, fallback_msg
+
+# -------------------- Config profiles --------------------
+CONFIG_PARTS = ("targets", "finance", "thresholds")  # the config parts a profile stores
+
+@st.cache_resource(show_spinner=False)
+def _profile_cache() -> dict:
+    """Process-wide {abs path: (file version, parsed profiles)}."""
+    return {"lock": threading.Lock(), "by_path": {}}
+
+def profile_config(profile: dict = None) -> dict:
+    """default_config() with a stored profile's values laid over it (unknown keys dropped, types kept)."""
+    config = default_config()
+    for part in CONFIG_PARTS:
+        for key, value in ((profile or {}).get(part) or {}).items():
+            if key in config[part]:
+                config[part][key] = type(config[part][key])(value)
+    return config
+
+class ProfileStore:
+    """
+    Named sidebar configs in one JSON file next to the data: {"default": name, "profiles": {name:
+    {"targets", "finance", "thresholds", "updated", "by"}}}. Parsed once per process and file
+    version; saves read-merge-replace under the file's write lock like CSVStore's, so sessions
+    and processes saving at the same time don't drop each other's profiles.
+    """
+    def __init__(self, path: str = PROFILES_PATH):
+        self.path = path
+
+    def load(self) -> dict:
+        cache = _profile_cache()
+        key, version = os.path.abspath(self.path), _file_version(self.path)
+        with cache["lock"]:
+            cached = cache["by_path"].get(key)
+            if cached is not None and cached[0] == version:
+                return cached[1]
+        book = self._read()
+        with cache["lock"]:
+            cache["by_path"][key] = (version, book)
+        return book
+
+    def _read(self) -> dict:
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                book = json.load(f)
+        except FileNotFoundError:
+            book = {}
+        return {"default": book.get("default", ""), "profiles": book.get("profiles", {})}
+
+    def save(self, name: str, config: dict, make_default: bool = False, user: str = None) -> dict:
+        """Store the CONFIG_PARTS of `config` as profile `name`; returns the stored profile."""
+        profile = {part: dict(config[part]) for part in CONFIG_PARTS}
+        profile.update(updated=round(time.time(), 3), by=user)
+        with _path_lock(self.path):
+            book = self._read()
+            book["profiles"][name] = profile
+            if make_default:
+                book["default"] = name
+            elif book["default"] == name:
+                book["default"] = ""
+            tmp = _tmp_path(self.path)
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(book, f, indent=2, ensure_ascii=False)
+            _replace_file(tmp, self.path)
+        return profile
+
+# -------------------- UI helpers --------------------
+def ui_lang() -> str:
+    # Sidebar language selector (sticky in session state)
+    lang = st.sidebar.selectbox(
+        f"{L['EN']['lang_label']} / {L['AR']['lang_label']}",
+        options=["EN","AR"],
+        index=0 if st.session_state.get("lang","EN")=="EN" else 1,
+        key="lang"
+    )
+    # Flip layout for Arabic
+    if lang == "AR":
+        rtl_css()
+        st.markdown('<div dir="rtl"></div>', unsafe_allow_html=True)
+    else:
+        st.markdown('<div dir="ltr"></div>', unsafe_allow_html=True)
+    return lang
+
+def t(lang, key): return L[lang][key]
+
+# Config parts each dashboard section reads: they key its memoized results, so a sidebar
+# change only recomputes the sections reading the part that changed.
+SECTION_DEPS = {
+    "kpi_cards": ("finance",),
+    "budget_vs_burn": ("finance", "targets"),
+    "risk_alerts": ("thresholds",),
+    "progress_vs_targets": ("targets", "finance"),
+    "dimension_breakdown": ("finance",),
+    "charts": (),
+    "scenarios": ("finance", "thresholds", "targets"),
+    "input_form": (),
+    "bulk_import": (),
+    "change_history": (),
+    "downloads": (),
+}
+PAGE_TABS = ("overview", "charts", "scenarios", "data", "export")
+
+def section_key(config: dict, section: str) -> tuple:
+    """Hashable form of the config parts `section` depends on."""
+    return tuple((part, tuple(sorted(config[part].items()))) for part in SECTION_DEPS[section])
+
+def as_fragment(func):
+    """
+    st.fragment where available: the section's own widgets (chart zoom, breakdown grouping,
+    export format, forms) then rerun just that section. A plain call on older Streamlit.
+    """
+    decorator = getattr(st, "fragment", None) or getattr(st, "experimental_fragment", None)
+    return decorator(func) if decorator else func
+
+def page_tabs(lang) -> dict:
+    """{tab: (container, open)}; only the open tab's sections run where Streamlit has lazy tabs."""
+    labels = [t(lang, f"tab_{name}") for name in PAGE_TABS]
+    try:
+        tabs = st.tabs(labels, key=f"page_tab_{lang}", on_change="rerun")
+        return {name: (tab, tab.open) for name, tab in zip(PAGE_TABS, tabs)}
+    except TypeError:
+        return {name: (tab, True) for name, tab in zip(PAGE_TABS, st.tabs(labels))}
+
+def flash(kind: str, message: str) -> None:
+    """Queue an st.success/st.error/... message for the rerun that follows a save."""
+    st.session_state["_flash"] = (kind, message)
+
+def show_flash() -> None:
+    kind, message = st.session_state.pop("_flash", (None, None))
+    if kind:
+        getattr(st, kind)(message)
+
+def ui_sidebar(lang):
+    st.sidebar.header(t(lang,"sidebar_header"))
+    st.sidebar.caption(t(lang,"sidebar_caption"))
+
+    # Data store selection
+    st.sidebar.subheader(t(lang, "datastore_header"))
+    default_use_sheets = has_sheets_config()
+    prefer_sheets = st.sidebar.checkbox(t(lang, "use_sheets"), value=default_use_sheets)
+    sheets_sync = st.sidebar.checkbox(t(lang, "sheets_sync"), value=default_use_sheets and sheets_sync_default(),
+                                      disabled=not prefer_sheets, help=t(lang, "sheets_sync_help"))
+    local_backend = st.sidebar.selectbox(t(lang, "local_backend"), options=["csv", "parquet", "sqlite"],
+                                         format_func=lambda k: t(lang, f"local_{k}"))
+    as_of = None
+    if st.sidebar.checkbox(t(lang, "as_of_toggle"), value=False, help=t(lang, "as_of_help")):
+        yesterday = date.today() - timedelta(days=1)
+        as_of = st.sidebar.date_input(t(lang, "as_of_date"), value=yesterday, max_value=yesterday)
+
+    # Config profile: picking one loads all of its values at once
+    st.sidebar.divider()
+    profiles = ProfileStore()
+    book = profiles.load()
+    names = ["", *sorted(book["profiles"])]
+    if "_profile_pending" in st.session_state:  # just saved: switch before the picker is drawn
+        st.session_state["profile"] = st.session_state.pop("_profile_pending")
+    if st.session_state.get("profile") not in names:
+        st.session_state["profile"] = book["default"] if book["default"] in names else ""
+    profile = st.sidebar.selectbox(t(lang, "profile"), options=names, key="profile",
+                                   format_func=lambda n: n or t(lang, "profile_builtin"))
+    apply_profile(profile, book)
+
+    # Targets, finance and thresholds are edited in one form: a single rerun when applied
+    with st.sidebar.form("config_form"):
+        annual_gmv = st.number_input(t(lang,"annual_gmv"), step=100.0, key="cfg_annual_gmv")
+        annual_units = st.number_input(t(lang,"annual_units"), step=10, key="cfg_annual_units")
+        annual_deliveries = st.number_input(t(lang,"annual_deliveries"), step=50, key="cfg_annual_deliveries")
+        annual_vendors = st.number_input(t(lang,"annual_vendors"), step=5, key="cfg_annual_vendors")
+
+        st.divider()
+        commission_rate = st.number_input(t(lang,"commission_rate"), step=0.01, min_value=0.0, max_value=1.0,
+                                          format="%.2f", key="cfg_commission_rate")
+        delivery_fee = st.number_input(t(lang,"delivery_fee"), step=0.1, key="cfg_delivery_fee")
+        marketing_budget = st.number_input(t(lang,"marketing_budget"), step=100.0, key="cfg_marketing_budget")
+        admin_general = st.number_input(t(lang,"admin_general"), step=500.0, key="cfg_admin_general")
+        working_capital = st.number_input(t(lang,"working_capital"), step=500.0, key="cfg_working_capital")
+
+        st.divider()
+        st.header(t(lang,"thresholds_header"))
+        min_conv = st.number_input(t(lang,"min_conv"), step=0.001, format="%.3f", key="cfg_min_conv")
+        max_cac = st.number_input(t(lang,"max_cac"), step=0.5, key="cfg_max_cac")
+        min_otd = st.number_input(t(lang,"min_otd"), step=0.01, format="%.2f", key="cfg_min_otd")
+        max_returns = st.number_input(t(lang,"max_returns"), step=0.01, format="%.2f", key="cfg_max_returns")
+        min_aov = st.number_input(t(lang,"min_aov"), step=1.0, key="cfg_min_aov")
+
+        st.form_submit_button(t(lang, "config_apply"), type="primary")
+        st.divider()
+        save_name = st.text_input(t(lang, "profile_name"), value=profile)
+        make_default = st.checkbox(t(lang, "profile_make_default"), value=bool(profile) and profile == book["default"])
+        save = st.form_submit_button(t(lang, "profile_save"))
+
+    st.sidebar.divider()
+    diagnostics = st.sidebar.checkbox(t(lang, "diagnostics"), value=False, key="diagnostics")
+
+    config = {
+        "prefer_sheets": prefer_sheets,
+        "local_backend": local_backend,
+        "sheets_sync": sheets_sync,
+        "as_of": as_of,
+        "profile": profile,
+        "diagnostics": diagnostics,
+        "targets": {
+            "annual_gmv": annual_gmv,
+            "annual_units": annual_units,
+            "annual_deliveries": annual_deliveries,
+            "annual_vendors": annual_vendors,
+        },
+        "finance": {
+            "commission_rate": commission_rate,
+            "delivery_fee": delivery_fee,
+            "marketing_budget": marketing_budget,
+            "admin_general": admin_general,
+            "working_capital": working_capital,
+        },
+        "thresholds": {
+            "min_conv": min_conv,
+            "max_cac": max_cac,
+            "min_otd": min_otd,
+            "max_returns": max_returns,
+            "min_aov": min_aov,
+        }
+    }
+    if save:
+        save_profile(profiles, save_name.strip(), config, make_default, lang)
+    return config
+
+def apply_profile(name: str, book: dict) -> None:
+    """
+    Write a profile's values into the sidebar inputs' session state in one step, when it was
+    picked or re-saved (by anyone) since this session last applied it. "" is the built-in defaults.
+    """
+    profile = book["profiles"].get(name)
+    stamp = (name, profile.get("updated") if profile else None)
+    if st.session_state.get("_profile_applied") == stamp:
+        return
+    config = profile_config(profile)
+    for part in CONFIG_PARTS:
+        for key, value in config[part].items():
+            st.session_state[f"cfg_{key}"] = value
+    st.session_state["_profile_applied"] = stamp
+
+def save_profile(profiles: "ProfileStore", name: str, config: dict, make_default: bool, lang) -> None:
+    """Store the applied sidebar values under `name` and switch this session to it."""
+    if not name:
+        st.sidebar.error(t(lang, "profile_name_missing"))
+        return
+    try:
+        profile = profiles.save(name, config, make_default=make_default, user=current_user())
+    except WriteConflict:
+        st.sidebar.error(t(lang, "save_conflict"))
+        return
+    st.session_state["_profile_pending"] = name
+    st.session_state["_profile_applied"] = (name, profile["updated"])  # the inputs already hold it
+    flash("success", t(lang, "profile_saved").format(name=name))
+    st.rerun()
+
+def default_config() -> dict:
+    """The ui_sidebar() config built from the DEFAULT_* constants, for headless runs."""
+    return {
+        "prefer_sheets": False,
+        "local_backend": "csv",
+        "sheets_sync": False,
+        "as_of": None,
+        "profile": "",
+        "diagnostics": False,
+        "targets": {
+            "annual_gmv": float(DEFAULT_TARGETS["annual_gmv_products"]),
+            "annual_units": int(DEFAULT_TARGETS["annual_units_products"]),
+            "annual_deliveries": int(DEFAULT_TARGETS["annual_deliveries"]),
+            "annual_vendors": int(DEFAULT_TARGETS["annual_vendors"]),
+        },
+        "finance": {
+            "commission_rate": float(DEFAULT_FINANCE["commission_rate"]),
+            "delivery_fee": float(DEFAULT_FINANCE["delivery_fee_per_order"]),
+            "marketing_budget": float(DEFAULT_FINANCE["annual_marketing_budget"]),
+            "admin_general": float(DEFAULT_FINANCE["annual_admin_general"]),
+            "working_capital": float(DEFAULT_FINANCE["working_capital"]),
+        },
+        "thresholds": {
+            "min_conv": float(DEFAULT_THRESHOLDS["min_conversion"]),
+            "max_cac": float(DEFAULT_THRESHOLDS["max_cac"]),
+            "min_otd": float(DEFAULT_THRESHOLDS["min_otd"]),
+            "max_returns": float(DEFAULT_THRESHOLDS["max_returns_rate"]),
+            "min_aov": float(DEFAULT_THRESHOLDS["min_aov"]),
+        },
+    }
+
+def ui_slice(index: "FactIndex", lang) -> dict:
+    """Sidebar vendor/city/channel pickers; only dimensions that actually carry values are shown."""
+    filters = {}
+    dims = [dim for dim in DIMENSIONS if any(index.values(dim))]
+    if not dims:
+        return filters
+    st.sidebar.divider()
+    st.sidebar.header(t(lang, "slice_header"))
+    for dim in dims:
+        value = st.sidebar.selectbox(
+            t(lang, dim), options=[None] + index.values(dim), key=f"slice_{dim}",
+            format_func=lambda v: t(lang, "slice_all") if v is None else (v or t(lang, "slice_unassigned")),
+        )
+        if value is not None:
+            filters[dim] = value
+    return filters
+
+# -------------------- KPI / Risk / Progress --------------------
+def _sum_columns(dfx: pd.DataFrame) -> dict:
+    return {col: dfx[col].sum() for col in ADDITIVE_COLUMNS}
+
+def _period_kpis(sums: dict, finance: dict) -> dict:
+    """Derive KPI metrics from a period's additive sums."""
+    sessions = sums["sessions"]
+    orders = sums["orders"]
+    gmv = sums["gmv_products"]
+    deliveries = sums["deliveries"]  # handover count
+    marketing = sums["marketing_spend"]
+    returns = sums["returns"]
+
+    commission_revenue = gmv * finance["commission_rate"]
+    delivery_revenue = deliveries * finance["delivery_fee"]  # recognize on handover
+
+    aov = (gmv / orders) if orders > 0 else 0.0
+    conv = (orders / sessions) if sessions > 0 else 0.0
+    cac = (marketing / orders) if orders > 0 else 0.0
+    returns_rate = (returns / max(orders, 1))
+
+    otd_on_time = sums["otd_on_time"]
+    otd_total = sums["otd_total"]
+    otd_rate = (otd_on_time / otd_total) if otd_total > 0 else 0.0
+
+    return {
+        "sessions": sessions, "orders": orders, "gmv": gmv, "deliveries": deliveries,
+        "marketing": marketing, "returns": returns, "commission_rev": commission_revenue,
+        "delivery_rev": delivery_revenue, "aov": aov, "conv": conv, "cac": cac,
+        "returns_rate": returns_rate, "otd_rate": otd_rate, "otd_total": otd_total,
+        "vendors_new": sums["vendors_new"],
+    }
+
+def _agg_period(dfx: pd.DataFrame, finance: dict, by: list = None):
+    """
+    Aggregate KPI metrics for a given slice. With `by` (a subset of DIMENSIONS) the slice is
+    grouped first and a DataFrame with one row of the same metrics per group is returned.
+    """
+    if not by:
+        return _period_kpis(_sum_columns(dfx), finance)
+    out = kpi_frame(dfx.groupby(list(by), observed=True)[ADDITIVE_COLUMNS].sum())
+    out["commission_rev"] = out["gmv_products"] * finance["commission_rate"]
+    out["delivery_rev"] = out["deliveries"] * finance["delivery_fee"]
+    return out
+
+@dataclass(frozen=True)
+class PeriodSnapshot:
+    """Additive sums for the latest day in the data, its month-to-date and year-to-date."""
+    latest: date
+    today: dict
+    mtd: dict
+    ytd: dict
+    _memo: dict = field(default_factory=dict, repr=False, compare=False)
+
+    def memo(self, key, compute):
+        """compute() once per key for this snapshot (cards' derived values, keyed by their config)."""
+        if key not in self._memo:
+            self._memo[key] = compute()
+        return self._memo[key]
+
+    def kpis(self, period: str, finance: dict) -> dict:
+        """KPI metrics for "today", "mtd" or "ytd"."""
+        return _period_kpis(getattr(self, period), finance)
+
+def build_snapshot(df: pd.DataFrame):
+    """
+    One pass over the frame per data version: dates are parsed once, the latest year is
+    grouped by month once, and MTD/YTD fall out of that grouping. None when there is no data.
+    """
+    if df.empty:
+        return None
+    trace_count(rows=len(df))
+    dates = pd.to_datetime(df["date"])
+    latest = dates.max()
+    in_year = (dates.dt.year == latest.year).to_numpy()
+    year_dates = dates[in_year]
+    year_rows = df.loc[in_year, ADDITIVE_COLUMNS]
+    by_month = year_rows.groupby(year_dates.dt.month.to_numpy()).sum()
+    return PeriodSnapshot(
+        latest=latest.date(),
+        today=year_rows[(year_dates == latest).to_numpy()].sum().to_dict(),
+        mtd=by_month.loc[latest.month].to_dict(),
+        ytd=by_month.sum().to_dict(),
+    )
+
+@st.cache_resource(show_spinner=False)
+def _rollup_registry() -> dict:
+    """Process-wide {store cache_key: Rollups}, shared by every session."""
+    return {"lock": threading.Lock(), "by_store": {}}
+
+class Rollups:
+    """
+    Materialized daily -> monthly -> yearly sums of ADDITIVE_COLUMNS (company-wide, i.e.
+    across every vendor/city/channel row). Saving rows applies (new - old) per day to its
+    month and year, so period KPIs are O(1) lookups instead of re-summing the raw history.
+    `version` is the backend version token the rollups are known to match.
+    """
+    def __init__(self, version=None):
+        self.version = version
+        self.days = {}     # date -> np.ndarray of sums
+        self.monthly = {}  # (year, month) -> np.ndarray
+        self.yearly = {}   # year -> np.ndarray
+        self.latest = None
+        self._anomalies = None  # AnomalyDetector over self.days, built on first use
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame, version=None) -> "Rollups":
+        r = cls(version)
+        if df.empty:
+            return r
+        trace_count(rows=len(df))
+        dates = pd.to_datetime(df["date"])
+        values = df[ADDITIVE_COLUMNS].apply(pd.to_numeric, errors="coerce").fillna(0).astype(float)
+        days = values.groupby(dates.dt.date.to_numpy()).sum()
+        r.days = dict(zip(days.index, days.to_numpy()))
+        keys = pd.DatetimeIndex(days.index)
+        monthly = days.groupby([keys.year, keys.month]).sum()
+        r.monthly = {(int(y), int(m)): v for (y, m), v in zip(monthly.index, monthly.to_numpy())}
+        yearly = days.groupby(keys.year).sum()
+        r.yearly = {int(y): v for y, v in zip(yearly.index, yearly.to_numpy())}
+        r.latest = max(r.days)
+        return r
+
+    def apply(self, new: pd.DataFrame, previous: pd.DataFrame = None) -> None:
+        """Roll saved rows in as per-day deltas against the rows they replaced (`previous`)."""
+        delta = self._by_day(new)
+        if previous is not None and not previous.empty:
+            delta = delta.sub(self._by_day(previous), fill_value=0.0)
+        for d, dv in zip(delta.index, delta.to_numpy()):
+            self.days[d] = self.days.get(d, 0.0) + dv
+            month, year = (d.year, d.month), d.year
+            self.monthly[month] = self.monthly.get(month, 0.0) + dv
+            self.yearly[year] = self.yearly.get(year, 0.0) + dv
+            self.latest = d if self.latest is None else max(self.latest, d)
+        det = self._anomalies
+        for d in sorted(delta.index) if det is not None else ():
+            if det.last is not None and d < det.last:
+                self._anomalies = None  # a past day changed: rescore the history on next use
+                break
+            det.push(d, self.days[d][self._anomaly_cols()])
+
+    def anomalies(self) -> "AnomalyDetector":
+        """The AnomalyDetector over the daily sums; later saves update it day by day."""
+        if self._anomalies is None:
+            days = sorted(self.days)
+            values = np.array([self.days[d] for d in days]).reshape(len(days), len(ADDITIVE_COLUMNS))
+            self._anomalies = AnomalyDetector.from_days(days, values[:, self._anomaly_cols()])
+        return self._anomalies
+
+    @staticmethod
+    def _anomaly_cols() -> list:
+        return [ADDITIVE_COLUMNS.index(m) for m in ANOMALY_METRICS]
+
+    @staticmethod
+    def _by_day(rows: pd.DataFrame) -> pd.DataFrame:
+        return rows[ADDITIVE_COLUMNS].astype(float).groupby(pd.to_datetime(rows["date"]).dt.date.to_numpy()).sum()
+
+    def months_frame(self) -> pd.DataFrame:
+        """The monthly sums as a frame with a "YYYY-MM" index, like monthly_sums()."""
+        keys = sorted(self.monthly)
+        return pd.DataFrame([self.monthly[k] for k in keys], index=[f"{y}-{m:02d}" for y, m in keys],
+                            columns=ADDITIVE_COLUMNS)
+
+    def sums(self, year: int, month: int = None) -> dict:
+        """Additive sums for a month (or a whole year when month is None)."""
+        v = self.yearly.get(year) if month is None else self.monthly.get((year, month))
+        return dict(zip(ADDITIVE_COLUMNS, v if v is not None else [0.0] * len(ADDITIVE_COLUMNS)))
+
+    def kpis(self, finance: dict, year: int, month: int = None) -> dict:
+        return _period_kpis(self.sums(year, month), finance)
+
+    def snapshot(self):
+        if self.latest is None:
+            return None
+        d = self.latest
+        return PeriodSnapshot(
+            latest=d,
+            today=dict(zip(ADDITIVE_COLUMNS, self.days[d])),
+            mtd=self.sums(d.year, d.month),
+            ytd=self.sums(d.year),
+        )
+
+def kpi_cards(snap, config, lang):
+    st.subheader(t(lang,"kpi_header"))
+    if snap is None:
+        st.info(t(lang,"no_data_yet"))
+        return
+
+    mtd, ytd = snap.memo(("kpi_cards", section_key(config, "kpi_cards")),
+                         lambda: (snap.kpis("mtd", config["finance"]), snap.kpis("ytd", config["finance"])))
+
+    c1, c2, c3, c4, c5 = st.columns(5)
+    c1.metric(t(lang,"metric_aov_mtd"), f"{mtd['aov']:.2f}")
+    c2.metric(t(lang,"metric_conv_mtd"), f"{mtd['conv']*100:.2f}%")
+    c3.metric(t(lang,"metric_cac_mtd"), f"{mtd['cac']:.2f}")
+    c4.metric(t(lang,"metric_otd_mtd"), f"{mtd['otd_rate']*100:.1f}%")
+    c5.metric(t(lang,"metric_returns_mtd"), f"{mtd['returns_rate']*100:.1f}%")
+
+    c1, c2, c3, c4, c5 = st.columns(5)
+    c1.metric(t(lang,"metric_gmv_ytd"), f"{ytd['gmv']:.0f}")
+    c2.metric(t(lang,"metric_orders_ytd"), f"{int(ytd['orders'])}")
+    c3.metric(t(lang,"metric_commission_ytd"), f"{ytd['commission_rev']:.0f}")
+    c4.metric(t(lang,"metric_delivery_ytd"), f"{ytd['delivery_rev']:.0f}")
+    c5.metric(t(lang,"metric_marketing_ytd"), f"{ytd['marketing']:.0f}")
+
+def budget_status(snap, finance: dict) -> dict:
+    """
+    The Budget vs Burn numbers: monthly budget, MTD burn and the share of the budget it used,
+    working capital left and months of runway at the monthly budget. No burn without data.
+    """
+    monthly_admin = finance["admin_general"] / 12.0
+    monthly_budget = monthly_admin + finance["marketing_budget"] / 12.0
+    if snap is None:
+        burn_mtd, wc_left = 0.0, finance["working_capital"]
+    else:
+        burn_mtd = snap.mtd["marketing_spend"] + monthly_admin  # assume admin is time-based monthly expense
+        wc_spent_est = snap.ytd["marketing_spend"] + snap.latest.month * monthly_admin  # Jan=1 .. current month
+        wc_left = max(finance["working_capital"] - wc_spent_est, 0.0)
+    return {
+        "monthly_budget": monthly_budget,
+        "burn_mtd": burn_mtd,
+        "budget_used": burn_mtd / monthly_budget if monthly_budget > 0 else 0.0,
+        "wc_left": wc_left,
+        "runway_months": wc_left / monthly_budget if monthly_budget > 0 else 0.0,
+    }
+
+def budget_vs_burn(snap, config, lang, projection=None):
+    """Monthly budget vs MTD burn card + working-capital runway helper (dated by the projection)."""
+    st.subheader(t(lang, "budget_header"))
+    st.caption(t(lang, "budget_hint"))
+
+    b = budget_status(snap, config["finance"])
+    progress_with_text(min(b["budget_used"], 1.0),
+                       t(lang, "budget_label").format(burn=b["burn_mtd"], budget=b["monthly_budget"]))
+    st.metric(t(lang, "wc_metric"), f"{b['wc_left']:.0f}", t(lang, "wc_runway").format(months=b["runway_months"]))
+    if snap is not None and projection is not None:
+        if projection.runway_date is None:
+            st.caption(t(lang, "runway_beyond").format(years=RUNWAY_HORIZON_DAYS // 365))
+        elif projection.runway_date <= projection.latest:
+            st.caption(t(lang, "runway_exhausted"))
+        else:
+            st.caption(t(lang, "runway_date").format(date=projection.runway_date.isoformat()))
+
+# Threshold rules: (id, metric, threshold key, breach when metric is "below"/"above", guard column, shown as %)
+# The guard column must be > 0 for the rule to fire (no CAC/returns alerts without orders, etc.)
+ALERT_RULES = [
+    ("low_conversion", "conv", "min_conv", "below", None, True),
+    ("low_aov", "aov", "min_aov", "below", None, False),
+    ("high_cac", "cac", "max_cac", "above", "orders", False),
+    ("low_otd", "otd_rate", "min_otd", "below", "otd_total", True),
+    ("high_returns", "returns_rate", "max_returns", "above", "orders", True),
+]
+
+def kpi_frame(sums: pd.DataFrame) -> pd.DataFrame:
+    """Vectorized _period_kpis ratios for a frame of additive sums (one row per period)."""
+    out = sums.astype(float)
+    orders, sessions, otd_total = out["orders"], out["sessions"], out["otd_total"]
+    out["aov"] = np.where(orders > 0, out["gmv_products"] / orders.where(orders > 0, 1), 0.0)
+    out["conv"] = np.where(sessions > 0, orders / sessions.where(sessions > 0, 1), 0.0)
+    out["cac"] = np.where(orders > 0, out["marketing_spend"] / orders.where(orders > 0, 1), 0.0)
+    out["returns_rate"] = out["returns"] / orders.clip(lower=1)
+    out["otd_rate"] = np.where(otd_total > 0, out["otd_on_time"] / otd_total.where(otd_total > 0, 1), 0.0)
+    return out
+
+def monthly_sums(df: pd.DataFrame) -> pd.DataFrame:
+    """Additive sums per calendar month ("YYYY-MM" index), in one groupby."""
+    if df.empty:
+        return pd.DataFrame(columns=ADDITIVE_COLUMNS)
+    months = pd.to_datetime(df["date"]).dt.strftime("%Y-%m")
+    return df[ADDITIVE_COLUMNS].groupby(months.to_numpy()).sum().sort_index()
+
+def evaluate_alerts(sums: pd.DataFrame, thresholds: dict) -> pd.DataFrame:
+    """
+    Score every period (row) of `sums` against the thresholds in one vectorized pass.
+    Returns the KPI frame plus a boolean column per ALERT_RULES id and a `breaches` count.
+    """
+    out = kpi_frame(sums)
+    for rule, hit in _rule_hits(out, thresholds).items():
+        out[rule] = hit
+    out["breaches"] = out[[r[0] for r in ALERT_RULES]].sum(axis=1).astype(int)
+    return out
+
+def _rule_hits(kpis: pd.DataFrame, thresholds: dict) -> dict:
+    """
+    ALERT_RULES id -> breach mask over the rows of a kpi_frame(). Thresholds are scalars, or
+    (S, 1) columns of scenario values, which broadcast the masks to (S, rows).
+    """
+    hits = {}
+    for rule, metric, key, direction, guard, _pct in ALERT_RULES:
+        values = kpis[metric].to_numpy()
+        hit = values < thresholds[key] if direction == "below" else values > thresholds[key]
+        if guard is not None:
+            hit = hit & (kpis[guard].to_numpy() > 0)
+        hits[rule] = hit
+    return hits
+
+def alert_records(scored: pd.DataFrame, thresholds: dict) -> list:
+    """Flatten evaluate_alerts() output to one dict per breach (machine-readable)."""
+    records = []
+    for rule, metric, key, direction, _guard, _pct in ALERT_RULES:
+        hits = scored[scored[rule]]
+        for period, value in zip(hits.index, hits[metric]):
+            records.append({
+                "period": str(period), "rule": rule, "metric": metric,
+                "value": round(float(value), 6), "threshold": thresholds[key], "direction": direction,
+            })
+    return sorted(records, key=lambda r: (r["period"], r["rule"]))
+
+def risk_alerts(snap, config, lang, anomalies=None):
+    st.subheader(t(lang,"risk_header"))
+    if snap is None:
+        st.info(t(lang,"risk_no_data"))
+        return
+
+    thresholds = config["thresholds"]
+    scored = snap.memo(("risk_alerts", section_key(config, "risk_alerts")),
+                       lambda: evaluate_alerts(pd.DataFrame([snap.mtd]), thresholds).iloc[0])
+
+    warnings = []
+    for rule, metric, key, _direction, _guard, pct in ALERT_RULES:
+        if scored[rule]:
+            scale = 100 if pct else 1
+            warnings.append(t(lang, f"risk_{rule}").format(val=scored[metric] * scale, target=thresholds[key] * scale))
+
+    if not warnings:
+        st.success(t(lang,"risk_all_clear"))
+    else:
+        for w in warnings:
+            st.error("• " + w)
+
+    # Single-day outliers that the monthly aggregates above would smooth over
+    if anomalies:
+        st.caption(t(lang, "anomaly_header").format(days=ANOMALY_RECENT_DAYS))
+        for a in anomalies:
+            st.warning("• " + t(lang, f"anomaly_{a['direction']}").format(
+                date=a["date"], metric=t(lang, ANOMALY_METRICS[a["metric"]]), value=a["value"],
+                expected=a["expected"], z=a["z"]))
+
+def progress_vs_targets(snap, config, lang, projection=None):
+    st.subheader(t(lang,"progress_header"))
+    if snap is None:
+        st.info(t(lang,"progress_no_data"))
+        return
+    if projection is not None:
+        st.caption(t(lang, f"projection_{projection.model}").format(days=RUN_RATE_DAYS))
+
+    ytd = snap.ytd
+    gmv = ytd["gmv_products"]
+    orders = ytd["orders"]
+    deliveries = ytd["deliveries"]  # compare to annual "handover to last-mile" target
+    vendors_added = ytd["vendors_new"]
+
+    c1, c2, c3, c4 = st.columns(4)
+    progress_with_text(min(gmv / config["targets"]["annual_gmv"], 1.0),
+                       t(lang,"progress_gmv").format(cur=gmv, tar=config["targets"]["annual_gmv"]))
+    projection_caption(projection, "gmv_products", config, lang)
+    progress_with_text(min(orders / config["targets"]["annual_units"], 1.0),
+                       t(lang,"progress_units").format(cur=int(orders), tar=int(config["targets"]["annual_units"])))
+    projection_caption(projection, "orders", config, lang)
+    progress_with_text(min(deliveries / config["targets"]["annual_deliveries"], 1.0),
+                       t(lang,"progress_deliveries").format(cur=int(deliveries), tar=int(config["targets"]["annual_deliveries"])))
+    projection_caption(projection, "deliveries", config, lang)
+    progress_with_text(min(vendors_added / config["targets"]["annual_vendors"], 1.0),
+                       t(lang,"progress_vendors").format(cur=int(vendors_added), tar=int(config["targets"]["annual_vendors"])))
+    projection_caption(projection, "vendors_new", config, lang)
+
+def projection_caption(projection, metric: str, config, lang) -> None:
+    """Year-end landing and target date under a progress bar."""
+    if projection is None:
+        return
+    target = config["targets"][PROJECTION_TARGETS[metric]]
+    landing = projection.landing[metric]
+    when = projection.target_date.get(metric)
+    if when is None:
+        status = t(lang, "target_missed")
+    elif when <= projection.latest:
+        status = t(lang, "target_reached").format(date=when.isoformat())
+    else:
+        status = t(lang, "target_expected").format(date=when.isoformat())
+    st.caption(t(lang, "projection_line").format(landing=landing, pct=landing / target if target else 0.0,
+                                                  status=status))
+
+def dimension_breakdown(store, snap, filters, config, lang):
+    """MTD KPIs per vendor/city/channel group within the current slice."""
+    dims = [dim for dim in DIMENSIONS if any(store.fact_index().values(dim))]
+    if snap is None or not dims:
+        return
+    st.subheader(t(lang, "breakdown_header"))
+    by = st.multiselect(t(lang, "breakdown_by"), options=dims, default=dims[:1],
+                        format_func=lambda dim: t(lang, dim), key="breakdown_by")
+    if not by:
+        return
+
+    def table():
+        rows = store.fact_index().select(filters, start=snap.latest.replace(day=1), end=snap.latest)
+        return None if rows.empty else _agg_period(rows, config["finance"], by=by)
+
+    table = store.memo(("dimension_breakdown", section_key(config, "dimension_breakdown"),
+                        _filter_key(filters), tuple(by)), table)
+    if table is None:
+        st.caption(t(lang, "breakdown_empty"))
+        return
+    cols = ["gmv_products", "orders", "aov", "conv", "cac", "otd_rate", "returns_rate", "commission_rev"]
+    st.dataframe(table[cols].round(3))
+
+# -------------------- Rolling metrics --------------------
+ROLLING_KPIS = ["aov", "conv", "cac", "otd_rate", "returns_rate"]
+
+def daily_sums(df: pd.DataFrame) -> pd.DataFrame:
+    """Additive sums per calendar day, sorted, with missing days filled as zeros."""
+    if df.empty:
+        return pd.DataFrame(columns=ADDITIVE_COLUMNS, dtype=float)
+    daily = df[ADDITIVE_COLUMNS].astype(float).groupby(pd.to_datetime(df["date"]).to_numpy()).sum()
+    return daily.asfreq("D", fill_value=0.0)
+
+def rolling_sums(df: pd.DataFrame, windows=ROLLING_WINDOWS) -> dict:
+    """
+    {window: trailing-window sums ending on each day}. One cumulative sum over the daily
+    frame serves every window: sum(t-w, t] = cum[t] - cum[t-w], so any size is O(n).
+    """
+    daily = daily_sums(df)
+    cum = np.vstack([np.zeros((1, len(ADDITIVE_COLUMNS))), daily.to_numpy().cumsum(axis=0)])
+    out = {}
+    for w in windows:
+        idx = np.arange(1, len(cum))
+        sums = cum[idx] - cum[np.maximum(idx - w, 0)]
+        out[w] = pd.DataFrame(sums, index=daily.index, columns=ADDITIVE_COLUMNS)
+    return out
+
+def window_sums(df: pd.DataFrame, days: int) -> pd.DataFrame:
+    """Trailing `days`-day sums ending on every calendar day ("YYYY-MM-DD" index)."""
+    out = rolling_sums(df, (days,))[days]
+    out.index = out.index.strftime("%Y-%m-%d")
+    return out
+
+def rolling_kpis(df: pd.DataFrame, windows=ROLLING_WINDOWS) -> pd.DataFrame:
+    """Trailing AOV / conversion / CAC / OTD / returns-rate series, columns "<kpi>_<w>d"."""
+    frames = []
+    for w, sums in rolling_sums(df, windows).items():
+        kpis = kpi_frame(sums)[ROLLING_KPIS]
+        frames.append(kpis.add_suffix(f"_{w}d"))
+    return pd.concat(frames, axis=1) if frames else pd.DataFrame()
+
+CHART_GRANULARITIES = {"day": None, "week": "W", "month": "MS"}  # -> resample rule
+
+def lttb_indices(y: np.ndarray, n: int) -> np.ndarray:
+    """
+    Largest-Triangle-Three-Buckets: positions of `n` points of the evenly spaced series `y`
+    that keep its visual shape (first and last point always kept).
+    """
+    size = len(y)
+    if n >= size or n < 3:
+        return np.arange(size)
+    # n - 2 buckets between the fixed end points; bucket i is [bounds[i], bounds[i + 1])
+    bounds = (np.arange(n - 1) * ((size - 2) / (n - 2))).astype(int) + 1
+    bounds[-1] = size - 1
+    picked = np.empty(n, dtype=np.intp)
+    picked[0], picked[-1] = 0, size - 1
+    a = 0
+    for i in range(n - 2):
+        lo, hi = bounds[i], bounds[i + 1]
+        if i == n - 3:
+            cx, cy = size - 1, y[-1]
+        else:
+            cx, cy = (bounds[i + 1] + bounds[i + 2] - 1) / 2, y[bounds[i + 1]:bounds[i + 2]].mean()
+        xs = np.arange(lo, hi)
+        area = np.abs((a - cx) * (y[lo:hi] - y[a]) - (a - xs) * (cy - y[a]))
+        a = picked[i + 1] = lo + int(area.argmax())
+    return picked
+
+def downsample(frame: pd.DataFrame, points: int = CHART_POINTS) -> pd.DataFrame:
+    """Rows kept by LTTB on each column (budget split across columns), so every series keeps its peaks."""
+    if len(frame) <= points or frame.empty:
+        return frame
+    per_column = max(points // max(frame.shape[1], 1), 3)
+    keep = np.unique(np.concatenate([
+        lttb_indices(np.nan_to_num(frame[col].to_numpy(dtype=float), posinf=0.0, neginf=0.0), per_column)
+        for col in frame.columns
+    ]))
+    return frame.iloc[keep]
+
+def chart_frame(series: pd.DataFrame, granularity: str = "day", start: date = None, end: date = None,
+                how: str = "sum", points: int = CHART_POINTS) -> pd.DataFrame:
+    """
+    Daily series (DatetimeIndex) -> what a chart draws: clipped to [start, end], bucketed by
+    week/month with `how` ("sum" for additive values, "last" for rolling KPIs), then
+    downsampled to about `points` rows. Zooming in therefore shows finer detail.
+    """
+    out = series.loc[pd.Timestamp(start) if start else None:pd.Timestamp(end) if end else None]
+    rule = CHART_GRANULARITIES[granularity]
+    if rule and not out.empty:
+        out = getattr(out.resample(rule), how)()
+    return downsample(out, points)
+
+def _date_range(picked) -> tuple:
+    """(start, end) from a date_input range; either end may be None while a range is half-picked."""
+    if isinstance(picked, (tuple, list)):
+        return (tuple(picked) + (None, None))[:2]
+    return picked, picked
+
+def charts(store, filters, lang):
+    st.subheader(t(lang,"trends_header"))
+    view = store.fact_index().select(filters)
+    if view.empty:
+        return
+    first, last = view["date"].iloc[0].date(), view["date"].iloc[-1].date()
+    c1, c2 = st.columns([1, 2])
+    granularity = c1.selectbox(t(lang,"chart_granularity"), options=list(CHART_GRANULARITIES), key="chart_granularity",
+                               format_func=lambda g: t(lang, f"granularity_{g}"))
+    start, end = _date_range(c2.date_input(t(lang,"chart_range"), value=(first, last),
+                                           min_value=first, max_value=last, key="chart_range"))
+
+    def series(columns):
+        return store.chart_data(columns, filters, granularity, start, end)
+
+    st.line_chart(series(["gmv_products","orders","deliveries","marketing_spend"]), height=260)
+    st.line_chart(series(["otd_on_time","otd_total","returns"]), height=200)
+
+    st.caption(t(lang, "rolling_header"))
+    w = st.selectbox(t(lang, "rolling_window"), options=list(ROLLING_WINDOWS), index=1, key="rolling_window")
+    st.line_chart(series([f"conv_{w}d", f"otd_rate_{w}d", f"returns_rate_{w}d"]) * 100, height=200)
+    st.line_chart(series([f"aov_{w}d", f"cac_{w}d"]), height=200)
+
+# -------------------- Projections --------------------
+PROJECTION_TARGETS = {  # projected metric -> its annual target in config["targets"] (None: no target)
+    "gmv_products": "annual_gmv",
+    "orders": "annual_units",
+    "deliveries": "annual_deliveries",
+    "vendors_new": "annual_vendors",
+    "marketing_spend": None,
+}
+RUN_RATE_DAYS = 28          # trailing days behind the run-rate level
+SEASONAL_WEEKS = 8          # trailing weeks behind the day-of-week factors
+RUNWAY_HORIZON_DAYS = 3 * 365
+
+@dataclass(frozen=True)
+class Projection:
+    """Year-end landings, target dates and cash runway projected from the latest day on."""
+    latest: date
+    model: str          # "seasonal" (prior-year months x weekdays) or "run_rate"
+    daily: dict         # metric -> projected level per day (before seasonal factors)
+    landing: dict       # metric -> projected year-end total
+    target_date: dict   # metric -> date the annual target is / was reached (None: not this year)
+    runway_date: date   # when working capital runs out at the projected burn (None: beyond horizon)
+    marketing: np.ndarray = field(default=None, repr=False, compare=False)  # projected spend per day after latest
+
+def _seasonal_factors(rollups: "Rollups", latest: date, cols: list) -> tuple:
+    """
+    (month factors (12, k), weekday factors (7, k)); all ones where there is no basis.
+    Months compare the prior year's daily average per month to its yearly one (only once every
+    month of that year has data); weekdays compare the trailing SEASONAL_WEEKS by weekday.
+    """
+    k = len(cols)
+    months, weekdays = np.ones((12, k)), np.ones((7, k))
+    prior = latest.year - 1
+    if all((prior, m) in rollups.monthly for m in range(1, 13)):
+        sums = np.array([rollups.monthly[(prior, m)][cols] for m in range(1, 13)])
+        lengths = pd.date_range(f"{prior}-01-01", periods=12, freq="MS").days_in_month.to_numpy()
+        per_day = sums / lengths[:, None]
+        overall = sums.sum(axis=0) / lengths.sum()
+        months = np.where(overall > 0, per_day / np.where(overall > 0, overall, 1), 1.0)
+
+    days = _recorded(rollups, pd.date_range(end=latest, periods=SEASONAL_WEEKS * 7))
+    hist = _day_matrix(rollups, days, cols)
+    overall = hist.mean(axis=0)
+    by_weekday = np.array([hist[days.weekday == w].mean(axis=0) if (days.weekday == w).any() else overall
+                           for w in range(7)])
+    weekdays = np.where(overall > 0, by_weekday / np.where(overall > 0, overall, 1), 1.0)
+    return months, weekdays
+
+def _recorded(rollups: "Rollups", days: pd.DatetimeIndex) -> pd.DatetimeIndex:
+    """The days that have data: a gap (or a history shorter than the window) is unknown, not zero."""
+    return days[[d in rollups.days for d in days.date]]
+
+def _day_matrix(rollups: "Rollups", days: pd.DatetimeIndex, cols: list) -> np.ndarray:
+    """Daily sums of `cols` for each day (zeros where nothing was recorded), shape (len(days), k)."""
+    zeros = np.zeros(len(ADDITIVE_COLUMNS))
+    return np.array([rollups.days.get(d, zeros) for d in days.date])[:, cols].reshape(len(days), len(cols))
+
+def project(rollups: "Rollups", targets: dict, finance: dict):
+    """
+    Projection from the Rollups: only the trailing weeks, the prior year's months and the current
+    year's days are read, so saving a day (Rollups.apply) keeps this O(1) in the history length.
+    Future days are level x month factor x weekday factor, the level being the days with data
+    among the last RUN_RATE_DAYS over their own factors; without a full prior year the model is
+    the plain run rate.
+    None when there is no data.
+    """
+    latest = rollups.latest
+    if latest is None:
+        return None
+    metrics = list(PROJECTION_TARGETS)
+    cols = [ADDITIVE_COLUMNS.index(m) for m in metrics]
+    months, weekdays = _seasonal_factors(rollups, latest, cols)
+    model = "seasonal" if (months != 1).any() else "run_rate"
+
+    recent = _recorded(rollups, pd.date_range(end=latest, periods=RUN_RATE_DAYS))
+    weight = months[recent.month - 1] * weekdays[recent.weekday]
+    level = _day_matrix(rollups, recent, cols).sum(axis=0) / np.maximum(weight.sum(axis=0), 1e-9)
+
+    year_end = date(latest.year, 12, 31)
+    future = pd.date_range(latest + pd.Timedelta(days=1),
+                           max(pd.Timestamp(year_end), pd.Timestamp(latest) + pd.Timedelta(days=RUNWAY_HORIZON_DAYS)))
+    projected = level * months[future.month - 1] * weekdays[future.weekday]  # (days, metrics)
+    this_year = future.year == latest.year
+    ytd = rollups.yearly[latest.year][cols]
+    landing = ytd + projected[this_year].sum(axis=0)
+
+    # Target dates: from the actual running total if already reached, else from the projection
+    year_days = pd.date_range(date(latest.year, 1, 1), latest)
+    actual = _day_matrix(rollups, year_days, cols).cumsum(axis=0)
+    ahead = ytd + projected[this_year].cumsum(axis=0)
+    target_date = {}
+    for i, m in enumerate(metrics):
+        target = targets.get(PROJECTION_TARGETS[m]) if PROJECTION_TARGETS[m] else None
+        if not target:
+            continue
+        if ytd[i] >= target:
+            target_date[m] = year_days[int(np.argmax(actual[:, i] >= target))].date()
+        elif (ahead[:, i] >= target).any():
+            target_date[m] = future[this_year][int(np.argmax(ahead[:, i] >= target))].date()
+        else:
+            target_date[m] = None
+
+    # Runway: admin accrues per day, marketing burns at its projected rate
+    marketing = projected[:, metrics.index("marketing_spend")]
+    admin_per_day = finance["admin_general"] / 365.0
+    left = finance["working_capital"] - (ytd[metrics.index("marketing_spend")] + admin_per_day * latest.timetuple().tm_yday)
+    days = int(runway_days(left, admin_per_day, marketing)[0])
+
+    return Projection(
+        latest=latest, model=model,
+        daily=dict(zip(metrics, level.tolist())),
+        landing=dict(zip(metrics, landing.tolist())),
+        target_date=target_date,
+        runway_date=latest + timedelta(days=days) if days >= 0 else None,
+        marketing=marketing,
+    )
+
+def runway_days(left, admin_per_day, marketing: np.ndarray) -> np.ndarray:
+    """
+    Days after the latest until `left` working capital is spent by admin accruing per day plus
+    the projected `marketing` spend, for each scenario (`left` and `admin_per_day` broadcast as
+    (S,) against the (days,) path): 0 if already spent, -1 if it lasts beyond the path.
+    """
+    left, admin_per_day = np.broadcast_arrays(np.atleast_1d(np.asarray(left, dtype=float)),
+                                              np.atleast_1d(np.asarray(admin_per_day, dtype=float)))
+    burn = np.cumsum(marketing)[None, :] + admin_per_day[:, None] * np.arange(1, len(marketing) + 1)
+    hit = burn >= left[:, None]
+    return np.where(left <= 0, 0, np.where(hit.any(axis=1), hit.argmax(axis=1) + 1, -1))
+
+# -------------------- Anomalies --------------------
+ANOMALY_METRICS = {  # watched daily total -> its label key in L
+    "sessions": "sessions",
+    "orders": "orders",
+    "gmv_products": "gmv",
+    "deliveries": "deliveries",
+    "returns": "returns",
+    "marketing_spend": "marketing",
+}
+ANOMALY_ALPHA = 2 / (28 + 1)  # EWMA weight of the newest day (span of about four weeks)
+ANOMALY_Z = 3.5               # |day - mean| / std above which a day is flagged
+ANOMALY_WARMUP = 14           # recorded days needed before anything is flagged
+ANOMALY_REL_FLOOR = 0.05      # std floor as a share of the mean, so flat series don't flag noise
+ANOMALY_RECENT_DAYS = 7       # days back from the latest that the risk section lists
+
+class AnomalyDetector:
+    """
+    EWMA mean / variance per ANOMALY_METRICS column over the recorded days (gaps are skipped,
+    not read as zeros). A day is flagged when it sits more than ANOMALY_Z deviations from the
+    statistics of the days before it. from_days() scores a whole history in one vectorized pass;
+    push() scores and absorbs one more day in O(1), and re-scores the latest day when more rows
+    for it arrive.
+    """
+    def __init__(self):
+        k = len(ANOMALY_METRICS)
+        self.mean, self.sq, self.n = np.zeros(k), np.zeros(k), 0  # EWMA of x and x^2, days seen
+        self.last = None
+        self.flags = []    # one record per flagged (day, metric), oldest first
+        self._prev = None  # state before the latest day, to re-score it
+
+    @staticmethod
+    def _score(x, mean, sq):
+        std = np.sqrt(np.clip(sq - mean ** 2, 0.0, None))
+        std = np.maximum(std, np.maximum(ANOMALY_REL_FLOOR * np.abs(mean), 1.0))
+        return (x - mean) / std
+
+    @staticmethod
+    def _record(day, i: int, x: float, mean: float, z: float) -> dict:
+        return {"date": day.isoformat(), "metric": list(ANOMALY_METRICS)[i], "value": round(float(x), 4),
+                "expected": round(float(mean), 4), "z": round(float(z), 2), "direction": "spike" if z > 0 else "drop"}
+
+    @classmethod
+    def from_days(cls, days: list, values: np.ndarray) -> "AnomalyDetector":
+        """Score sorted days (values: one row of ANOMALY_METRICS per day) in one pass."""
+        det = cls()
+        if not len(days):
+            return det
+        ewm = lambda a: pd.DataFrame(a).ewm(alpha=ANOMALY_ALPHA, adjust=False).mean().to_numpy()
+        mean, sq = ewm(values), ewm(values ** 2)
+        z = np.zeros_like(values)
+        z[1:] = cls._score(values[1:], mean[:-1], sq[:-1])
+        z[:ANOMALY_WARMUP] = 0.0
+        rows, cols = np.nonzero(np.abs(z) > ANOMALY_Z)
+        det.flags = [cls._record(days[r], c, values[r, c], mean[r - 1, c], z[r, c]) for r, c in zip(rows, cols)]
+        det.mean, det.sq, det.n, det.last = mean[-1], sq[-1], len(days), days[-1]
+        if len(days) > 1:
+            det._prev = (mean[-2], sq[-2], len(days) - 1)
+        else:
+            det._prev = (np.zeros(values.shape[1]), np.zeros(values.shape[1]), 0)
+        return det
+
+    def push(self, day, x: np.ndarray) -> None:
+        """Score and absorb the total for `day`, which must not be older than the latest day."""
+        if self.last is not None and day < self.last:
+            raise ValueError("days must be pushed in order")
+        if day == self.last:
+            self.mean, self.sq, self.n = self._prev
+            self.flags = [f for f in self.flags if f["date"] != day.isoformat()]
+        self._prev = (self.mean, self.sq, self.n)
+        if self.n == 0:
+            self.mean, self.sq = x.astype(float), x.astype(float) ** 2
+        else:
+            if self.n >= ANOMALY_WARMUP:
+                z = self._score(x, self.mean, self.sq)
+                self.flags += [self._record(day, i, x[i], self.mean[i], z[i]) for i in np.nonzero(np.abs(z) > ANOMALY_Z)[0]]
+            self.mean = (1 - ANOMALY_ALPHA) * self.mean + ANOMALY_ALPHA * x
+            self.sq = (1 - ANOMALY_ALPHA) * self.sq + ANOMALY_ALPHA * x ** 2
+        self.n += 1
+        self.last = day
+
+    def recent(self, days: int = ANOMALY_RECENT_DAYS) -> list:
+        """Flags within `days` of the latest day, newest first."""
+        if self.last is None:
+            return []
+        since = (self.last - timedelta(days=days - 1)).isoformat()
+        return [f for f in reversed(self.flags) if f["date"] >= since]
+
+# -------------------- Scenarios --------------------
+SCENARIO_PARAMS = {  # scenario column -> the config part it overrides (labels: the sidebar's L keys)
+    "commission_rate": "finance", "delivery_fee": "finance", "marketing_budget": "finance",
+    "admin_general": "finance", "working_capital": "finance",
+    "min_conv": "thresholds", "max_cac": "thresholds", "min_otd": "thresholds",
+    "max_returns": "thresholds", "min_aov": "thresholds",
+}
+SCENARIO_RESULTS = ["revenue_ytd", "commission_rev_ytd", "delivery_rev_ytd", "budget_used", "wc_left",
+                    "runway_months", "runway_date", "alerts", "months_flagged"]
+
+def scenario_frame(config: dict, scenarios=None) -> pd.DataFrame:
+    """
+    One row per scenario with a "scenario" name and every SCENARIO_PARAMS column, from row dicts
+    or a frame; blank or missing values are taken from `config`. Just the config when empty.
+    """
+    frame = pd.DataFrame(scenarios if scenarios is not None and len(scenarios) else [{}]).reset_index(drop=True)
+    for key, part in SCENARIO_PARAMS.items():
+        base = float(config[part][key])
+        frame[key] = pd.to_numeric(frame[key], errors="coerce").fillna(base) if key in frame else base
+    names = frame["scenario"].astype(object) if "scenario" in frame else pd.Series(None, index=frame.index, dtype=object)
+    frame["scenario"] = [str(n) if isinstance(n, str) and n.strip() else f"#{i + 1}" for i, n in enumerate(names)]
+    return frame[["scenario", *SCENARIO_PARAMS]]
+
+def scenario_grid(config: dict, sweeps: dict) -> pd.DataFrame:
+    """Every combination of the swept values ({param: values}); the other parameters from `config`."""
+    grids = np.meshgrid(*[np.asarray(v, dtype=float) for v in sweeps.values()], indexing="ij")
+    rows = pd.DataFrame({param: grid.ravel() for param, grid in zip(sweeps, grids)})
+    rows.insert(0, "scenario", [", ".join(f"{p}={v:g}" for p, v in zip(sweeps, values))
+                                for values in rows[list(sweeps)].itertuples(index=False)])
+    return scenario_frame(config, rows)
+
+def evaluate_scenarios(scenarios: pd.DataFrame, snap, projection=None, months: pd.DataFrame = None) -> pd.DataFrame:
+    """
+    The revenue lines of _period_kpis, the budget_vs_burn card and the alert rules for every row
+    of a scenario_frame() at once. The data only enters through the snapshot's MTD/YTD sums,
+    the projection's marketing path and the monthly sums, so each result is one NumPy expression
+    broadcast over the (S,) scenario columns. `months` adds how many months each scenario's
+    thresholds would have flagged; `projection` the dated runway.
+    """
+    p = {key: scenarios[key].to_numpy(dtype=float) for key in SCENARIO_PARAMS}
+    mtd, ytd = snap.mtd, snap.ytd
+    out = scenarios.reset_index(drop=True).copy()
+    out["commission_rev_ytd"] = ytd["gmv_products"] * p["commission_rate"]
+    out["delivery_rev_ytd"] = ytd["deliveries"] * p["delivery_fee"]
+    out["revenue_ytd"] = out["commission_rev_ytd"] + out["delivery_rev_ytd"]
+
+    monthly_admin = p["admin_general"] / 12.0
+    monthly_budget = monthly_admin + p["marketing_budget"] / 12.0
+    per_budget = np.where(monthly_budget > 0, 1.0 / np.where(monthly_budget > 0, monthly_budget, 1.0), 0.0)
+    out["budget_used"] = (mtd["marketing_spend"] + monthly_admin) * per_budget
+    out["wc_left"] = np.maximum(p["working_capital"] - (ytd["marketing_spend"] + snap.latest.month * monthly_admin), 0.0)
+    out["runway_months"] = out["wc_left"] * per_budget
+    out["runway_date"] = pd.NaT
+    if projection is not None and projection.marketing is not None:
+        admin_per_day = p["admin_general"] / 365.0
+        left = p["working_capital"] - (ytd["marketing_spend"] + admin_per_day * projection.latest.timetuple().tm_yday)
+        days = runway_days(left, admin_per_day, projection.marketing)
+        out["runway_date"] = pd.Series(pd.Timestamp(projection.latest) + pd.to_timedelta(days, unit="D")).where(days >= 0)
+
+    thresholds = {key: p[key][:, None] for key, part in SCENARIO_PARAMS.items() if part == "thresholds"}
+    now = _rule_hits(kpi_frame(pd.DataFrame([mtd])), thresholds)
+    for rule, hit in now.items():
+        out[rule] = hit[:, 0]
+    out["alerts"] = np.sum([hit[:, 0] for hit in now.values()], axis=0)
+    if months is not None and len(months):
+        flagged = np.logical_or.reduce(list(_rule_hits(kpi_frame(months), thresholds).values()))
+        out["months_flagged"] = flagged.sum(axis=1)
+    else:
+        out["months_flagged"] = 0
+    return out
+
+def scenarios(store, filters, config, lang) -> None:
+    """What-if table: the sidebar config, rows added in the editor and a one-parameter sweep, evaluated together."""
+    st.subheader(t(lang, "scenario_header"))
+    st.caption(t(lang, "scenario_caption"))
+    snap = store.period_snapshot(filters)
+    if snap is None:
+        st.info(t(lang, "no_data_yet"))
+        return
+
+    base = scenario_frame(config)
+    base["scenario"] = t(lang, "scenario_base")
+    labels = {key: st.column_config.NumberColumn(t(lang, key)) for key in SCENARIO_PARAMS}
+    rows = st.data_editor(base, num_rows="dynamic", hide_index=True, key=f"scenario_rows_{lang}",
+                          column_config={"scenario": st.column_config.TextColumn(t(lang, "scenario_name")), **labels})
+
+    c1, c2, c3, c4 = st.columns(4)
+    param = c1.selectbox(t(lang, "scenario_sweep"), options=[None, *SCENARIO_PARAMS],
+                         format_func=lambda k: "—" if k is None else t(lang, k))
+    if param is not None:
+        current = float(config[SCENARIO_PARAMS[param]][param])
+        start = c2.number_input(t(lang, "scenario_from"), value=current * 0.5, format="%.3f", key=f"sweep_from_{param}")
+        stop = c3.number_input(t(lang, "scenario_to"), value=current * 1.5, format="%.3f", key=f"sweep_to_{param}")
+        steps = c4.number_input(t(lang, "scenario_steps"), min_value=2, max_value=1000, value=11, step=1)
+        rows = pd.concat([rows, scenario_grid(config, {param: np.linspace(start, stop, int(steps))})],
+                         ignore_index=True)
+
+    rollups = store.slice_rollups(filters)
+    results = evaluate_scenarios(scenario_frame(config, rows), snap,
+                                 store.projections(config["targets"], config["finance"], filters),
+                                 rollups.months_frame())
+    st.caption(t(lang, "scenario_count").format(n=len(results), months=len(rollups.monthly)))
+    st.dataframe(results[["scenario", *SCENARIO_PARAMS, *SCENARIO_RESULTS]], hide_index=True, column_config={
+        "scenario": st.column_config.TextColumn(t(lang, "scenario_name")), **labels,
+        **{col: st.column_config.NumberColumn(t(lang, f"scenario_{col}"), format="%.0f")
+           for col in ("revenue_ytd", "commission_rev_ytd", "delivery_rev_ytd", "wc_left")},
+        "budget_used": st.column_config.NumberColumn(t(lang, "scenario_budget_used"), format="percent"),
+        "runway_months": st.column_config.NumberColumn(t(lang, "scenario_runway_months"), format="%.1f"),
+        "runway_date": st.column_config.DateColumn(t(lang, "scenario_runway_date")),
+        "alerts": st.column_config.NumberColumn(t(lang, "scenario_alerts")),
+        "months_flagged": st.column_config.NumberColumn(t(lang, "scenario_months_flagged")),
+    })
+
+# -------------------- Input / Export --------------------
+def input_form(store, lang):
+    st.subheader(t(lang,"form_header"))
+    with st.form("daily_input"):
+        c1, c2, c3 = st.columns(3)
+        d = c1.date_input(t(lang,"date"), value=date.today())
+        sessions = c2.number_input(t(lang,"sessions"), min_value=0, step=10)
+        orders = c3.number_input(t(lang,"orders"), min_value=0, step=1)
+
+        c4, c5, c6 = st.columns(3)
+        gmv = c4.number_input(t(lang,"gmv"), min_value=0.0, step=10.0, format="%.2f")
+        marketing = c5.number_input(t(lang,"marketing"), min_value=0.0, step=5.0, format="%.2f")
+        deliveries = c6.number_input(t(lang,"deliveries"), min_value=0, step=1)
+
+        c7, c8, c9 = st.columns(3)
+        returns = c7.number_input(t(lang,"returns"), min_value=0, step=1)
+        first_mile = c8.number_input(t(lang,"first_mile"), min_value=0, step=1)
+        pod = c9.number_input(t(lang,"handoff"), min_value=0, step=1)
+
+        c10, c11, c12 = st.columns(3)
+        vendors_new = c10.number_input(t(lang,"vendors_new"), min_value=0, step=1)
+        skus_added = c11.number_input(t(lang,"skus_added"), min_value=0, step=5)
+        skus_backlog = c12.number_input(t(lang,"skus_backlog"), min_value=0, step=5)
+
+        c13, c14, c15 = st.columns(3)
+        csat = c13.number_input(t(lang,"csat"), min_value=0.0, max_value=100.0, step=1.0, format="%.0f")
+        otd_total = c14.number_input(t(lang,"otd_total"), min_value=0, step=1)
         otd_on_time = c15.number_input(t(lang,"otd_on_time"), min_value=0, step=1)
 
+        c16, c17, c18 = st.columns(3)
+        vendor = c16.text_input(t(lang,"vendor"))
+        city = c17.text_input(t(lang,"city"))
+        channel = c18.text_input(t(lang,"channel"))
+
         submitted = st.form_submit_button(t(lang,"save_update"))
         if submitted:
             row = {
@@ -692,29 +3264,230 @@ def input_form(df, store, lang):
                 "marketing_spend": marketing, "deliveries": deliveries, "returns": returns,
                 "first_mile_pickups": first_mile, "handoff_last_mile": pod, "vendors_new": vendors_new,
                 "skus_added": skus_added, "skus_backlog": skus_backlog, "csat": csat,
-                "otd_total": otd_total, "otd_on_time": otd_on_time
+                "otd_total": otd_total, "otd_on_time": otd_on_time,
+                "vendor": vendor, "city": city, "channel": channel,
             }
-            if not df.empty and (df["date"] == d).any():
-                df.loc[df["date"] == d, list(row.keys())] = list(row.values())
+            try:
+                store.upsert([row])
+            except WriteConflict:
+                st.error(t(lang,"save_conflict"))
             else:
-                df = pd.concat([df, pd.DataFrame([row])], ignore_index=True)
-            store.save(df)
-            st.success(t(lang,"saved"))
-    # Reload from store to ensure consistency with backend
-    return store.load()
+                flash("success", t(lang,"saved"))
+                st.rerun()  # every section, not just this fragment, shows the new day
+
+EXPORT_FORMATS = {  # format -> (file suffix, MIME type)
+    "csv": (".csv", "text/csv"),
+    "csv.gz": (".csv.gz", "application/gzip"),
+    "parquet": (".parquet", "application/vnd.apache.parquet"),
+    "xlsx": (".xlsx", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"),
+}
+XLSX_MAX_ROWS = 1_048_575  # sheet limit minus the header row
+
+def export_formats() -> list:
+    """EXPORT_FORMATS usable here (XLSX needs openpyxl)."""
+    try:
+        import openpyxl  # noqa: F401
+        return list(EXPORT_FORMATS)
+    except Exception:
+        return [f for f in EXPORT_FORMATS if f != "xlsx"]
+
+def _export_chunks(df: pd.DataFrame, chunksize: int):
+    """Row slices of df with plain-string dimensions; one (empty) slice for an empty frame."""
+    for start in range(0, max(len(df), 1), chunksize):
+        yield df.iloc[start:start + chunksize][COLUMNS].astype({dim: str for dim in DIMENSIONS})
+
+def write_export(df: pd.DataFrame, out, fmt: str, chunksize: int = EXPORT_CHUNK_ROWS) -> None:
+    """
+    Write df to the binary file object `out` as csv, csv.gz, parquet or xlsx, one chunk at a
+    time, so the full serialized copy never sits in memory next to the frame.
+    Raises ValueError for an unknown or unavailable format.
+    """
+    if fmt in ("csv", "csv.gz"):
+        raw = gzip.GzipFile(fileobj=out, mode="wb", mtime=0) if fmt == "csv.gz" else out
+        text = io.TextIOWrapper(raw, encoding="utf-8", newline="")
+        for i, chunk in enumerate(_export_chunks(df, chunksize)):
+            chunk.to_csv(text, index=False, header=i == 0, date_format="%Y-%m-%d")
+        text.flush()
+        text.detach()  # leave `out` open for the caller
+        if raw is not out:
+            raw.close()
+    elif fmt == "parquet":
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        writer = None
+        for chunk in _export_chunks(df, chunksize):
+            table = pa.Table.from_pandas(chunk, preserve_index=False)
+            writer = writer or pq.ParquetWriter(out, table.schema)
+            writer.write_table(table)
+        writer.close()
+    elif fmt == "xlsx":
+        if "xlsx" not in export_formats():
+            raise ValueError("XLSX export needs openpyxl")
+        if len(df) > XLSX_MAX_ROWS:
+            raise ValueError(f"{len(df)} rows exceed the XLSX sheet limit of {XLSX_MAX_ROWS}")
+        with pd.ExcelWriter(out, engine="openpyxl") as xl:
+            row = 0
+            for chunk in _export_chunks(df, chunksize):
+                chunk = chunk.assign(date=chunk["date"].dt.date)
+                chunk.to_excel(xl, index=False, header=row == 0, startrow=row + (row > 0))
+                row += len(chunk)
+    else:
+        raise ValueError(f"Unknown export format: {fmt}")
 
-def downloads(df, lang):
+def download_lazy(label: str, build, file_name: str, mime: str, prepare_label: str, key: str):
+    """
+    download_button whose payload is only built on click. Streamlit versions without callable
+    `data` get a prepare button in front of a regular download_button instead.
+    """
+    from streamlit.errors import StreamlitAPIException
+    try:
+        st.download_button(label, data=build, file_name=file_name, mime=mime, key=key)
+    except StreamlitAPIException:
+        if st.button(prepare_label, key=f"{key}_prepare"):
+            st.download_button(label, data=build(), file_name=file_name, mime=mime, key=key)
+
+def downloads(store, filters, lang):
     st.subheader(t(lang,"export_header"))
-    if df.empty:
+    index = store.fact_index()
+    if index.df.empty:
         st.caption(t(lang,"export_caption"))
         return
-    buf = io.StringIO()
-    df.to_csv(buf, index=False)
-    st.download_button(t(lang,"download_csv"), data=buf.getvalue(),
-                       file_name="aydi_daily_metrics.csv", mime="text/csv")
+    first, last = index.df["date"].iloc[0].date(), index.df["date"].iloc[-1].date()
+    c1, c2 = st.columns([1, 2])
+    fmt = c1.selectbox(t(lang,"export_format"), options=export_formats(), key="export_format")
+    picked = c2.date_input(t(lang,"export_range"), value=(first, last), min_value=first, max_value=last,
+                           key="export_range")
+    start, end = _date_range(picked)
+    suffix, mime = EXPORT_FORMATS[fmt]
+    download_lazy(t(lang,"download_export").format(fmt=fmt.upper()), store.export(fmt, filters, start, end),
+                  file_name=f"aydi_daily_metrics{suffix}", mime=mime,
+                  prepare_label=t(lang,"export_prepare"), key="export_download")
+
+# -------------------- Bulk import --------------------
+def read_import_chunks(source, name: str = None, chunksize: int = 50_000):
+    """
+    Yield DataFrame chunks from a CSV or XLSX file (path or file-like object).
+    CSV is streamed chunk by chunk; XLSX needs openpyxl and is read in one go.
+    """
+    name = (name or getattr(source, "name", None) or str(source)).lower()
+    if name.endswith((".xlsx", ".xls")):
+        try:
+            import openpyxl  # pandas' xlsx engine
+        except Exception as e:
+            raise ValueError(f"XLSX import needs openpyxl: {e}")
+        df = pd.read_excel(source)
+        for start in range(0, len(df), chunksize):
+            yield df.iloc[start:start + chunksize]
+        return
+    yield from pd.read_csv(source, chunksize=chunksize)
+
+def validate_import_chunk(chunk: pd.DataFrame) -> pd.DataFrame:
+    """
+    Check a chunk against COLUMNS and coerce it to the stored types (raises ValueError).
+    Dimension columns are optional; missing ones mean company-wide rows.
+    """
+    missing = [c for c in ["date"] + METRIC_COLUMNS if c not in chunk.columns]
+    if missing:
+        raise ValueError(f"Missing columns: {', '.join(missing)}")
+    out = chunk[[c for c in COLUMNS if c in chunk.columns]].copy()
+    dates = pd.to_datetime(out["date"], errors="coerce")
+    if dates.isna().any():
+        raise ValueError(f"{int(dates.isna().sum())} row(s) with a missing or invalid date")
+    out["date"] = dates
+    raw = out[METRIC_COLUMNS]
+    nums = raw.apply(pd.to_numeric, errors="coerce")
+    bad = nums.isna() & raw.notna()
+    if bad.any().any():
+        cols = [c for c in METRIC_COLUMNS if bad[c].any()]
+        raise ValueError(f"Non-numeric values in: {', '.join(cols)}")
+    nums = nums.fillna(0)
+    if (nums < 0).any().any():
+        cols = [c for c in METRIC_COLUMNS if (nums[c] < 0).any()]
+        raise ValueError(f"Negative values in: {', '.join(cols)}")
+    out[METRIC_COLUMNS] = nums
+    return conform(out)
+
+def bulk_import(store, source, name: str = None, chunksize: int = 50_000) -> int:
+    """
+    Import historical days from CSV/XLSX: chunks are validated as they stream in, merged by
+    (date, vendor, city, channel) in one vectorized pass (the last row for a key wins), then
+    written with a single store.upsert() — one batch_update for Sheets, one transaction for SQLite.
+    Returns the number of distinct rows written.
+    """
+    chunks = [validate_import_chunk(c) for c in read_import_chunks(source, name, chunksize)]
+    chunks = [c for c in chunks if not c.empty]
+    if not chunks:
+        return 0
+    new = pd.concat(chunks, ignore_index=True).drop_duplicates(subset=KEY_COLUMNS, keep="last")
+    store.upsert(new.sort_values("date"))
+    return len(new)
+
+def bulk_import_form(store, lang) -> None:
+    """Upload widget for bulk history; an import that wrote rows reruns the whole app."""
+    with st.expander(t(lang, "import_header")):
+        st.caption(t(lang, "import_caption"))
+        upload = st.file_uploader(t(lang, "import_file"), type=["csv", "xlsx"], key="bulk_import_file")
+        if upload is None or not st.button(t(lang, "import_button")):
+            return
+        try:
+            rows = bulk_import(store, upload, name=upload.name)
+        except (ValueError, WriteConflict) as e:
+            st.error(t(lang, "import_failed").format(error=e))
+            return
+        if not rows:
+            st.success(t(lang, "import_done").format(rows=rows))
+            return
+        flash("success", t(lang, "import_done").format(rows=rows))
+        st.rerun()
+
+def change_history(store, lang) -> None:
+    """Expander with the latest logged cell edits: when, who, which row and column, old -> new."""
+    if store.audit is None:
+        return
+    with st.expander(t(lang, "history_header")):
+        history = store.memo(("change_history",), lambda: store.audit.history(store.store.cache_key))
+        if history.empty:
+            st.caption(t(lang, "history_empty"))
+        else:
+            st.dataframe(history, hide_index=True)
 
 # -------------------- Main --------------------
+def sync_status_panel(status: dict, lang) -> None:
+    """Sidebar line for the Sheets replica: pending writes, last push/pull, retry state."""
+    def clock(ts):
+        return time.strftime("%H:%M:%S", time.localtime(ts)) if ts else "—"
+
+    st.caption(t(lang, "sync_status").format(pending=status["pending"], push=clock(status["last_push"]),
+                                             pull=clock(status["last_pull"])))
+    if status["error"]:
+        st.warning(t(lang, "sync_failing").format(retry=clock(status["retry_at"]), error=status["error"]))
+
+def diagnostics_panel(trace: RerunTrace, lang):
+    """Sidebar table of this rerun's spans, plus the trace as a JSON-lines download."""
+    with st.sidebar.expander(t(lang, "diagnostics_header"), expanded=True):
+        totals = trace.totals()
+        st.caption(t(lang, "diagnostics_total").format(
+            ms=totals["ms"], rows=totals["rows"], calls=totals["api_calls"],
+            kb=(totals["bytes_out"] + totals["bytes_in"]) / 1024))
+        spans = pd.DataFrame(trace.spans)
+        if spans.empty:
+            return
+        spans["span"] = ["· " * d + name for d, name in zip(spans["depth"], spans["span"])]
+        st.dataframe(spans.drop(columns="depth").set_index("span"))
+        st.download_button(t(lang, "diagnostics_download"), data=trace.to_jsonl(),
+                           file_name=f"aydi_trace_{trace.id}.jsonl", mime="application/x-ndjson")
+
 def main():
+    trace = RerunTrace(detail=bool(TRACE_LOG_PATH))
+    token = _trace_var().set(trace)
+    try:
+        dashboard(trace)
+    finally:
+        _trace_var().reset(token)
+        write_trace_log(trace)
+
+def dashboard(trace: RerunTrace):
     st.set_page_config(page_title=APP_TITLE_EN, page_icon=LOGO_PATH, layout="wide")
     col_logo, col_title = st.columns([1, 9])
     with col_logo:
@@ -726,26 +3499,894 @@ def main():
     st.caption(t(lang,"caption"))
 
     config = ui_sidebar(lang)
+    trace.detail = trace.detail or config["diagnostics"]  # byte counts only when someone looks
     # Backend activation
-    store, backend_label, fallback_msg = get_backend(lang, prefer_sheets=config["prefer_sheets"])
+    with trace.span("get_backend"):
+        store, backend_label, fallback_msg = get_backend(lang, prefer_sheets=config["prefer_sheets"],
+                                                       local_backend=config["local_backend"],
+                                                       sheets_sync=config["sheets_sync"])
     with st.sidebar:
         st.success(backend_label if "Google" in backend_label else backend_label)
         if fallback_msg:
             st.warning(fallback_msg)
+        if hasattr(store, "sync_status"):
+            sync_status_panel(store.sync_status(), lang)
+        if config["as_of"]:
+            st.info(t(lang, "as_of_active").format(date=config["as_of"]))
+    live = store
+    if config["as_of"]:
+        # Everything below reads the data as it stood at the end of that day
+        store = store.as_of(day_end(config["as_of"]))
+
+    with trace.span("fact_index"):
+        filters = ui_slice(store.fact_index(), lang)
+
+    # Layout: one fragment per section; only the open tab's sections run
+    show_flash()
+    tabs = page_tabs(lang)
+    tab, is_open = tabs["overview"]
+    if is_open:
+        with tab:
+            with trace.span("period_snapshot"):
+                snap = store.period_snapshot(filters)  # computed once per data version and slice, shared by every card
+            with trace.span("projections"):
+                projection = store.projections(config["targets"], config["finance"], filters)
+            with trace.span("kpi_cards"):
+                as_fragment(kpi_cards)(snap, config, lang)
+            with trace.span("budget_vs_burn"):
+                as_fragment(budget_vs_burn)(snap, config, lang, projection)       # NEW monthly card
+            with trace.span("anomalies"):
+                anomalies = store.anomalies(filters)
+            with trace.span("risk_alerts"):
+                as_fragment(risk_alerts)(snap, config, lang, anomalies)
+            with trace.span("progress_vs_targets"):
+                as_fragment(progress_vs_targets)(snap, config, lang, projection)
+            with trace.span("dimension_breakdown"):
+                as_fragment(dimension_breakdown)(store, snap, filters, config, lang)
+    tab, is_open = tabs["charts"]
+    if is_open:
+        with tab, trace.span("charts"):
+            as_fragment(charts)(store, filters, lang)
+    tab, is_open = tabs["scenarios"]
+    if is_open:
+        with tab, trace.span("scenarios"):
+            as_fragment(scenarios)(store, filters, config, lang)
+    tab, is_open = tabs["data"]
+    if is_open:
+        with tab:
+            if getattr(store, "read_only", False):
+                st.info(t(lang, "as_of_read_only"))
+            else:
+                with trace.span("input_form"):
+                    as_fragment(input_form)(store, lang)
+                with trace.span("bulk_import"):
+                    as_fragment(bulk_import_form)(store, lang)
+            with trace.span("change_history"):
+                as_fragment(change_history)(live, lang)
+    tab, is_open = tabs["export"]
+    if is_open:
+        with tab, trace.span("downloads"):
+            as_fragment(downloads)(store, filters, lang)
+
+    if config["diagnostics"]:
+        diagnostics_panel(trace, lang)
+
+# -------------------- HTTP API --------------------
+API_PERIODS = ("today", "mtd", "ytd")
+API_RESPONSE_CACHE = 1024  # cached responses per data version before the cache starts over
+API_REQUEST_SECONDS = 10.0  # longest a worker waits on a client that is sending a request
+API_IDLE_SECONDS = 30.0     # kept-alive connections with no request for this long are closed
+
+def _json_default(value):
+    """json.dumps fallback for what the KPI core returns: numpy scalars and dates."""
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, (date, pd.Timestamp)):
+        return value.isoformat()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+def target_progress(snap, targets: dict, projection=None) -> dict:
+    """Per target metric: YTD, the annual target, share reached, projected landing and target date."""
+    progress = {}
+    for metric, key in PROJECTION_TARGETS.items():
+        if key is None:
+            continue
+        ytd, target = snap.ytd[metric], targets[key]
+        progress[metric] = {
+            "ytd": ytd, "target": target, "share": ytd / target if target else 0.0,
+            "landing": projection.landing[metric] if projection else None,
+            "target_date": projection.target_date.get(metric) if projection else None,
+        }
+    return progress
+
+class KpiService:
+    """
+    The JSON views behind the HTTP API, computed with the dashboard's own functions. The frame,
+    FactIndex and Rollups are loaded once per data version and shared by every request thread
+    (the version is re-checked at most every `ttl` seconds); responses are cached per endpoint,
+    query and version, which is also their ETag, so a repeat or a conditional request costs a
+    dict lookup.
+    """
+    ENDPOINTS = {  # path -> (method, description)
+        "/kpis": ("kpis", "today / MTD / YTD KPIs (?period=, ?by=vendor|city|channel for groups)"),
+        "/budget": ("budget", "monthly budget vs MTD burn, working capital and runway"),
+        "/progress": ("progress", "YTD progress, projected landing and date per annual target"),
+        "/alerts": ("alerts", "threshold alerts on the MTD KPIs and recent anomalous days"),
+        "/summary": ("summary", "kpis + budget + progress + alerts in one response"),
+        "/health": ("health", "backend and data version"),
+    }
+
+    def __init__(self, store, profile: str = None, ttl: float = 0.0):
+        self.store = store
+        self.profile = profile  # None: the profile marked default
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._state = None
+
+    def data(self) -> dict:
+        """The shared per-version state; one thread reloads while the others wait for it."""
+        with self._lock:
+            state, now = self._state, time.monotonic()
+            if state is not None and now - state["checked"] < self.ttl:
+                return state
+            version = self.store.version()
+            if state is not None and version is not None and version == state["version"]:
+                state["checked"] = now
+                return state
+            df = self.store.load().sort_values("date", kind="stable").reset_index(drop=True)
+            self._state = {"version": version, "checked": now, "index": FactIndex(df), "rollups": Rollups.from_frame(df),
+                           "slices": {}, "responses": {}}
+            return self._state
+
+    def config(self) -> tuple:
+        """(config, profile stamp) from the profile file, re-read only when it changed."""
+        book = ProfileStore().load()
+        name = book["default"] if self.profile is None else self.profile
+        profile = book["profiles"].get(name)
+        return profile_config(profile), (name, profile.get("updated") if profile else None)
+
+    def respond(self, path: str, query: dict, if_none_match: str = None) -> tuple:
+        """(status, etag, body) for a GET; LookupError for an unknown path, ValueError for a bad query."""
+        path = path.rstrip("/") or "/"
+        if path == "/":
+            return 200, None, json.dumps({p: doc for p, (_m, doc) in self.ENDPOINTS.items()}).encode()
+        if path not in self.ENDPOINTS:
+            raise LookupError(path)
+        state = self.data()
+        config, stamp = self.config()
+        key = (path, tuple(sorted(query.items())), stamp)
+        etag = None
+        if state["version"] is not None:
+            etag = '"' + hashlib.sha1(repr((state["version"], key)).encode()).hexdigest()[:24] + '"'
+            if if_none_match == etag:
+                return 304, etag, b""
+            cached = state["responses"].get(key)
+            if cached is not None:
+                return 200, etag, cached
+        payload = getattr(self, self.ENDPOINTS[path][0])(state, config, query)
+        body = json.dumps(payload, default=_json_default, ensure_ascii=False).encode()
+        if etag is not None:
+            if len(state["responses"]) >= API_RESPONSE_CACHE:
+                state["responses"].clear()
+            state["responses"][key] = body
+        return 200, etag, body
+
+    def _slice(self, state: dict, query: dict) -> tuple:
+        """(filters, snapshot, rollups) of the vendor/city/channel slice in the query, once per version."""
+        filters = {dim: query[dim] for dim in DIMENSIONS if dim in query}
+        key = _filter_key(filters)
+        if key not in state["slices"]:
+            rollups = state["rollups"] if not key else Rollups.from_frame(state["index"].select(filters))
+            state["slices"][key] = (rollups.snapshot(), rollups)
+        return (filters, *state["slices"][key])
+
+    def _head(self, state: dict, filters: dict, snap) -> dict:
+        return {"backend": self.store.cache_key, "filters": filters, "latest": snap.latest if snap else None}
+
+    def kpis(self, state: dict, config: dict, query: dict) -> dict:
+        period, by = query.get("period"), query.get("by")
+        if period is not None and period not in API_PERIODS:
+            raise ValueError(f"period must be one of {', '.join(API_PERIODS)}")
+        if by is not None and by not in DIMENSIONS:
+            raise ValueError(f"by must be one of {', '.join(DIMENSIONS)}")
+        filters, snap, _rollups = self._slice(state, query)
+        out = self._head(state, filters, snap)
+        if snap is None:
+            return out
+        for name in [period] if period else API_PERIODS:
+            if by is None:
+                out[name] = snap.kpis(name, config["finance"])
+                continue
+            start = {"today": snap.latest, "mtd": snap.latest.replace(day=1), "ytd": date(snap.latest.year, 1, 1)}[name]
+            rows = state["index"].select(filters, start=start, end=snap.latest)
+            groups = _agg_period(rows, config["finance"], by=[by]) if not rows.empty else pd.DataFrame()
+            out[name] = groups.reset_index().to_dict("records")
+        return out
+
+    def _projection(self, config: dict, snap, rollups):
+        return project(rollups, config["targets"], config["finance"]) if snap is not None else None
+
+    def budget(self, state: dict, config: dict, query: dict) -> dict:
+        filters, snap, rollups = self._slice(state, query)
+        projection = self._projection(config, snap, rollups)
+        return {**self._head(state, filters, snap), **budget_status(snap, config["finance"]),
+                "runway_date": projection.runway_date if projection else None}
+
+    def progress(self, state: dict, config: dict, query: dict) -> dict:
+        filters, snap, rollups = self._slice(state, query)
+        out = self._head(state, filters, snap)
+        if snap is not None:
+            projection = self._projection(config, snap, rollups)
+            out["model"] = projection.model
+            out["targets"] = target_progress(snap, config["targets"], projection)
+        return out
+
+    def alerts(self, state: dict, config: dict, query: dict) -> dict:
+        filters, snap, rollups = self._slice(state, query)
+        out = {**self._head(state, filters, snap), "thresholds": config["thresholds"], "alerts": [], "anomalies": []}
+        if snap is not None:
+            month = pd.DataFrame([snap.mtd], index=[snap.latest.strftime("%Y-%m")])
+            out["alerts"] = alert_records(evaluate_alerts(month, config["thresholds"]), config["thresholds"])
+            out["anomalies"] = rollups.anomalies().recent()
+        return out
+
+    def summary(self, state: dict, config: dict, query: dict) -> dict:
+        out = self.kpis(state, config, query)
+        for part in ("budget", "progress", "alerts"):
+            out[part] = {k: v for k, v in getattr(self, part)(state, config, query).items()
+                         if k not in ("backend", "filters", "latest")}
+        return out
+
+    def health(self, state: dict, config: dict, query: dict) -> dict:
+        return {"status": "ok", "backend": self.store.cache_key, "version": repr(state["version"]),
+                "rows": len(state["index"].df), "latest": state["rollups"].latest}
+
+class _ApiHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive: pollers reuse their connection
+    timeout = API_REQUEST_SECONDS  # a client stalling mid-request gives its worker back
+
+    def __init__(self, request, client_address, server):
+        """Set up only: ApiServer runs the requests one turn at a time (handle_one_request())."""
+        self.request, self.client_address, self.server = request, client_address, server
+        self.close_connection = False
+        self.setup()
+
+    def buffered(self) -> bool:
+        """True if the next request already sits in rfile's buffer (a pipelining client)."""
+        self.connection.setblocking(False)
+        try:
+            return bool(self.rfile.peek(1))
+        except OSError:
+            return False
+        finally:
+            self.connection.settimeout(self.timeout)
+
+    def do_GET(self):
+        url = urllib.parse.urlsplit(self.path)
+        query = dict(urllib.parse.parse_qsl(url.query))
+        try:
+            status, etag, body = self.server.service.respond(url.path, query, self.headers.get("If-None-Match"))
+        except LookupError:
+            status, etag, body = 404, None, json.dumps({"error": f"no such endpoint: {url.path}"}).encode()
+        except ValueError as e:
+            status, etag, body = 400, None, json.dumps({"error": str(e)}).encode()
+        except Exception as e:  # a backend failure must not take the connection down silently
+            status, etag, body = 500, None, json.dumps({"error": f"{type(e).__name__}: {e}"}).encode()
+        self.send_response(status)
+        if etag:
+            self.send_header("ETag", etag)
+            self.send_header("Cache-Control", "no-cache")  # cache, but revalidate with If-None-Match
+        if status != 304:
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if status != 304:
+            self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+class ApiServer(http.server.HTTPServer):
+    """
+    HTTPServer answering from a fixed pool of worker threads, sharing one KpiService. Workers
+    take one request at a time: new and kept-alive connections wait in a selector until they
+    send something, so idle clients never hold a worker, and are closed after API_IDLE_SECONDS.
+    """
+    def __init__(self, address: tuple, service: KpiService, workers: int = 16, verbose: bool = False):
+        super().__init__(address, _ApiHandler)
+        self.service = service
+        self.verbose = verbose
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="aydi-api")
+        self._parking = []  # handlers handed to the watcher, guarded by _parking_lock
+        self._parking_lock = threading.Lock()
+        self._wake_r, self._wake_w = socket.socketpair()
+        self._closing = False
+        threading.Thread(target=self._watch, name="aydi-api-idle", daemon=True).start()
+
+    def process_request(self, request, client_address):
+        self._park(_ApiHandler(request, client_address, self))
+
+    def _park(self, handler: _ApiHandler) -> None:
+        with self._parking_lock:
+            self._parking.append(handler)
+        self._wake_w.send(b"\0")
+
+    def _turn(self, handler: _ApiHandler) -> None:
+        """Serve one request, then park the connection again unless it is done."""
+        try:
+            handler.handle_one_request()
+        except Exception:
+            handler.close_connection = True
+            self.handle_error(handler.request, handler.client_address)
+        if handler.close_connection or self._closing:
+            self._close(handler)
+        elif handler.buffered():
+            self._pool.submit(self._turn, handler)
+        else:
+            self._park(handler)
+
+    def _close(self, handler: _ApiHandler) -> None:
+        try:
+            handler.finish()
+        except OSError:
+            pass
+        self.shutdown_request(handler.request)
+
+    def _watch(self) -> None:
+        """Hand connections to the pool once they are readable; close those idle too long."""
+        selector = selectors.DefaultSelector()
+        selector.register(self._wake_r, selectors.EVENT_READ)
+        idle = {}  # handler -> parked at (monotonic)
+        while not self._closing:
+            for key, _events in selector.select(timeout=1.0):
+                if key.fileobj is self._wake_r:
+                    self._wake_r.recv(4096)
+                    with self._parking_lock:
+                        parked, self._parking = self._parking, []
+                    for handler in parked:
+                        selector.register(handler.connection, selectors.EVENT_READ, handler)
+                        idle[handler] = time.monotonic()
+                else:
+                    selector.unregister(key.fileobj)
+                    del idle[key.data]
+                    self._pool.submit(self._turn, key.data)
+            now = time.monotonic()
+            for handler in [h for h, since in idle.items() if now - since > API_IDLE_SECONDS]:
+                selector.unregister(handler.connection)
+                del idle[handler]
+                self._close(handler)
+        for handler in idle:
+            self._close(handler)
+        selector.close()
+
+    def server_close(self):
+        super().server_close()
+        self._closing = True
+        self._wake_w.send(b"\0")
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+# -------------------- Benchmarks --------------------
+BENCH_SIZES = (1_000, 100_000, 1_000_000)
+BENCH_CITIES = ["Muscat", "Sohar", "Salalah", "Nizwa", "Sur"]
+BENCH_CHANNELS = ["web", "app", "social"]
+SHEETS_CELL_LIMIT = 10_000_000  # Google Sheets cap per spreadsheet
+
+def synthetic_history(days: int, entities: int = 1, end: date = None, seed: int = 0) -> pd.DataFrame:
+    """
+    Plausible daily COLUMNS data: `days` consecutive days ending at `end` (default today) for
+    `entities` vendor/city/channel combinations (company-wide rows when entities == 1), with
+    growth, weekly seasonality and per-entity scale. Conversion, AOV, OTD and returns stay in
+    realistic bands, so the alert rules fire now and then rather than always or never.
+    """
+    rng = np.random.default_rng(seed)
+    n = days * entities
+    day = np.tile(np.arange(days), entities)
+    entity = np.repeat(np.arange(entities), days)
+    scale = rng.lognormal(0.0, 0.5, entities)[entity]
+    demand = scale * (1 + day / max(days, 1)) * (1 + 0.15 * np.sin(2 * np.pi * day / 7))
+
+    sessions = rng.poisson(400 * demand)
+    orders = rng.binomial(sessions, 0.025)
+    deliveries = rng.binomial(orders, 0.95)
+    otd_total = deliveries
+    df = pd.DataFrame({
+        "date": pd.date_range(end=pd.Timestamp(end or date.today()), periods=days, freq="D")[day],
+        "sessions": sessions,
+        "orders": orders,
+        "gmv_products": np.round(orders * rng.normal(28.0, 6.0, n).clip(5.0), 3),
+        "marketing_spend": np.round(rng.gamma(2.0, 3.0, n) * scale, 3),
+        "deliveries": deliveries,
+        "returns": rng.binomial(deliveries, 0.04),
+        "first_mile_pickups": deliveries + rng.poisson(0.5, n),
+        "handoff_last_mile": deliveries,
+        "vendors_new": rng.poisson(0.2, n),
+        "skus_added": rng.poisson(5.0, n),
+        "skus_backlog": rng.poisson(30.0, n),
+        "csat": rng.normal(88.0, 5.0, n).clip(0.0, 100.0).round(),
+        "otd_total": otd_total,
+        "otd_on_time": rng.binomial(otd_total, 0.93),
+    })
+    if entities > 1:
+        df["vendor"] = np.char.add("V", np.char.zfill(np.arange(entities).astype(str), 5))[entity]
+        df["city"] = np.array(BENCH_CITIES)[entity % len(BENCH_CITIES)]
+        df["channel"] = np.array(BENCH_CHANNELS)[entity % len(BENCH_CHANNELS)]
+    return conform(df.sort_values("date", kind="stable"))
+
+class FakeWorksheet:
+    """
+    In-memory stand-in for the gspread Worksheet calls GSheetsStore makes (values only, A1
+    ranges, trailing blanks trimmed like the Sheets API). `calls` counts requests per method.
+    """
+    def __init__(self, title: str = "daily_metrics", rows: int = 1000):
+        self.title = title
+        self.row_count = rows
+        self.cells = []
+        self.calls = {}
+        self.revision = 0  # bumped by every write, served as the spreadsheet's lastUpdateTime
+
+    def _count(self, name: str) -> None:
+        self.calls[name] = self.calls.get(name, 0) + 1
+
+    @property
+    def spreadsheet(self):
+        return self
+
+    def get_lastUpdateTime(self) -> str:
+        self._count("get_lastUpdateTime")
+        return str(self.revision)
+
+    @staticmethod
+    def _bounds(a1: str) -> tuple:
+        """"B2:D" -> (first row, last row or None, first col, last col) 0-based/exclusive."""
+        import re
+
+        def cell(ref):
+            letters, digits = re.fullmatch(r"([A-Z]*)(\d*)", ref).groups()
+            col = functools.reduce(lambda acc, ch: acc * 26 + ord(ch) - 64, letters, 0)
+            return (int(digits) if digits else None), (col or None)
+
+        first, _, last = a1.split("!")[-1].partition(":")
+        (r0, c0), (r1, c1) = cell(first), cell(last or first)
+        return (r0 or 1) - 1, r1, (c0 or 1) - 1, c1
+
+    def get_all_values(self) -> list:
+        self._count("get_all_values")
+        width = max((len(r) for r in self.cells), default=0)
+        return [r + [""] * (width - len(r)) for r in self.cells]
+
+    def batch_get(self, ranges: list) -> list:
+        self._count("batch_get")
+        out = []
+        for a1 in ranges:
+            r0, r1, c0, c1 = self._bounds(a1)
+            rows = [r[c0:c1] for r in self.cells[r0:r1]]
+            rows = [r[:max((i + 1 for i, v in enumerate(r) if v != ""), default=0)] for r in rows]
+            while rows and not rows[-1]:
+                rows.pop()
+            out.append(rows)
+        return out
+
+    def update(self, values: list, range_name: str = "A1") -> None:
+        self._count("update")
+        self._write(range_name, values)
+
+    def batch_update(self, data: list, **kwargs) -> None:
+        self._count("batch_update")
+        for item in data:
+            self._write(item["range"], item["values"])
+
+    def _write(self, a1: str, values: list) -> None:
+        r0, _r1, c0, _c1 = self._bounds(a1)
+        if r0 + len(values) > self.row_count:
+            raise ValueError(f"range {a1} exceeds grid limits ({self.row_count} rows)")
+        self.revision += 1
+        for i, row in enumerate(values):
+            while len(self.cells) <= r0 + i:
+                self.cells.append([])
+            cur = self.cells[r0 + i]
+            cur.extend([""] * (c0 + len(row) - len(cur)))
+            cur[c0:c0 + len(row)] = [str(v) for v in row]
+
+    def clear(self) -> None:
+        self._count("clear")
+        self.cells = []
+        self.revision += 1
 
-    df = store.load()
+    def add_rows(self, rows: int) -> None:
+        self._count("add_rows")
+        self.row_count += rows
 
-    # Layout
-    kpi_cards(df, config, lang)
-    budget_vs_burn(df, config, lang)       # NEW monthly card
-    risk_alerts(df, config, lang)
-    progress_vs_targets(df, config, lang)
-    charts(df, lang)
+def bench_shape(rows: int, max_days: int = 3 * 365) -> tuple:
+    """(days, entities) giving about `rows` rows: up to three years, then more entities."""
+    days = min(rows, max_days)
+    return days, -(-rows // days)
 
-    st.divider()
-    df = input_form(df, store, lang)
-    downloads(df, lang)
+def _bench_stages(df: pd.DataFrame, workdir: str) -> list:
+    """(stage, callable) pairs over one history; every callable can be repeated."""
+    import shutil
+
+    config, lang = default_config(), "EN"
+    finance = config["finance"]
+    csv_path = os.path.join(workdir, "bench.csv")
+    parquet_dir = os.path.join(workdir, "bench_parquet")
+    sqlite_path = os.path.join(workdir, "bench.db")
+    latest = df["date"].max()
+    mtd = df[df["date"] >= latest.replace(day=1)]
+    snap = build_snapshot(df)
+    rollups = Rollups.from_frame(df)
+    projection = project(rollups, config["targets"], finance)
+    sweep = scenario_grid(config, {"commission_rate": np.linspace(0.05, 0.25, 10),
+                                   "working_capital": np.linspace(5_000, 50_000, 100)})
+    day = df[df["date"] == latest].head(1)
+
+    def parquet_save():
+        shutil.rmtree(parquet_dir, ignore_errors=True)
+        ParquetStore(parquet_dir).save(df)
+
+    def sheets_save():
+        store = GSheetsStore("bench", worksheet=FakeWorksheet(rows=len(df) + 1))
+        store.save(df)
+        return store
+
+    sheet = sheets_save()  # row index already built, so the upsert stage times the steady state
+
+    cached = CachedStore(CSVStore(csv_path), ttl=float("inf"))
+
+    def anomalies_cold():
+        rollups._anomalies = None  # time the full vectorized scoring, not the cached detector
+        return rollups.anomalies()
+
+    def cold(section):
+        """Time a section's own work: a snapshot's memo would answer every repeat after the first."""
+        def run():
+            snap._memo.clear()
+            section(snap, config, lang)
+        return run
+
+    def charts_cold():
+        entry = cached._entry()
+        for memo in ("charts", "rolling"):
+            entry.pop(memo, None)
+        charts(cached, {}, lang)
+
+    stages = [  # (stage, callable); keep names stable, baselines are compared by name
+        ("csv_save", lambda: CSVStore(csv_path).save(df)),
+        ("csv_load", lambda: CSVStore(csv_path).load()),
+        ("parquet_save", parquet_save),
+        ("parquet_load", lambda: ParquetStore(parquet_dir).load()),
+        ("sqlite_save", lambda: SQLiteStore(sqlite_path).save(df)),
+        ("sqlite_load", lambda: SQLiteStore(sqlite_path).load()),
+        ("sqlite_period_snapshot", lambda: SQLiteStore(sqlite_path).period_snapshot()),
+    ]
+    if len(df) * len(COLUMNS) <= SHEETS_CELL_LIMIT:
+        stages += [
+            ("gsheets_save", sheets_save),
+            ("gsheets_upsert_day", lambda: sheet.upsert(day)),
+        ]
+    stages += [
+        ("fact_index", lambda: FactIndex(df)),
+        ("build_snapshot", lambda: build_snapshot(df)),
+        ("rollups", lambda: Rollups.from_frame(df)),
+        ("projections", lambda: project(rollups, config["targets"], finance)),
+        ("anomalies", anomalies_cold),
+        ("scenarios_1000", lambda: evaluate_scenarios(sweep, snap, projection, rollups.months_frame())),
+        ("agg_period_mtd", lambda: _agg_period(mtd, finance)),
+        ("agg_period_by_vendor", lambda: _agg_period(df, finance, by=["vendor"])),
+        ("kpi_cards", cold(kpi_cards)),
+        ("risk_alerts", cold(risk_alerts)),
+        ("monthly_alerts", lambda: evaluate_alerts(monthly_sums(df), config["thresholds"])),
+        ("rolling_kpis", lambda: rolling_kpis(df)),
+        ("charts", charts_cold),
+        ("export_csv_gz", lambda: write_export(df, io.BytesIO(), "csv.gz")),
+    ]
+    return stages
+
+def run_bench(sizes=BENCH_SIZES, repeat: int = 3, seed: int = 0, memory: bool = True, log=None) -> dict:
+    """
+    Time every pipeline stage on synthetic histories of each size (best of `repeat` runs) and,
+    with `memory`, record its peak traced memory from one extra run (tracemalloc slows that run
+    several-fold, so it is kept out of the timings). Returns the JSON-ready results.
+    """
+    import platform
+    import tempfile
+    import tracemalloc
+
+    results = {}
+    for rows in sizes:
+        days, entities = bench_shape(rows)
+        started = time.perf_counter()
+        df = synthetic_history(days, entities, seed=seed)
+        timings = {"generate": {"seconds": round(time.perf_counter() - started, 6), "peak_mb": None}}
+        with tempfile.TemporaryDirectory(prefix="aydi_bench_") as workdir:
+            for stage, fn in _bench_stages(df, workdir):
+                best = float("inf")
+                for _ in range(max(repeat, 1)):
+                    started = time.perf_counter()
+                    fn()
+                    best = min(best, time.perf_counter() - started)
+                peak_mb = None
+                if memory:
+                    tracemalloc.start()
+                    fn()
+                    peak_mb = round(tracemalloc.get_traced_memory()[1] / 2**20, 3)
+                    tracemalloc.stop()
+                timings[stage] = {"seconds": round(best, 6), "peak_mb": peak_mb}
+                if log:
+                    log(f"{len(df):>9} rows  {stage:<24} {best:9.4f}s  "
+                        + (f"{peak_mb:9.1f} MB" if memory else ""))
+        results[str(rows)] = {"rows": len(df), "days": days, "entities": entities, "stages": timings}
+    return {
+        "meta": {
+            "created": pd.Timestamp.now(tz="UTC").isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "pandas": pd.__version__,
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "repeat": repeat,
+            "seed": seed,
+            "memory": memory,
+        },
+        "results": results,
+    }
+
+def compare_bench(current: dict, baseline: dict, tolerance: float = 0.25, min_seconds: float = 0.005) -> list:
+    """Stages slower than baseline by more than `tolerance` (and `min_seconds`), per size."""
+    regressions = []
+    for size, result in current["results"].items():
+        base = baseline.get("results", {}).get(size, {}).get("stages", {})
+        for stage, timing in result["stages"].items():
+            old = base.get(stage, {}).get("seconds")
+            new = timing["seconds"]
+            if old and new > old * (1 + tolerance) and new - old > min_seconds:
+                regressions.append({"size": size, "stage": stage, "seconds": new, "baseline": old,
+                                    "ratio": round(new / old, 3)})
+    return regressions
+
+# -------------------- CLI --------------------
+def cli_store(backend: str):
+    """Resolve the raw store for headless use; exits rather than silently falling back from Sheets."""
+    store, _label, _fallback = get_backend(
+        "EN", prefer_sheets=backend == "sheets", local_backend=backend if backend != "sheets" else "csv"
+    )
+    store = store.store  # no session cache outside a Streamlit session
+    if backend == "sheets" and not isinstance(store, GSheetsStore):
+        raise SystemExit("Google Sheets is not configured or unavailable.")
+    return store
+
+def cli(argv=None) -> int:
+    """Headless entry point: python aydi_ops_guardrail.py [--backend ...] <command> ..."""
+    import argparse
+    from streamlit import config as st_config
+    from streamlit.logger import set_log_level
+
+    # No ScriptRunContext noise outside the app. Parse the config first: the first parse
+    # (otherwise triggered by a widget call, e.g. in bench) resets the log level.
+    st_config.get_config_options()
+    set_log_level("error")
+    parser = argparse.ArgumentParser(prog="aydi_ops_guardrail", description="AYDI Ops Guardrail (headless)")
+    parser.add_argument("--backend", choices=["csv", "parquet", "sqlite", "sheets"], default="csv",
+                        help="store to operate on (default: csv)")
+    parser.add_argument("--profile", default=None,
+                        help=f"config profile from {PROFILES_PATH} for targets/finance/thresholds "
+                             "(default: the profile marked default, else the built-in values)")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_import = sub.add_parser("import", help="bulk-import historical days from a CSV/XLSX file")
+    p_import.add_argument("path")
+    p_import.add_argument("--chunksize", type=int, default=50_000)
+    p_alerts = sub.add_parser("alerts", help="score the history against the alert thresholds and flag anomalous days (JSON out)")
+    p_alerts.add_argument("--window", type=int, default=None,
+                          help="trailing N-day windows ending on each day instead of calendar months")
+    p_alerts.add_argument("--since", default=None, help="only report periods from this date/month on")
+    p_alerts.add_argument("--latest", action="store_true", help="only report the most recent period")
+    p_alerts.add_argument("--threshold", action="append", default=[], metavar="KEY=VALUE",
+                          help="override a threshold (min_conv, max_cac, min_otd, max_returns, min_aov)")
+    p_alerts.add_argument("--where", action="append", default=[], metavar="DIM=VALUE",
+                          help="restrict to one vendor/city/channel (repeatable)")
+    p_alerts.add_argument("--fail-on-breach", action="store_true", help="exit with status 3 if anything fired")
+    p_alerts.add_argument("--as-of", type=date.fromisoformat, default=None,
+                          help="score the data as it stood at the end of this date (YYYY-MM-DD), from the change log")
+    p_export = sub.add_parser("export", help="write the history to a csv/csv.gz/parquet/xlsx file")
+    p_export.add_argument("path")
+    p_export.add_argument("--format", choices=list(EXPORT_FORMATS), default=None,
+                          help="output format (default: from the file suffix)")
+    p_export.add_argument("--start", type=date.fromisoformat, default=None, help="first date (YYYY-MM-DD)")
+    p_export.add_argument("--end", type=date.fromisoformat, default=None, help="last date (YYYY-MM-DD)")
+    p_export.add_argument("--where", action="append", default=[], metavar="DIM=VALUE",
+                          help="restrict to one vendor/city/channel (repeatable)")
+    p_export.add_argument("--as-of", type=date.fromisoformat, default=None,
+                          help="export the data as it stood at the end of this date (YYYY-MM-DD), from the change log")
+    p_export.add_argument("--chunksize", type=int, default=EXPORT_CHUNK_ROWS)
+    p_scenarios = sub.add_parser("scenarios", help="score what-if finance/threshold configs against the data "
+                                                   "in one vectorized pass (JSON out)")
+    p_scenarios.add_argument("--file", default=None,
+                             help="CSV of scenarios: a 'scenario' name column plus any of the parameters; "
+                                  "blank cells keep the defaults")
+    p_scenarios.add_argument("--sweep", action="append", default=[], metavar="KEY=START:STOP:STEPS",
+                             help=f"sweep one of {', '.join(SCENARIO_PARAMS)}; several sweeps form a grid")
+    p_scenarios.add_argument("--where", action="append", default=[], metavar="DIM=VALUE",
+                             help="restrict to one vendor/city/channel (repeatable)")
+    p_scenarios.add_argument("--as-of", type=date.fromisoformat, default=None,
+                             help="score against the data as it stood at the end of this date (YYYY-MM-DD)")
+    p_serve = sub.add_parser("serve", help="serve KPIs, budget, target progress and alerts as a JSON HTTP API")
+    p_serve.add_argument("--host", default="127.0.0.1")
+    p_serve.add_argument("--port", type=int, default=8765)
+    p_serve.add_argument("--workers", type=int, default=16, help="request threads (default: 16)")
+    p_serve.add_argument("--verbose", action="store_true", help="log every request to stderr")
+    p_history = sub.add_parser("history", help="list the latest logged cell edits, newest first (JSON out)")
+    p_history.add_argument("--limit", type=int, default=200)
+    sub.add_parser("sync", help="push the local store's pending writes to Google Sheets and pull "
+                                "edits made on the sheet, once (JSON status out)")
+    p_bench = sub.add_parser("bench", help="time the pipeline on synthetic histories (JSON out)")
+    p_bench.add_argument("--sizes", type=int, nargs="+", default=list(BENCH_SIZES), metavar="ROWS")
+    p_bench.add_argument("--repeat", type=int, default=3, help="runs per stage; the best is kept")
+    p_bench.add_argument("--seed", type=int, default=0)
+    p_bench.add_argument("--no-memory", action="store_true", help="skip the traced peak-memory runs (much faster)")
+    p_bench.add_argument("--out", default=None, help="write the results here instead of stdout")
+    p_bench.add_argument("--baseline", default=None, help="earlier results to compare against")
+    p_bench.add_argument("--tolerance", type=float, default=0.25,
+                         help="allowed slowdown vs the baseline (default: 0.25 = 25%%)")
+    p_bench.add_argument("--fail-on-regression", action="store_true",
+                         help="exit with status 3 if any stage regressed")
+    args = parser.parse_args(argv)
+
+    if args.command == "bench":  # synthetic data only; never touches the configured store
+        results = run_bench(args.sizes, repeat=args.repeat, seed=args.seed, memory=not args.no_memory,
+                            log=lambda line: print(line, file=sys.stderr))
+        if args.baseline:
+            with open(args.baseline) as f:
+                results["regressions"] = compare_bench(results, json.load(f), args.tolerance)
+            for r in results["regressions"]:
+                print(f"REGRESSION {r['size']} rows {r['stage']}: {r['seconds']:.4f}s "
+                      f"vs {r['baseline']:.4f}s (x{r['ratio']})", file=sys.stderr)
+        if args.out:
+            with open(args.out, "w") as f:
+                json.dump(results, f, indent=2)
+        else:
+            json.dump(results, sys.stdout, indent=2)
+            print()
+        return 3 if results.get("regressions") and args.fail_on_regression else 0
+
+    def where_filters() -> dict:
+        filters = {}
+        for item in args.where:
+            dim, _, value = item.partition("=")
+            if dim not in DIMENSIONS:
+                parser.error(f"unknown dimension {dim!r}")
+            filters[dim] = value.strip()
+        return filters
+
+    def profile() -> dict:
+        book = ProfileStore().load()
+        name = book["default"] if args.profile is None else args.profile
+        if name and name not in book["profiles"]:
+            parser.error(f"unknown profile {name!r}")
+        return profile_config(book["profiles"].get(name))
+
+    def load() -> pd.DataFrame:
+        df = store.load()
+        return AuditLog().as_of(df, store.cache_key, day_end(args.as_of)) if args.as_of else df
+
+    store = cli_store(args.backend)
+    if args.command == "import":
+        try:
+            rows = bulk_import(CachedStore(store, ttl=0.0, audit=AuditLog()), args.path, chunksize=args.chunksize)
+        except (ValueError, WriteConflict) as e:
+            print(f"Import failed: {e}", file=sys.stderr)
+            return 1
+        print(f"Imported {rows} row(s) into {store.cache_key}")
+    elif args.command == "sync":
+        if args.backend == "sheets" or not has_sheets_config():
+            raise SystemExit("sync needs a local --backend and a configured Google Sheet.")
+        status = sheets_replicator(store, st.secrets["gsheets"], background=False).sync_once(force=True)
+        json.dump(status, sys.stdout, indent=2)
+        print()
+        return 1 if status["error"] else 0
+    elif args.command == "alerts":
+        thresholds = profile()["thresholds"]
+        for item in args.threshold:
+            key, _, value = item.partition("=")
+            if key not in thresholds:
+                parser.error(f"unknown threshold {key!r}")
+            thresholds[key] = float(value)
+        filters = where_filters()
+        df = load()
+        if filters:
+            df = FactIndex(df.sort_values("date", kind="stable").reset_index(drop=True)).select(filters)
+        sums = window_sums(df, args.window) if args.window else monthly_sums(df)
+        if args.since:
+            sums = sums[sums.index >= args.since]
+        if args.latest:
+            sums = sums.tail(1)
+        records = alert_records(evaluate_alerts(sums, thresholds), thresholds)
+        anomalies = Rollups.from_frame(df).anomalies().flags
+        if args.since:
+            anomalies = [a for a in anomalies if a["date"] >= args.since]
+        if args.latest:
+            anomalies = [a for a in anomalies if len(sums) and a["date"].startswith(sums.index[-1])]
+        json.dump({
+            "backend": store.cache_key,
+            "granularity": f"{args.window}d" if args.window else "month",
+            "periods_scored": len(sums),
+            "thresholds": thresholds,
+            "filters": filters,
+            "alerts": records,
+            "anomalies": anomalies,
+        }, sys.stdout, indent=2)
+        print()
+        if (records or anomalies) and args.fail_on_breach:
+            return 3
+    elif args.command == "export":
+        fmt = args.format or next((f for f, (suffix, _mime) in sorted(
+            EXPORT_FORMATS.items(), key=lambda item: -len(item[1][0])) if args.path.endswith(suffix)), None)
+        if fmt is None:
+            parser.error("cannot infer the format from the file name; pass --format")
+        index = FactIndex(load().sort_values("date", kind="stable").reset_index(drop=True))
+        rows = index.select(where_filters(), args.start, args.end)
+        try:
+            with open(args.path, "wb") as out:
+                write_export(rows, out, fmt, chunksize=args.chunksize)
+        except ValueError as e:
+            os.remove(args.path)
+            print(f"Export failed: {e}", file=sys.stderr)
+            return 1
+        print(f"Exported {len(rows)} row(s) to {args.path}")
+    elif args.command == "scenarios":
+        config = profile()
+        rows = [pd.read_csv(args.file)] if args.file else []
+        sweeps = {}
+        for item in args.sweep:
+            key, _, spec = item.partition("=")
+            if key not in SCENARIO_PARAMS:
+                parser.error(f"unknown scenario parameter {key!r}")
+            try:
+                start, stop, steps = spec.split(":")
+                sweeps[key] = np.linspace(float(start), float(stop), int(steps))
+            except ValueError:
+                parser.error(f"--sweep {item!r}: expected KEY=START:STOP:STEPS")
+        if sweeps:
+            rows.append(scenario_grid(config, sweeps))
+        filters = where_filters()
+        df = load()
+        if filters:
+            df = FactIndex(df.sort_values("date", kind="stable").reset_index(drop=True)).select(filters)
+        rollups = Rollups.from_frame(df)
+        snap = rollups.snapshot()
+        if snap is None:
+            print("No data to score scenarios against.", file=sys.stderr)
+            return 1
+        results = evaluate_scenarios(scenario_frame(config, pd.concat(rows, ignore_index=True) if rows else None),
+                                     snap, project(rollups, config["targets"], config["finance"]),
+                                     rollups.months_frame())
+        results["runway_date"] = results["runway_date"].dt.strftime("%Y-%m-%d").astype(object).where(
+            results["runway_date"].notna(), None)
+        json.dump({
+            "backend": store.cache_key,
+            "filters": filters,
+            "latest": snap.latest.isoformat(),
+            "months": len(rollups.monthly),
+            "scenarios": json.loads(results.to_json(orient="records")),
+        }, sys.stdout, indent=2, ensure_ascii=False)
+        print()
+    elif args.command == "serve":
+        ttl = CACHE_TTL_SECONDS if args.backend == "sheets" else 0.0  # a stat() per request is fine locally
+        server = ApiServer((args.host, args.port), KpiService(store, args.profile, ttl), args.workers, args.verbose)
+        print(f"Serving {store.cache_key} on http://{args.host}:{server.server_port}/", file=sys.stderr)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+    elif args.command == "history":
+        history = AuditLog().history(store.cache_key, args.limit)
+        json.dump(history.to_dict("records"), sys.stdout, indent=2, ensure_ascii=False)
+        print()
+    return 0
 
 if __name__ == "__main__":
-    main()
+    if st.runtime.exists():
+        main()
+    else:
+        sys.exit(cli())
 
@@ -0,0 +1,22 @@
+import os
+import sys
+from datetime import date
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import aydi_ops_guardrail as app  # noqa: E402
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    """Run in an empty directory: the default data, profile and audit paths are relative."""
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+
+@pytest.fixture
+def history():
+    """120 days of company-wide rows ending 2025-03-10."""
+    return app.conform(app.synthetic_history(120, end=date(2025, 3, 10)))
@@ -0,0 +1,50 @@
+import json
+
+import pytest
+
+import aydi_ops_guardrail as app
+
+
+def scalar_breaches(sums_row, thresholds):
+    """The alert rules applied to one period the way the KPI cards read them."""
+    k = app._period_kpis(sums_row, app.default_config()["finance"])
+    kpis = {"conv": k["conv"], "aov": k["aov"], "cac": k["cac"], "otd_rate": k["otd_rate"],
+            "returns_rate": k["returns_rate"], "orders": k["orders"], "otd_total": k["otd_total"]}
+    fired = set()
+    for rule, metric, key, direction, guard, _pct in app.ALERT_RULES:
+        hit = kpis[metric] < thresholds[key] if direction == "below" else kpis[metric] > thresholds[key]
+        if hit and (guard is None or kpis[guard] > 0):
+            fired.add(rule)
+    return fired
+
+
+def test_vectorized_rules_match_per_period_rules(history):
+    thresholds = {**app.default_config()["thresholds"], "min_aov": 27.5, "max_cac": 0.4}
+    sums = app.window_sums(history, 7)
+    scored = app.evaluate_alerts(sums, thresholds)
+    assert 0 < scored["breaches"].astype(bool).sum() < len(scored)
+    for period, row in sums.iterrows():
+        want = scalar_breaches(row.to_dict(), thresholds)
+        assert {r[0] for r in app.ALERT_RULES if scored.loc[period, r[0]]} == want
+        assert scored.loc[period, "breaches"] == len(want)
+    records = app.alert_records(scored, thresholds)
+    assert len(records) == scored["breaches"].sum()
+    assert records == sorted(records, key=lambda r: (r["period"], r["rule"]))
+
+
+def test_window_sums_match_a_rolling_sum(history):
+    got = app.window_sums(history.drop(index=[10, 11]), 7)  # gaps count as zero days
+    daily = app.daily_sums(history.drop(index=[10, 11]))
+    want = daily.rolling(7, min_periods=1).sum()
+    assert list(got.index) == list(daily.index.strftime("%Y-%m-%d"))
+    assert got.to_numpy() == pytest.approx(want.to_numpy())
+
+
+def test_cli_alerts_json_and_exit_status(workdir, history, capsys):
+    app.CSVStore(app.DATA_PATH).save(history)
+    assert app.cli(["alerts", "--threshold", "min_aov=1000000", "--fail-on-breach"]) == 3
+    out = json.loads(capsys.readouterr().out)
+    assert out["granularity"] == "month" and out["thresholds"]["min_aov"] == 1000000
+    assert {a["rule"] for a in out["alerts"]} >= {"low_aov"}
+    assert app.cli(["alerts", "--latest", "--window", "7"]) == 0
+    assert json.loads(capsys.readouterr().out)["periods_scored"] == 1
@@ -0,0 +1,94 @@
+from datetime import timedelta
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import aydi_ops_guardrail as app
+
+
+def series(history):
+    rollups = app.Rollups.from_frame(history)
+    days = sorted(rollups.days)
+    values = np.array([rollups.days[d] for d in days])[:, app.Rollups._anomaly_cols()]
+    return days, values
+
+
+def streamed(days, values):
+    det = app.AnomalyDetector()
+    for d, x in zip(days, values):
+        det.push(d, x)
+    return det
+
+
+def test_streaming_matches_vectorized(history):
+    days, values = series(history)
+    values[90, 1] *= 6  # an orders spike well past the warm-up
+    batch, stream = app.AnomalyDetector.from_days(days, values), streamed(days, values)
+    assert stream.flags == batch.flags
+    np.testing.assert_allclose(stream.mean, batch.mean)
+    np.testing.assert_allclose(stream.sq, batch.sq)
+    assert (stream.n, stream.last) == (batch.n, batch.last)
+
+
+def test_spike_and_drop_are_flagged(history):
+    days, values = series(history)
+    values[80, 1] *= 8   # orders spike
+    values[100, 0] = 0   # sessions drop
+    det = app.AnomalyDetector.from_days(days, values)
+    found = {(f["date"], f["metric"], f["direction"]) for f in det.flags}
+    assert (days[80].isoformat(), "orders", "spike") in found
+    assert (days[100].isoformat(), "sessions", "drop") in found
+
+
+def test_warmup_suppresses_early_flags(history):
+    days, values = series(history)
+    values[app.ANOMALY_WARMUP - 1, 0] *= 50
+    det = app.AnomalyDetector.from_days(days, values)
+    assert all(f["date"] >= days[app.ANOMALY_WARMUP].isoformat() for f in det.flags)
+
+
+def test_push_rescores_the_latest_day(history):
+    days, values = series(history)
+    det = streamed(days, values)
+    spike = values[-1].copy()
+    spike[1] *= 10
+    det.push(days[-1], spike)
+    assert any(f["date"] == days[-1].isoformat() and f["metric"] == "orders" for f in det.flags)
+    det.push(days[-1], values[-1])  # the day's rows were corrected
+    assert det.flags == app.AnomalyDetector.from_days(days, values).flags
+    with pytest.raises(ValueError):
+        det.push(days[-2], values[-2])
+
+
+def test_recent_lists_newest_first(history):
+    days, values = series(history)
+    values[-2, 0] *= 8
+    values[-20, 0] *= 8
+    det = app.AnomalyDetector.from_days(days, values)
+    recent = det.recent()
+    assert [f["date"] for f in recent] == sorted((f["date"] for f in recent), reverse=True)
+    since = (days[-1] - timedelta(days=app.ANOMALY_RECENT_DAYS - 1)).isoformat()
+    assert recent and all(f["date"] >= since for f in recent)
+    assert days[-20].isoformat() not in {f["date"] for f in recent}
+    assert app.AnomalyDetector().recent() == []
+
+
+def test_rollups_update_the_detector_incrementally(history):
+    rollups = app.Rollups.from_frame(history)
+    det = rollups.anomalies()
+    last = max(rollups.days)
+    rows = app._rows_frame([{"date": last + timedelta(days=1), "orders": 50000}])
+    rollups.apply(rows)
+    assert rollups.anomalies() is det  # pushed, not rescored
+    combined = app.conform(pd.concat([history, rows], ignore_index=True))
+    assert det.flags == app.Rollups.from_frame(combined).anomalies().flags
+    assert det.recent()[0]["date"] == (last + timedelta(days=1)).isoformat()
+
+
+def test_past_edit_forces_a_rescore(history):
+    rollups = app.Rollups.from_frame(history)
+    det = rollups.anomalies()
+    first = min(rollups.days)
+    rollups.apply(app._rows_frame([{"date": first + timedelta(days=30), "orders": 50000}]))
+    assert rollups.anomalies() is not det
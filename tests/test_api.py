@@ -0,0 +1,72 @@
+import http.client
+import socket
+import threading
+from datetime import date
+
+import pytest
+
+import aydi_ops_guardrail as app
+
+
+@pytest.fixture
+def server(workdir, history):
+    store = app.CSVStore(str(workdir / "daily_metrics.csv"))
+    store.save(history)
+    srv = app.ApiServer(("127.0.0.1", 0), app.KpiService(store), workers=2)
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    yield srv
+    srv.shutdown()
+    srv.server_close()
+
+
+def get(server, path, headers=None, conn=None):
+    conn = conn or http.client.HTTPConnection(*server.server_address, timeout=5)
+    conn.request("GET", path, headers=headers or {})
+    response = conn.getresponse()
+    return response, response.read()
+
+
+def test_status_codes(server):
+    assert get(server, "/")[0].status == 200
+    assert get(server, "/kpis?period=mtd")[0].status == 200
+    assert get(server, "/nope")[0].status == 404
+    assert get(server, "/kpis?period=decade")[0].status == 400
+    assert get(server, "/kpis?by=planet")[0].status == 400
+
+
+def test_etag_revalidation(server):
+    first, body = get(server, "/summary")
+    etag = first.getheader("ETag")
+    assert etag and body
+    again, body = get(server, "/summary", {"If-None-Match": etag})
+    assert again.status == 304 and body == b""
+    server.service.store.upsert(app._rows_frame([{"date": date(2025, 3, 11), "orders": 5}]))
+    changed, _body = get(server, "/summary", {"If-None-Match": etag})
+    assert changed.status == 200 and changed.getheader("ETag") != etag
+
+
+def test_idle_connections_do_not_hold_workers(server):
+    kept = []
+    for _ in range(4):  # twice the pool: kept-alive pollers between requests
+        conn = http.client.HTTPConnection(*server.server_address, timeout=5)
+        assert get(server, "/health", conn=conn)[0].status == 200
+        kept.append(conn)
+    silent = [socket.create_connection(server.server_address) for _ in range(4)]  # never send a byte
+    try:
+        response, _body = get(server, "/health")
+        assert response.status == 200
+        assert get(server, "/health", conn=kept[0])[0].status == 200  # and the kept connections still work
+    finally:
+        for conn in kept:
+            conn.close()
+        for sock in silent:
+            sock.close()
+
+
+def test_idle_connections_are_closed(server, monkeypatch):
+    monkeypatch.setattr(app, "API_IDLE_SECONDS", 0.2)
+    sock = socket.create_connection(server.server_address, timeout=5)
+    try:
+        assert sock.recv(1) == b""  # closed by the server, not by our timeout
+    finally:
+        sock.close()
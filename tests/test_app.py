@@ -0,0 +1,47 @@
+import os
+
+import pandas as pd
+import pytest
+
+import aydi_ops_guardrail as app
+
+AppTest = pytest.importorskip("streamlit.testing.v1").AppTest
+SCRIPT = os.path.abspath(app.__file__)
+
+
+@pytest.fixture
+def at(workdir, history):
+    app.CSVStore(app.DATA_PATH).save(history)
+    at = AppTest.from_file(SCRIPT, default_timeout=60)
+    at.run()
+    assert not at.exception
+    return at
+
+
+def open_tab(at, label):
+    at.session_state["page_tab_EN"] = label
+    at.run()
+    assert not at.exception, [e.value for e in at.exception]
+
+
+def entry_inputs(at):
+    return [n for n in at.number_input if n.label.startswith("Sessions")]
+
+
+def test_only_the_open_tab_runs(at):
+    assert at.metric and not entry_inputs(at)  # overview cards, no entry form
+    open_tab(at, "Data entry")
+    assert entry_inputs(at) and not at.metric
+    for label in ("Charts", "Scenarios", "Export", "Overview"):
+        open_tab(at, label)
+    assert at.metric
+
+
+def test_entry_form_saves_a_row(at):
+    open_tab(at, "Data entry")
+    entry_inputs(at)[0].set_value(4321)
+    next(b for b in at.button if b.label == "Save / Update").click()
+    open_tab(at, "Data entry")
+    assert [s.value for s in at.success if s.value == "Saved."]
+    df = app.CSVStore(app.DATA_PATH).load()
+    assert (df["sessions"] == 4321).sum() == 1 and df["date"].max() == pd.Timestamp.today().normalize()
@@ -0,0 +1,52 @@
+from datetime import date
+
+import pandas as pd
+
+import aydi_ops_guardrail as app
+
+
+def norm(df):
+    df = app.conform(df).astype({d: str for d in app.DIMENSIONS})
+    return df.sort_values(app.KEY_COLUMNS).reset_index(drop=True)[app.COLUMNS]
+
+
+def audited(workdir, history):
+    store = app.CSVStore(str(workdir / "daily_metrics.csv"))
+    store.save(history)
+    return app.CachedStore(store, ttl=0.0, audit=app.AuditLog(str(workdir / "audit.jsonl")))
+
+
+def test_as_of_reconstructs_every_checkpoint(workdir, history, monkeypatch):
+    cached = audited(workdir, history)
+    clock = iter(range(1_000, 2_000, 10))
+    monkeypatch.setattr(app.time, "time", lambda: float(next(clock)))
+    edits = [
+        history.tail(2).assign(orders=1),
+        app._rows_frame([{"date": date(2025, 3, 11), "vendor": "v1", "orders": 5}]),
+        app._rows_frame([{"date": date(2025, 3, 11), "vendor": "v1", "orders": 6, "returns": 1}]),
+    ]
+    checkpoints = []
+    for rows in edits:
+        checkpoints.append((app.time.time(), cached.load()))
+        cached.upsert(rows)
+    checkpoints.append((app.time.time(), cached.load()))
+    for when, expected in checkpoints:
+        pd.testing.assert_frame_equal(norm(cached.as_of(when).load()), norm(expected))
+
+
+def test_as_of_keys_on_full_precision_time(workdir, history):
+    cached = audited(workdir, history)
+    cached.audit.record(cached.store.cache_key, "a", [{"k": ["2025-03-10", "", "", ""], "c": {"orders": [1, 2]}}],
+                        ts=1_000.3)
+    before, after = cached.as_of(1_000.2), cached.as_of(1_000.4)
+    assert before.store.cache_key != after.store.cache_key
+    day = pd.Timestamp(2025, 3, 10)
+    assert before.load().set_index("date").loc[day, "orders"] == 1
+    assert after.load().set_index("date").loc[day, "orders"] == cached.load().set_index("date").loc[day, "orders"]
+
+
+def test_history_lists_changed_cells(workdir, history):
+    cached = audited(workdir, history)
+    cached.upsert(history.tail(1).assign(orders=4242))
+    log = cached.audit.history(cached.store.cache_key)
+    assert list(log["column"]) == ["orders"] and log["new"].iloc[0] == 4242
@@ -0,0 +1,41 @@
+import aydi_ops_guardrail as app
+
+
+def test_synthetic_history_is_deterministic():
+    a, b = app.synthetic_history(30, entities=3, seed=7), app.synthetic_history(30, entities=3, seed=7)
+    assert a.equals(b) and len(a) == 90
+    assert app.synthetic_history(30, seed=8)["orders"].tolist() != app.synthetic_history(30, seed=7)["orders"].tolist()
+    days, entities = app.bench_shape(10_000)
+    assert days * entities >= 10_000 * 0.9
+
+
+def test_run_bench_times_every_stage():
+    results = app.run_bench([300], repeat=1, memory=False)
+    stages = results["results"]["300"]["stages"]
+    assert {"csv_save", "rollups", "kpi_cards", "risk_alerts", "scenarios_1000", "charts"} <= set(stages)
+    assert all(s["seconds"] >= 0 and s["peak_mb"] is None for s in stages.values())
+
+
+def test_section_stages_run_cold(tmp_path, monkeypatch):
+    memo_sizes = []
+
+    def spy(section):
+        def run(snap, config, lang, *args):
+            memo_sizes.append(len(snap._memo))
+            return section(snap, config, lang, *args)
+        return run
+
+    monkeypatch.setattr(app, "kpi_cards", spy(app.kpi_cards))
+    monkeypatch.setattr(app, "risk_alerts", spy(app.risk_alerts))
+    stages = dict(app._bench_stages(app.conform(app.synthetic_history(60)), str(tmp_path)))
+    for _ in range(3):
+        stages["kpi_cards"]()
+        stages["risk_alerts"]()
+    assert memo_sizes == [0] * 6
+
+
+def test_compare_bench_flags_slowdowns():
+    def result(**stages):
+        return {"results": {"1000": {"stages": {k: {"seconds": v} for k, v in stages.items()}}}}
+    regressions = app.compare_bench(result(a=0.2, b=0.011, c=0.1), result(a=0.1, b=0.01, c=0.1))
+    assert [r["stage"] for r in regressions] == ["a"] and regressions[0]["ratio"] == 2.0
@@ -0,0 +1,61 @@
+from datetime import date
+
+import pandas as pd
+
+import aydi_ops_guardrail as app
+
+
+class CountingStore:
+    """Store wrapper counting backend loads."""
+    def __init__(self, store):
+        self.store = store
+        self.loads = 0
+
+    def __getattr__(self, name):
+        return getattr(self.store, name)
+
+    def load(self):
+        self.loads += 1
+        return self.store.load()
+
+
+def cached_csv(workdir, history, ttl):
+    backend = CountingStore(app.CSVStore(str(workdir / "daily_metrics.csv")))
+    backend.store.save(history)
+    return backend, app.CachedStore(backend, ttl=ttl)
+
+
+def test_loads_once_until_the_version_moves(workdir, history):
+    backend, cached = cached_csv(workdir, history, ttl=0.0)
+    first = cached.load()
+    for _ in range(3):
+        pd.testing.assert_frame_equal(cached.load(), first)
+    assert backend.loads == 1
+    backend.store.upsert([{"date": date(2025, 3, 11), "orders": 1}])  # another writer
+    assert len(cached.load()) == len(first) + 1 and backend.loads == 2
+
+
+def test_ttl_skips_the_version_check(workdir, history):
+    backend, cached = cached_csv(workdir, history, ttl=float("inf"))
+    cached.load()
+    backend.store.upsert([{"date": date(2025, 3, 11), "orders": 1}])
+    assert len(cached.load()) == len(history) and backend.loads == 1
+
+
+def test_writes_invalidate_and_read_through(workdir, history):
+    backend, cached = cached_csv(workdir, history, ttl=float("inf"))
+    cached.load()
+    cached.upsert([{"date": date(2025, 3, 11), "orders": 1}])
+    assert len(cached.load()) == len(history) + 1
+    cached.save(history.head(5))
+    assert len(cached.load()) == 5 and backend.loads == 3
+
+
+def test_memo_is_per_data_version(workdir, history):
+    _backend, cached = cached_csv(workdir, history, ttl=0.0)
+    calls = []
+    for _ in range(2):
+        cached.memo("k", lambda: calls.append(1))
+    cached.upsert([{"date": date(2025, 3, 11), "orders": 1}])
+    cached.memo("k", lambda: calls.append(1))
+    assert len(calls) == 2
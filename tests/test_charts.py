@@ -0,0 +1,36 @@
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+import aydi_ops_guardrail as app
+
+
+def test_lttb_keeps_ends_and_spikes():
+    rng = np.random.default_rng(1)
+    y = rng.normal(0, 1, 5000)
+    y[1234], y[4321] = 50.0, -50.0
+    idx = app.lttb_indices(y, 100)
+    assert len(idx) == 100 and idx[0] == 0 and idx[-1] == 4999
+    assert (np.diff(idx) > 0).all()
+    assert {1234, 4321} <= set(idx)
+    assert (app.lttb_indices(y[:50], 100) == np.arange(50)).all()
+
+
+def test_downsample_keeps_every_columns_extremes():
+    days = pd.date_range("2020-01-01", periods=3000)
+    frame = pd.DataFrame({"a": np.sin(np.arange(3000) / 50), "b": np.zeros(3000)}, index=days)
+    frame.iloc[2000, 1] = 9.0
+    out = app.downsample(frame, 200)
+    assert len(out) <= 200 and out["b"].max() == 9.0
+    assert out.index[0] == days[0] and out.index[-1] == days[-1]
+    assert len(app.downsample(frame.head(100), 200)) == 100
+
+
+def test_chart_frame_buckets_and_clips(history):
+    daily = app.daily_sums(history)
+    monthly = app.chart_frame(daily[["orders"]], "month", start=date(2024, 12, 1), end=date(2025, 2, 28))
+    want = daily.loc["2024-12-01":"2025-02-28", ["orders"]].resample("MS").sum()
+    pd.testing.assert_frame_equal(monthly, want)
+    weekly_last = app.chart_frame(daily[["orders"]], "week", how="last")
+    assert weekly_last["orders"].iloc[-1] == daily["orders"].iloc[-1]
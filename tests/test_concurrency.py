@@ -0,0 +1,94 @@
+import os
+import subprocess
+import sys
+import textwrap
+import threading
+import time
+from datetime import date, timedelta
+
+import pytest
+
+import aydi_ops_guardrail as app
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+WRITER = textwrap.dedent("""
+    import sys
+    from datetime import date, timedelta
+    sys.path.insert(0, {root!r})
+    import aydi_ops_guardrail as app
+    worker, saves, kind, path = int(sys.argv[1]), int(sys.argv[2]), sys.argv[3], sys.argv[4]
+    if kind == "profiles":
+        store = app.ProfileStore(path)
+        for i in range(saves):
+            store.save(f"w{{worker}}-{{i}}", app.default_config())
+    else:
+        store = app.CSVStore(path) if kind == "csv" else app.ParquetStore(path)
+        for i in range(saves):
+            day = date(2024, 1, 1) + timedelta(days=worker * saves + i)
+            store.upsert([{{"date": day, "orders": worker * 100 + i}}])
+""")
+
+
+def run_writers(kind: str, path: str, workers: int = 6, saves: int = 10) -> None:
+    script = WRITER.format(root=ROOT)
+    procs = [subprocess.Popen([sys.executable, "-c", script, str(w), str(saves), kind, path])
+             for w in range(workers)]
+    assert [p.wait(timeout=120) for p in procs] == [0] * workers
+
+
+@pytest.mark.parametrize("kind", ["csv", "parquet"])
+def test_concurrent_upserts_across_processes(workdir, kind):
+    path = str(workdir / ("daily_metrics.csv" if kind == "csv" else "daily_metrics_parquet"))
+    store = app.CSVStore(path) if kind == "csv" else app.ParquetStore(path)
+    run_writers(kind, path)
+    df = store.load()
+    assert len(df) == 60
+    assert sorted(df["orders"]) == sorted(w * 100 + i for w in range(6) for i in range(10))
+
+
+def test_concurrent_profile_saves_across_processes(workdir):
+    path = str(workdir / "config_profiles.json")
+    run_writers("profiles", path, saves=5)
+    assert len(app.ProfileStore(path).load()["profiles"]) == 30
+
+
+def test_write_queue_coalesces_concurrent_saves():
+    queue, commits, written = app.WriteQueue(), [], []
+
+    def commit(frame, parts):
+        commits.append([meta for _rows, meta in parts])
+        time.sleep(0.05)  # a slow backend: later submits pile up behind this write
+        written.extend(frame["date"].dt.date)
+
+    def save(i):
+        queue.submit(app._rows_frame([{"date": date(2025, 1, 1) + timedelta(days=i), "orders": i}]), commit, i)
+
+    threads = [threading.Thread(target=save, args=(i,)) for i in range(12)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join(timeout=10)
+    assert sorted(written) == [date(2025, 1, 1) + timedelta(days=i) for i in range(12)]
+    assert len(commits) < 12 and sorted(m for c in commits for m in c) == list(range(12))
+
+
+def test_write_queue_reports_a_failed_write_to_every_rider():
+    queue, errors, gate = app.WriteQueue(), [], threading.Event()
+
+    def commit(frame, parts):
+        gate.wait(5)
+        raise OSError("disk full")
+
+    def save():
+        try:
+            queue.submit(app._rows_frame([{"date": "2025-01-01", "orders": 1}]), commit)
+        except OSError as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=save) for _ in range(4)]
+    for t in threads:
+        t.start()
+    gate.set()
+    for t in threads:
+        t.join(timeout=10)
+    assert len(errors) == 4
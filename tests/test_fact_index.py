@@ -0,0 +1,45 @@
+from datetime import date
+
+import pandas as pd
+import pytest
+
+import aydi_ops_guardrail as app
+
+
+@pytest.fixture
+def facts():
+    df = app.conform(app.synthetic_history(200, entities=4, end=date(2025, 6, 30)))
+    return df.sort_values("date", kind="stable").reset_index(drop=True)
+
+
+@pytest.mark.parametrize("filters, start, end", [
+    (None, None, None),
+    ({"vendor": "V00002"}, None, None),
+    ({"city": "Muscat", "channel": "web"}, date(2025, 3, 1), date(2025, 3, 31)),
+    ({"channel": "app"}, date(2025, 6, 1), None),
+    ({"vendor": "V00001", "city": "Muscat"}, None, None),  # no such combination
+    ({"vendor": "nobody"}, None, date(2025, 1, 1)),
+])
+def test_select_matches_boolean_masks(facts, filters, start, end):
+    mask = pd.Series(True, index=facts.index)
+    for dim, value in (filters or {}).items():
+        mask &= facts[dim].astype(str) == value
+    if start is not None:
+        mask &= facts["date"] >= pd.Timestamp(start)
+    if end is not None:
+        mask &= facts["date"] <= pd.Timestamp(end)
+    pd.testing.assert_frame_equal(app.FactIndex(facts).select(filters, start, end), facts[mask])
+
+
+def test_values_and_lookup(facts):
+    index = app.FactIndex(facts)
+    assert index.values("city") == sorted(facts["city"].astype(str).unique())
+    probe = app._rows_frame([{"date": date(2025, 6, 30), "vendor": "V00003", "city": "Nizwa", "channel": "web"},
+                             {"date": date(2030, 1, 1), "vendor": "V00003"}])
+    found = index.lookup(probe)
+    assert len(found) == 1 and found["vendor"].iloc[0] == "V00003"
+
+
+def test_empty_index():
+    index = app.FactIndex(app.conform(pd.DataFrame(columns=app.COLUMNS)))
+    assert index.select({"vendor": "x"}).empty and index.values("vendor") == []
@@ -0,0 +1,53 @@
+import io
+
+import pandas as pd
+import pytest
+
+import aydi_ops_guardrail as app
+
+
+def csv_bytes(df):
+    return io.BytesIO(df.to_csv(index=False).encode())
+
+
+def test_bulk_import_merges_and_counts_distinct_rows(workdir, history):
+    store = app.CSVStore(str(workdir / "daily_metrics.csv"))
+    store.save(history.head(10))
+    upload = pd.concat([history.iloc[5:20].assign(orders=1), history.iloc[[19]].assign(orders=2)])
+    rows = app.bulk_import(store, csv_bytes(upload), name="history.csv", chunksize=4)
+    assert rows == 15
+    df = store.load().set_index("date")
+    assert len(df) == 20
+    assert (df["orders"].iloc[5:19] == 1).all() and df["orders"].iloc[19] == 2  # last row per key wins
+    assert (df["orders"].iloc[:5] == history["orders"].iloc[:5].to_numpy()).all()
+
+
+def test_bulk_import_reads_xlsx(workdir, history):
+    pytest.importorskip("openpyxl")
+    buf = io.BytesIO()
+    history.head(3).assign(date=history["date"].head(3).dt.strftime("%Y-%m-%d")).to_excel(buf, index=False)
+    buf.seek(0)
+    store = app.CSVStore(str(workdir / "daily_metrics.csv"))
+    assert app.bulk_import(store, buf, name="days.xlsx") == 3
+    assert len(store.load()) == 3
+
+
+@pytest.mark.parametrize("edit, message", [
+    (lambda df: df.drop(columns=["orders"]), "Missing columns: orders"),
+    (lambda df: df.assign(date="not a date"), "invalid date"),
+    (lambda df: df.assign(orders="many"), "Non-numeric values in: orders"),
+    (lambda df: df.assign(returns=-1), "Negative values in: returns"),
+])
+def test_bulk_import_rejects_bad_files_without_writing(workdir, history, edit, message):
+    store = app.CSVStore(str(workdir / "daily_metrics.csv"))
+    with pytest.raises(ValueError, match=message):
+        app.bulk_import(store, csv_bytes(edit(history.head(3))), name="bad.csv")
+    assert store.load().empty
+
+
+def test_cli_import_reports_rows(workdir, history, capsys):
+    history.head(6).to_csv(workdir / "upload.csv", index=False)
+    assert app.cli(["import", str(workdir / "upload.csv")]) == 0
+    assert "Imported 6 row(s)" in capsys.readouterr().out
+    assert len(app.CSVStore(app.DATA_PATH).load()) == 6
+    assert app.AuditLog().history(app.CSVStore(app.DATA_PATH).cache_key).shape[0] > 0
@@ -0,0 +1,56 @@
+from datetime import date
+
+import pandas as pd
+import pytest
+
+import aydi_ops_guardrail as app
+
+
+@pytest.fixture
+def multi():
+    return app.conform(app.synthetic_history(400, entities=3, end=date(2026, 2, 28)))
+
+
+def naive_sums(df, start, end):
+    dates = pd.to_datetime(df["date"])
+    rows = df[(dates >= pd.Timestamp(start)) & (dates <= pd.Timestamp(end))]
+    return {col: float(rows[col].sum()) for col in app.ADDITIVE_COLUMNS}
+
+
+def test_snapshot_matches_masked_sums(multi):
+    snap = app.build_snapshot(multi)
+    latest = snap.latest
+    assert latest == date(2026, 2, 28)
+    assert snap.today == pytest.approx(naive_sums(multi, latest, latest))
+    assert snap.mtd == pytest.approx(naive_sums(multi, latest.replace(day=1), latest))
+    assert snap.ytd == pytest.approx(naive_sums(multi, date(latest.year, 1, 1), latest))
+    assert app.build_snapshot(multi.iloc[:0]) is None
+
+
+def test_grouped_kpis_match_per_group_kpis(multi):
+    finance = app.default_config()["finance"]
+    grouped = app._agg_period(multi, finance, by=["vendor"])
+    for vendor, rows in multi.groupby("vendor", observed=True):
+        want = app._agg_period(rows, finance)
+        got = grouped.loc[vendor]
+        assert got["commission_rev"] == pytest.approx(want["commission_rev"])
+        assert got["delivery_rev"] == pytest.approx(want["delivery_rev"])
+        for kpi in ("aov", "conv", "cac", "returns_rate", "otd_rate"):
+            assert got[kpi] == pytest.approx(want[kpi]), kpi
+
+
+def test_kpis_guard_empty_denominators():
+    sums = dict.fromkeys(app.ADDITIVE_COLUMNS, 0.0)
+    kpis = app._period_kpis(sums, app.default_config()["finance"])
+    assert kpis["aov"] == kpis["conv"] == kpis["cac"] == kpis["otd_rate"] == 0.0
+    frame = app.kpi_frame(pd.DataFrame([sums]))
+    assert frame[["aov", "conv", "cac", "otd_rate", "returns_rate"]].eq(0).all(axis=None)
+
+
+def test_rolling_kpis_match_pandas_rolling(multi):
+    got = app.rolling_kpis(multi, (7, 28))
+    daily = app.daily_sums(multi)
+    for w in (7, 28):
+        want = app.kpi_frame(daily.rolling(w, min_periods=1).sum())[app.ROLLING_KPIS]
+        assert got[[f"{k}_{w}d" for k in app.ROLLING_KPIS]].to_numpy() == pytest.approx(want.to_numpy())
+    assert got.index.equals(daily.index)
@@ -0,0 +1,86 @@
+import json
+import os
+
+import pytest
+
+import aydi_ops_guardrail as app
+
+
+def tuned(**finance):
+    config = app.default_config()
+    config["finance"].update(finance)
+    return config
+
+
+def test_save_and_load_round_trip(workdir):
+    profiles = app.ProfileStore()
+    assert profiles.load() == {"default": "", "profiles": {}}
+    stored = profiles.save("lean", tuned(commission_rate=0.2), user="ops")
+    book = profiles.load()
+    assert book["profiles"]["lean"] == stored
+    assert stored["finance"]["commission_rate"] == 0.2 and stored["by"] == "ops"
+    assert set(stored) == {*app.CONFIG_PARTS, "updated", "by"}
+    assert app.ProfileStore(os.path.abspath(app.PROFILES_PATH)).load() == book
+
+
+def test_default_follows_the_latest_save(workdir):
+    profiles = app.ProfileStore()
+    profiles.save("a", tuned(), make_default=True)
+    profiles.save("b", tuned())
+    assert profiles.load()["default"] == "a"
+    profiles.save("b", tuned(), make_default=True)
+    assert profiles.load()["default"] == "b"
+    profiles.save("b", tuned())  # re-saved without the flag: no longer the default
+    book = profiles.load()
+    assert book["default"] == "" and set(book["profiles"]) == {"a", "b"}
+
+
+def test_load_rereads_after_another_writer(workdir):
+    profiles = app.ProfileStore()
+    profiles.save("a", tuned())
+    assert "a" in profiles.load()["profiles"]
+    with open(app.PROFILES_PATH, "w", encoding="utf-8") as f:
+        json.dump({"default": "x", "profiles": {"x": {}}}, f)
+    os.utime(app.PROFILES_PATH, ns=(1, 1))
+    assert profiles.load() == {"default": "x", "profiles": {"x": {}}}
+
+
+def test_profile_config_lays_values_over_the_defaults():
+    config = app.profile_config({"finance": {"delivery_fee": "2.5", "bogus": 1},
+                                 "targets": {"annual_units": 1234.0}, "thresholds": None})
+    defaults = app.default_config()
+    assert config["finance"]["delivery_fee"] == 2.5
+    assert "bogus" not in config["finance"]
+    assert config["targets"]["annual_units"] == 1234 and isinstance(config["targets"]["annual_units"], int)
+    assert config["thresholds"] == defaults["thresholds"]
+    assert app.profile_config(None) == defaults
+
+
+def cli_commission(args, capsys):
+    assert app.cli([*args, "scenarios"]) == 0
+    return json.loads(capsys.readouterr().out)["scenarios"][0]["commission_rate"]
+
+
+def test_cli_uses_the_default_or_named_profile(workdir, history, capsys):
+    app.CSVStore(app.DATA_PATH).save(history)
+    builtin = app.default_config()["finance"]["commission_rate"]
+    assert cli_commission([], capsys) == builtin
+    profiles = app.ProfileStore()
+    profiles.save("high", tuned(commission_rate=0.3), make_default=True)
+    profiles.save("low", tuned(commission_rate=0.01))
+    assert cli_commission([], capsys) == 0.3
+    assert cli_commission(["--profile", "low"], capsys) == 0.01
+    assert cli_commission(["--profile", ""], capsys) == builtin
+    with pytest.raises(SystemExit):
+        app.cli(["--profile", "missing", "scenarios"])
+
+
+def test_sidebar_starts_on_the_default_profile(workdir, history):
+    AppTest = pytest.importorskip("streamlit.testing.v1").AppTest
+    app.CSVStore(app.DATA_PATH).save(history)
+    app.ProfileStore().save("lean", tuned(delivery_fee=4.25), make_default=True)
+    at = AppTest.from_file(os.path.abspath(app.__file__), default_timeout=60)
+    at.run()
+    assert not at.exception
+    assert at.sidebar.selectbox(key="profile").value == "lean"
+    assert at.sidebar.number_input(key="cfg_delivery_fee").value == 4.25
@@ -0,0 +1,42 @@
+from datetime import date
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import aydi_ops_guardrail as app
+
+LATEST = date(2025, 3, 10)
+
+
+def flat_history(days):
+    """Identical company-wide days (10 orders, 5 spend) on the given dates."""
+    return app.conform(pd.DataFrame({"date": pd.to_datetime(days), "orders": 10, "marketing_spend": 5.0}))
+
+
+def test_short_history_keeps_its_run_rate():
+    df = flat_history(pd.date_range(end=LATEST, periods=7))
+    projection = app.project(app.Rollups.from_frame(df), app.default_config()["targets"],
+                             app.default_config()["finance"])
+    assert projection.model == "run_rate"
+    assert projection.daily["orders"] == pytest.approx(10.0)
+    rest_of_year = (date(2025, 12, 31) - LATEST).days
+    assert projection.landing["orders"] == pytest.approx(70 + 10 * rest_of_year)
+
+
+def test_gaps_are_missing_data_not_zero_days():
+    every_other = pd.date_range(end=LATEST, periods=28)[::-2]
+    projection = app.project(app.Rollups.from_frame(flat_history(every_other)), {}, app.default_config()["finance"])
+    assert projection.daily["orders"] == pytest.approx(10.0)
+    assert projection.daily["marketing_spend"] == pytest.approx(5.0)
+
+
+def test_uneven_weekdays_do_not_skew_weekday_factors():
+    rollups = app.Rollups.from_frame(flat_history(pd.date_range(end=LATEST, periods=10)))
+    cols = [app.ADDITIVE_COLUMNS.index("orders")]
+    _months, weekdays = app._seasonal_factors(rollups, LATEST, cols)
+    np.testing.assert_allclose(weekdays, 1.0)
+
+
+def test_no_data_no_projection():
+    assert app.project(app.Rollups(), {}, app.default_config()["finance"]) is None
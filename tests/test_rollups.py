@@ -0,0 +1,70 @@
+from datetime import date
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import aydi_ops_guardrail as app
+
+
+def assert_same_rollups(got, want):
+    assert got.latest == want.latest
+    for name in ("days", "monthly", "yearly"):
+        a, b = getattr(got, name), getattr(want, name)
+        assert set(a) == set(b), name
+        for key in a:
+            np.testing.assert_allclose(a[key], b[key], rtol=1e-9, atol=1e-6, err_msg=f"{name}[{key}]")
+
+
+class WriteSpy:
+    """Store wrapper recording whether the process-wide rollup lock was held during a write."""
+    def __init__(self, store):
+        self.store = store
+        self.locked = []
+
+    def __getattr__(self, name):
+        return getattr(self.store, name)
+
+    def upsert(self, rows):
+        self.locked.append(app._rollup_registry()["lock"].locked())
+        self.store.upsert(rows)
+
+
+def test_incremental_rollups_match_full_rebuild(workdir, history):
+    spy = WriteSpy(app.CSVStore(str(workdir / "daily_metrics.csv")))
+    spy.store.save(history)
+    cached = app.CachedStore(spy, ttl=0.0)
+    rollups = cached.rollups()
+    edits = [
+        history.tail(2).assign(orders=999, marketing_spend=1.5),              # overwrite existing days
+        app._rows_frame([{"date": date(2025, 3, 11), "orders": 4, "gmv_products": 80.0}]),  # a new day
+        app._rows_frame([{"date": date(2025, 1, 5), "vendor": "v1", "orders": 3}]),          # a new slice row
+        app._rows_frame([{"date": date(2025, 4, 1), "orders": 1}]),          # a new month
+    ]
+    for rows in edits:
+        cached.upsert(rows)
+        assert cached.rollups() is rollups  # rolled forward, not rebuilt
+    assert spy.locked == [False] * len(edits)
+    assert_same_rollups(rollups, app.Rollups.from_frame(spy.store.load()))
+    got, want = rollups.snapshot(), app.build_snapshot(spy.store.load())
+    assert got.latest == want.latest
+    for period in ("today", "mtd", "ytd"):
+        assert getattr(got, period) == pytest.approx(getattr(want, period))
+
+
+def test_foreign_write_forces_rebuild(workdir, history):
+    store = app.CSVStore(str(workdir / "daily_metrics.csv"))
+    store.save(history)
+    cached = app.CachedStore(store, ttl=0.0)
+    stale = cached.rollups()
+    store.upsert([{"date": date(2025, 3, 10), "orders": 12345}])  # behind the cache's back
+    cached.load()  # the next rerun re-checks the version
+    fresh = cached.rollups()
+    assert fresh is not stale
+    assert_same_rollups(fresh, app.Rollups.from_frame(store.load()))
+
+
+def test_months_frame_matches_monthly_sums(history):
+    rollups = app.Rollups.from_frame(history)
+    pd.testing.assert_frame_equal(rollups.months_frame(), app.monthly_sums(history)[app.ADDITIVE_COLUMNS],
+                                  check_dtype=False, check_names=False)
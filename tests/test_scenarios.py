@@ -0,0 +1,86 @@
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import aydi_ops_guardrail as app
+
+
+def scenario_config(base, row):
+    """`base` with one scenario row's parameters written into the config parts they override."""
+    config = {part: dict(values) if isinstance(values, dict) else values for part, values in base.items()}
+    for key, part in app.SCENARIO_PARAMS.items():
+        config[part][key] = float(row[key])
+    return config
+
+
+def test_vectorized_scenarios_match_the_scalar_cards(history):
+    config = app.default_config()
+    rollups = app.Rollups.from_frame(history)
+    snap, months = rollups.snapshot(), rollups.months_frame()
+    frame = app.scenario_grid(config, {"commission_rate": [0.05, 0.12], "marketing_budget": [0, 2000, 60000],
+                                       "min_aov": [20.0, 40.0], "working_capital": [500, 50000, 1e9]})
+    results = app.evaluate_scenarios(frame, snap, app.project(rollups, config["targets"], config["finance"]), months)
+    assert len(results) == 36
+    for _, row in results.iterrows():
+        cfg = scenario_config(config, row)
+        kpis = app._period_kpis(snap.ytd, cfg["finance"])
+        assert row["commission_rev_ytd"] == pytest.approx(kpis["commission_rev"])
+        assert row["delivery_rev_ytd"] == pytest.approx(kpis["delivery_rev"])
+        assert row["revenue_ytd"] == pytest.approx(kpis["commission_rev"] + kpis["delivery_rev"])
+        budget = app.budget_status(snap, cfg["finance"])
+        for key in ("budget_used", "wc_left", "runway_months"):
+            assert row[key] == pytest.approx(budget[key]), key
+        runway = app.project(rollups, cfg["targets"], cfg["finance"]).runway_date
+        assert (None if pd.isna(row["runway_date"]) else row["runway_date"].date()) == runway
+        now = app.evaluate_alerts(pd.DataFrame([snap.mtd]), cfg["thresholds"])
+        assert row["alerts"] == now["breaches"].iloc[0]
+        scored = app.evaluate_alerts(months, cfg["thresholds"])
+        assert row["months_flagged"] == (scored["breaches"] > 0).sum()
+    assert results["months_flagged"].nunique() > 1
+    assert results["runway_date"].isna().any() and results["runway_date"].notna().any()
+
+
+def test_scenario_frame_fills_blanks_from_the_config():
+    config = app.default_config()
+    frame = app.scenario_frame(config, [{"scenario": "cheap", "commission_rate": 0.01},
+                                        {"scenario": " ", "max_cac": None}])
+    assert list(frame.columns) == ["scenario", *app.SCENARIO_PARAMS]
+    assert list(frame["scenario"]) == ["cheap", "#2"]
+    assert frame.loc[0, "commission_rate"] == 0.01
+    assert frame.loc[1, "commission_rate"] == config["finance"]["commission_rate"]
+    assert frame.loc[1, "max_cac"] == config["thresholds"]["max_cac"]
+    base = app.scenario_frame(config)
+    assert len(base) == 1 and base.loc[0, "scenario"] == "#1"
+
+
+def test_scenario_grid_is_the_cartesian_product():
+    config = app.default_config()
+    grid = app.scenario_grid(config, {"delivery_fee": [1, 2, 3], "min_otd": [0.8, 0.9]})
+    assert len(grid) == 6
+    assert set(zip(grid["delivery_fee"], grid["min_otd"])) == {(f, o) for f in (1, 2, 3) for o in (0.8, 0.9)}
+    assert grid.loc[0, "scenario"] == "delivery_fee=1, min_otd=0.8"
+    assert (grid["admin_general"] == config["finance"]["admin_general"]).all()
+
+
+def test_cli_scenarios_sweep(workdir, history, capsys):
+    app.CSVStore(app.DATA_PATH).save(history)
+    assert app.cli(["scenarios", "--sweep", "commission_rate=0.05:0.15:5"]) == 0
+    out = json.loads(capsys.readouterr().out)
+    assert out["latest"] == "2025-03-10"
+    rates = [s["commission_rate"] for s in out["scenarios"]]
+    np.testing.assert_allclose(rates, np.linspace(0.05, 0.15, 5))
+    revenue = [s["commission_rev_ytd"] for s in out["scenarios"]]
+    assert revenue == sorted(revenue)
+
+
+def test_cli_scenarios_rejects_unknown_parameters(workdir, history):
+    app.CSVStore(app.DATA_PATH).save(history)
+    with pytest.raises(SystemExit):
+        app.cli(["scenarios", "--sweep", "bogus=1:2:3"])
+
+
+def test_cli_scenarios_without_data(workdir, capsys):
+    assert app.cli(["scenarios"]) == 1
+    assert "No data" in capsys.readouterr().err
@@ -0,0 +1,29 @@
+import pandas as pd
+
+import aydi_ops_guardrail as app
+
+
+def test_conform_types_raw_strings():
+    raw = pd.DataFrame([
+        {"date": "2025-01-02", "orders": "5", "gmv_products": "12.5", "csat": "", "vendor": "V1"},
+        {"date": "", "orders": "1"},  # no date: dropped
+        {"date": "2025-01-03", "orders": None, "city": "Muscat"},
+    ])
+    df = app.conform(raw)
+    assert list(df.columns) == app.COLUMNS
+    assert {c: str(df[c].dtype) for c in app.SCHEMA} == app.SCHEMA
+    assert len(df) == 2
+    assert df["orders"].tolist() == [5, 0] and df["gmv_products"].iloc[0] == 12.5
+    assert df["vendor"].tolist() == ["V1", ""] and df["channel"].tolist() == ["", ""]
+
+
+def test_conform_passes_typed_frames_through(history):
+    again = app.conform(history)
+    pd.testing.assert_frame_equal(again, history)
+    assert all(again[c].dtype == history[c].dtype for c in app.COLUMNS)
+
+
+def test_typed_frame_is_compact():
+    raw = app.synthetic_history(2000, entities=4).astype({c: "float64" for c in app.METRIC_COLUMNS})
+    raw = raw.astype({d: object for d in app.DIMENSIONS})
+    assert app.conform(raw).memory_usage(deep=True).sum() < 0.6 * raw.memory_usage(deep=True).sum()
@@ -0,0 +1,186 @@
+from datetime import date
+
+import pandas as pd
+import pytest
+
+import aydi_ops_guardrail as app
+
+
+def make_store(kind, workdir):
+    if kind == "csv":
+        return app.CSVStore(str(workdir / "daily_metrics.csv"))
+    if kind == "parquet":
+        return app.ParquetStore(str(workdir / "daily_metrics_parquet"))
+    if kind == "sqlite":
+        return app.SQLiteStore(str(workdir / "daily_metrics.db"))
+    return app.GSheetsStore("fake", worksheet=app.FakeWorksheet())
+
+
+@pytest.fixture(params=["csv", "parquet", "sqlite", "sheets"])
+def store(request, workdir):
+    return make_store(request.param, workdir)
+
+
+def norm(df):
+    df = app.conform(df).astype({d: str for d in app.DIMENSIONS})
+    return df.sort_values(app.KEY_COLUMNS).reset_index(drop=True)[app.COLUMNS]
+
+
+@pytest.fixture
+def two_years():
+    return app.conform(app.synthetic_history(500, entities=2, end=date(2026, 2, 28)))
+
+
+def test_save_load_round_trip(store, two_years):
+    store.save(two_years)
+    pd.testing.assert_frame_equal(norm(store.load()), norm(two_years))
+
+
+def test_save_replaces_everything(store, two_years):
+    store.save(two_years)
+    only_2026 = two_years[two_years["date"].dt.year == 2026]
+    store.save(only_2026)
+    pd.testing.assert_frame_equal(norm(store.load()), norm(only_2026))
+    store.save(two_years.iloc[:0])
+    assert store.load().empty
+
+
+def test_upsert_merges_by_key(store, two_years):
+    store.save(two_years)
+    changed = two_years.tail(3).assign(orders=7)
+    added = app._rows_frame([{"date": date(2026, 3, 1), "vendor": "new", "orders": 1}])
+    store.upsert(pd.concat([changed, added], ignore_index=True))
+    expected = pd.concat([two_years.iloc[:-3], changed, added], ignore_index=True)
+    pd.testing.assert_frame_equal(norm(store.load()), norm(expected))
+
+
+def test_version_changes_on_write(store, two_years):
+    store.save(two_years)
+    before = store.version()
+    store.upsert([{"date": date(2026, 3, 1), "orders": 1}])
+    assert store.version() != before
+
+
+def test_sheets_upsert_writes_only_the_touched_rows(history):
+    ws = app.FakeWorksheet()
+    store = app.GSheetsStore("fake", worksheet=ws)
+    store.save(history.head(30))
+    ws.calls.clear()
+    changed = history.iloc[[3, 17]].assign(orders=5)
+    added = app._rows_frame([{"date": date(2026, 1, 1), "orders": 1}])
+    store.upsert(pd.concat([changed, added], ignore_index=True))
+    assert ws.calls.get("batch_update") == 1
+    assert not {"clear", "update", "get_all_values", "batch_get"} & set(ws.calls)
+    expected = pd.concat([history.head(30).drop(index=history.index[[3, 17]]), changed, added])
+    pd.testing.assert_frame_equal(norm(app.GSheetsStore("fake", worksheet=ws).load()), norm(expected))
+
+
+def test_sheets_save_deletes_rows_in_one_batch(history):
+    ws = app.FakeWorksheet()
+    app.GSheetsStore("fake", worksheet=ws).save(history.head(23))
+    store = app.GSheetsStore("fake", worksheet=ws)
+    store.load()
+    ws.calls.clear()
+    store.save(history.iloc[[0, 5, 22]])
+    assert ws.calls.get("batch_update") == 1 and "clear" not in ws.calls
+    store.upsert([{"date": date(2026, 1, 1), "orders": 9}])
+    rows = [r for r in ws.get_all_values() if any(r)]
+    assert len(rows) == 5 and rows[-1][0] == "2026-01-01"
+    pd.testing.assert_frame_equal(norm(app.GSheetsStore("fake", worksheet=ws).load()),
+                                  norm(pd.concat([history.iloc[[0, 5, 22]],
+                                                  app._rows_frame([{"date": date(2026, 1, 1), "orders": 9}])])))
+
+
+def test_sheets_index_survives_own_writes_and_is_shared(monkeypatch, history):
+    ws = app.FakeWorksheet()
+    conn = app._SheetsConnection(None, None, ws, ws)
+    monkeypatch.setattr(app, "_sheets_connection", lambda spreadsheet_id, title: conn)
+    first, second = (app.GSheetsStore("fake", worksheet=ws) for _ in range(2))
+    for store in (first, second):
+        store._connect()
+    first.save(history.head(10))
+    ws.calls.clear()
+    first.upsert([{"date": date(2026, 1, 1), "orders": 1}])
+    second.upsert([{"date": date(2026, 1, 2), "orders": 2}])
+    first.save(history.head(5))
+    assert "batch_get" not in ws.calls and "get_all_values" not in ws.calls
+    ws.update([["2026-01-03", "3"]], "A7")  # someone else appends a row
+    second.upsert([{"date": date(2026, 1, 4), "orders": 4}])
+    assert ws.calls["batch_get"] == 1
+    assert [r[0] for r in ws.get_all_values() if any(r)][-2:] == ["2026-01-03", "2026-01-04"]
+
+
+def test_csv_history_migrates_into_parquet(workdir, two_years):
+    app.CSVStore(app.DATA_PATH).save(two_years)
+    assert app.migrate_csv_to_parquet() == len(two_years)
+    parquet = app.ParquetStore(app.PARQUET_DIR)
+    assert parquet.years() == [2024, 2025, 2026]
+    pd.testing.assert_frame_equal(norm(parquet.load()), norm(two_years))
+    edited = two_years.tail(4).assign(orders=3)
+    app.CSVStore(app.DATA_PATH).upsert(edited)
+    assert parquet.import_csv(app.DATA_PATH, chunksize=97) == len(two_years)  # re-import: CSV rows win
+    pd.testing.assert_frame_equal(norm(parquet.load()), norm(pd.concat([two_years.iloc[:-4], edited])))
+    assert app.migrate_csv_to_parquet("missing.csv") == 0
+
+
+class Connections:
+    """Stand-in for the cached _sheets_connection: counts connects, the first worksheet's token expires."""
+    def __init__(self, history):
+        self.made, self.history = [], history
+
+    def __call__(self, spreadsheet_id, title):
+        if not self.made:
+            self.made.append(app._SheetsConnection(None, None, ExpiringWorksheet(), ExpiringWorksheet()))
+        return self.made[-1]
+
+    def clear(self):
+        ws = app.FakeWorksheet()
+        app.GSheetsStore("fake", worksheet=ws).save(self.history)
+        self.made.append(app._SheetsConnection(None, None, ws, ws))
+
+
+class Expired(Exception):
+    class response:
+        status_code = 401
+
+
+class ExpiringWorksheet(app.FakeWorksheet):
+    def get_all_values(self):
+        raise Expired()
+
+
+def test_sheets_stores_share_one_connection_and_reconnect_on_expiry(monkeypatch, history):
+    connections = Connections(history.head(4))
+    monkeypatch.setattr(app, "_sheets_connection", connections)
+    stores = [app.GSheetsStore("fake", worksheet=app.FakeWorksheet()) for _ in range(2)]
+    for store in stores:
+        store._connect()
+    assert stores[0].ws._target is stores[1].ws._target and len(connections.made) == 1
+    assert len(stores[0]._fetch_rows()) == 5  # 401 -> one fresh connection, then the call succeeds
+    assert len(connections.made) == 2
+
+
+@pytest.mark.parametrize("filters", [None, {"vendor": "V00001"}, {"city": "Muscat", "channel": "web"}, {"vendor": "nope"}])
+def test_sqlite_period_snapshot_matches_pandas(workdir, filters):
+    df = app.conform(app.synthetic_history(400, entities=4, end=date(2026, 2, 28)))
+    store = app.SQLiteStore(str(workdir / "daily_metrics.db"))
+    store.save(df)
+    rows = app.FactIndex(df.sort_values("date", kind="stable").reset_index(drop=True)).select(filters)
+    got, want = store.period_snapshot(filters), app.build_snapshot(rows)
+    if want is None:
+        assert got is None
+        return
+    assert got.latest == want.latest
+    for period in ("today", "mtd", "ytd"):
+        assert getattr(got, period) == pytest.approx(getattr(want, period))
+
+
+def test_sqlite_migrates_a_date_keyed_table(workdir):
+    import sqlite3
+
+    path = str(workdir / "daily_metrics.db")
+    with sqlite3.connect(path) as con:
+        con.execute("CREATE TABLE daily_metrics (date TEXT PRIMARY KEY, orders INTEGER)")
+        con.execute("INSERT INTO daily_metrics VALUES ('2025-01-02', 7)")
+    df = app.SQLiteStore(path).load()
+    assert len(df) == 1 and df["orders"].iloc[0] == 7 and df["vendor"].iloc[0] == ""
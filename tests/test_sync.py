@@ -0,0 +1,93 @@
+from datetime import date
+
+import pandas as pd
+import pytest
+
+import aydi_ops_guardrail as app
+
+
+def norm(df):
+    df = app.conform(df).astype({d: str for d in app.DIMENSIONS})
+    return df.sort_values(app.KEY_COLUMNS).reset_index(drop=True)[app.COLUMNS]
+
+
+class FlakySheet:
+    """remote_factory over one FakeWorksheet that can be taken down."""
+    def __init__(self):
+        self.ws = app.FakeWorksheet()
+        self.down = False
+
+    def __call__(self):
+        if self.down:
+            raise ConnectionError("Sheets down")
+        return app.GSheetsStore("fake", worksheet=self.ws)
+
+    def frame(self):
+        return app.GSheetsStore("fake", worksheet=self.ws).load()
+
+
+@pytest.fixture
+def replica(workdir):
+    local = app.CSVStore(str(workdir / "daily_metrics.csv"))
+    sheet = FlakySheet()
+    replicator = app.SheetsReplicator(local, sheet, "test", app.Outbox(str(workdir / "outbox.db")), start=False)
+    return app.ReplicatedStore(local, replicator), sheet
+
+
+def test_writes_are_local_first_then_pushed(replica, history):
+    store, sheet = replica
+    store.save(history.head(20))
+    store.upsert([{"date": date(2025, 3, 11), "orders": 3}])
+    assert len(store.load()) == 21 and sheet.frame().empty
+    assert store.sync_status()["pending"] == 2
+    status = store.replicator.sync_once()
+    assert status["pending"] == 0 and status["error"] is None
+    pd.testing.assert_frame_equal(norm(sheet.frame()), norm(store.load()))
+    store.save(history.head(5))  # a smaller save replaces the sheet's rows too
+    store.replicator.sync_once()
+    pd.testing.assert_frame_equal(norm(sheet.frame()), norm(history.head(5)))
+
+
+def test_outage_keeps_the_outbox_and_backs_off(replica, history):
+    store, sheet = replica
+    sheet.down = True
+    store.save(history.head(3))
+    status = store.replicator.sync_once()
+    assert status["pending"] == 1 and status["failures"] == 1
+    assert status["error"] == "Sheets down" and status["retry_at"] is not None
+    assert store.replicator.sync_once()["failures"] == 1  # still backing off: not retried yet
+    sheet.down = False
+    assert store.replicator.sync_once(force=True)["pending"] == 0
+    assert len(sheet.frame()) == 3
+
+
+def test_outbox_survives_a_restart(workdir, history):
+    outbox = app.Outbox(str(workdir / "outbox.db"))
+    outbox.add("t", "upsert", app.GSheetsStore._serialize(history.head(2)))
+    again = app.Outbox(str(workdir / "outbox.db"))
+    [(entry_id, op, values)] = again.peek("t")
+    assert op == "upsert" and len(values) == 2 and again.pending("other") == 0
+    again.ack("t", entry_id)
+    assert again.pending("t") == 0
+
+
+def test_pull_brings_sheet_edits_home(replica, history):
+    store, sheet = replica
+    store.save(history.head(3))
+    store.replicator.sync_once(force=True)
+    app.GSheetsStore("fake", worksheet=sheet.ws).upsert([{"date": date(2025, 6, 1), "orders": 42}])
+    store.replicator.sync_once(force=True)
+    local = store.load().set_index("date")
+    assert local.loc[pd.Timestamp(2025, 6, 1), "orders"] == 42 and len(local) == 4
+
+
+def test_failed_local_write_is_not_replicated(workdir):
+    class BrokenStore(app.CSVStore):
+        def upsert(self, rows):
+            raise OSError("disk full")
+
+    local = BrokenStore(str(workdir / "daily_metrics.csv"))
+    replicator = app.SheetsReplicator(local, FlakySheet(), "test", app.Outbox(str(workdir / "outbox.db")), start=False)
+    with pytest.raises(OSError):
+        app.ReplicatedStore(local, replicator).upsert([{"date": date(2025, 1, 1), "orders": 1}])
+    assert replicator.sync_status()["pending"] == 0
@@ -0,0 +1,60 @@
+import json
+from contextlib import contextmanager
+
+
+import aydi_ops_guardrail as app
+
+
+@contextmanager
+def tracing(detail=False):
+    trace = app.RerunTrace(detail=detail)
+    token = app._trace_var().set(trace)
+    try:
+        yield trace
+    finally:
+        app._trace_var().reset(token)
+
+
+def test_spans_nest_and_count_into_the_innermost():
+    trace = app.RerunTrace()
+    with trace.span("outer"):
+        trace.count(rows=2)
+        with trace.span("inner"):
+            trace.count(rows=5, api_calls=1)
+    trace.count(rows=100)  # nothing open: dropped
+    outer, inner = trace.spans
+    assert (outer["depth"], outer["rows"], inner["depth"], inner["rows"]) == (0, 2, 1, 5)
+    assert trace.totals()["rows"] == 7 and trace.totals()["ms"] == outer["ms"]
+    lines = [json.loads(line) for line in trace.to_jsonl().splitlines()]
+    assert [r["span"] for r in lines] == ["outer", "inner"] and {r["rerun"] for r in lines} == {trace.id}
+
+
+def test_backend_calls_and_sheets_requests_are_traced(history):
+    store = app.GSheetsStore("fake", worksheet=app.FakeWorksheet())
+    store.save(history.head(5))
+    with tracing(detail=True) as trace:
+        with app.trace_span("load"):
+            store.load()
+    names = [s["span"] for s in trace.spans]
+    assert names[:2] == ["load", "GSheetsStore.load"]
+    assert {"sheets.get_lastUpdateTime", "sheets.get_all_values"} <= set(names)
+    totals = trace.totals()
+    assert totals["api_calls"] == 2 and totals["rows"] == 5 and totals["bytes_in"] > 0
+
+
+def test_untraced_calls_cost_nothing(history):
+    assert app._trace_var().get() is None
+    with app.trace_span("noop") as span:
+        assert span is None
+    app.trace_count(rows=1)  # no trace: ignored
+
+
+def test_trace_log_appends_jsonl(tmp_path):
+    trace = app.RerunTrace()
+    with trace.span("a"):
+        pass
+    path = tmp_path / "trace.jsonl"
+    app.write_trace_log(trace, str(path))
+    app.write_trace_log(trace, str(path))
+    assert len(path.read_text().splitlines()) == 2
+    app.write_trace_log(trace, "")  # disabled: no file, no error